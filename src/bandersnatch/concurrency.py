@@ -0,0 +1,182 @@
+"""
+Adaptive concurrency limits for requests sent to the PyPI master
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes PyPI and its CDN answer with when we're pushing too hard
+BACKOFF_STATUSES = (429, 503)
+
+
+class AdaptiveLimiter:
+    """
+    Limit the number of in-flight requests using additive increase /
+    multiplicative decrease (AIMD).
+
+    The limit grows by one after a full window of successful requests and is
+    cut by ``decrease_factor`` when upstream pushes back: a 429/503 response,
+    a stale page or time to first byte well above the best we have observed.
+    The limit always stays within ``minimum`` and ``maximum``.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: Optional[int] = None,
+        name: str = "requests",
+        latency_factor: float = 2.0,
+        decrease_factor: float = 0.5,
+    ) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(maximum or initial, self.minimum)
+        if not self.minimum <= initial <= self.maximum:
+            raise ValueError(
+                f"Initial {name} concurrency {initial} is not within "
+                + f"{self.minimum}-{self.maximum}"
+            )
+        self.name = name
+        self.limit = float(initial)
+        self.latency_factor = latency_factor
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+
+        self.requests = 0
+        self.backoffs = 0
+        self.latency: Optional[float] = None  # Exponentially weighted average
+        self.best_latency: Optional[float] = None
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name} concurrency {int(self.limit)} "
+            + f"({self.minimum}-{self.maximum}) after {self.requests} requests "
+            + f"and {self.backoffs} backoffs"
+        )
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.release()
+
+    async def acquire(self) -> None:
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Cancelled after being woken up - pass the slot on
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_waiters()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        free_slots = int(self.limit) - self.in_flight
+        while free_slots > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free_slots -= 1
+
+    def on_success(self, latency: float) -> None:
+        """Record a request that got its response headers after latency seconds"""
+        self.requests += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+        if self.best_latency is None or self.latency < self.best_latency:
+            self.best_latency = self.latency
+
+        if self.latency > self.best_latency * self.latency_factor:
+            self.on_backoff(
+                f"latency {self.latency:.2f}s is over {self.latency_factor}x "
+                + f"the best seen {self.best_latency:.2f}s"
+            )
+            return
+
+        self._successes += 1
+        if self._successes >= int(self.limit) and self.limit < self.maximum:
+            self._successes = 0
+            self.limit += 1
+            logger.debug(f"Increasing {self.name} concurrency to {int(self.limit)}")
+            self._wake_waiters()
+
+    def on_backoff(self, reason: str) -> None:
+        """Upstream is struggling - shrink the number of in-flight requests"""
+        self.backoffs += 1
+        self._successes = 0
+        now = time.monotonic()
+        # Only back off once per round trip of requests already in flight
+        if self.latency is not None and now - self._last_decrease < self.latency:
+            return
+        self._last_decrease = now
+        new_limit = max(float(self.minimum), self.limit * self.decrease_factor)
+        if int(new_limit) < int(self.limit):
+            logger.info(
+                f"Decreasing {self.name} concurrency to {int(new_limit)}: {reason}"
+            )
+        self.limit = new_limit
+
+
+class LoopLagMonitor:
+    """
+    Measure how long the event loop is blocked by synchronous work.
+
+    A callback is scheduled every ``interval`` seconds; any delay in it being
+    run is time the loop spent not serving sockets.
+    """
+
+    def __init__(self, interval: float = 0.1) -> None:
+        self.interval = interval
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self._expected = 0.0
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    def __str__(self) -> str:
+        mean_lag = self.total_lag / self.samples if self.samples else 0
+        return (
+            f"event loop blocked for {self.total_lag:.1f}s: lag mean "
+            + f"{mean_lag * 1000:.1f}ms max {self.max_lag * 1000:.1f}ms "
+            + f"over {self.samples} samples"
+        )
+
+    def start(self) -> None:
+        self._schedule()
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self) -> None:
+        loop = asyncio.get_event_loop()
+        self._expected = loop.time() + self.interval
+        self._handle = loop.call_later(self.interval, self._tick)
+
+    def _tick(self) -> None:
+        lag = max(0.0, asyncio.get_event_loop().time() - self._expected)
+        self.samples += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        self._schedule()
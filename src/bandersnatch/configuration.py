@@ -20,6 +20,9 @@ except ImportError:  # pragma: no cover
 
 logger = logging.getLogger("bandersnatch")
 
+# How much to trust release files that are already on disk
+EXISTING_FILE_CHECKS = ("full", "size", "exists")
+
 
 class SetConfigValues(NamedTuple):
     json_save: bool
@@ -30,6 +33,7 @@ class SetConfigValues(NamedTuple):
     storage_backend_name: str
     cleanup: bool
     release_files_save: bool
+    existing_file_check: str
 
 
 class Singleton(type):  # pragma: no cover
@@ -91,6 +95,17 @@ class BandersnatchConfig(metaclass=Singleton):
         self.config.read(config_file)
 
 
+def get_existing_file_check(config: configparser.ConfigParser) -> str:
+    existing_file_check = config.get("mirror", "existing-file-check", fallback="full")
+    if existing_file_check not in EXISTING_FILE_CHECKS:
+        raise ValueError(
+            f"Supplied existing-file-check {existing_file_check} is not supported! "
+            + f"Please update existing-file-check to one of {EXISTING_FILE_CHECKS} "
+            + "in the [mirror] section."
+        )
+    return existing_file_check
+
+
 # 11-15, 84-89, 98-99, 117-118, 124-126, 144-149
 def validate_config_values(config: configparser.ConfigParser) -> SetConfigValues:
     try:
@@ -171,6 +186,8 @@ def validate_config_values(config: configparser.ConfigParser) -> SetConfigValues
             + root_uri
         )
 
+    existing_file_check = get_existing_file_check(config)
+
     return SetConfigValues(
         json_save,
         root_uri,
@@ -180,4 +197,5 @@ def validate_config_values(config: configparser.ConfigParser) -> SetConfigValues
         storage_backend_name,
         cleanup,
         release_files_save,
+        existing_file_check,
     )
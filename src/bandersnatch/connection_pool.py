@@ -0,0 +1,125 @@
+"""
+Connection pool settings and statistics for the HTTP sessions talking to PyPI
+
+Metadata requests go to the index host and release file downloads to the
+files host (files.pythonhosted.org for PyPI). Each gets a session with its own
+connection pool so a burst of large downloads can't starve metadata requests
+of connections and vice versa. aiohttp trace hooks count how often a request
+reuses a kept-alive connection, has to open a new one or has to wait for one
+because the pool is full.
+"""
+import configparser
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, NamedTuple
+
+import aiohttp
+
+
+class PoolOptions(NamedTuple):
+    # Connections per pool and per host of a pool, 0 for no limit
+    limit: int = 100
+    limit_per_host: int = 0
+    # Seconds an idle connection is kept open for reuse
+    keepalive_timeout: float = 15.0
+    # Seconds resolved host names are cached, 0 disables the cache
+    dns_cache_ttl: int = 10
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> "PoolOptions":
+        defaults = cls()
+        return cls(
+            limit=config.getint("mirror", "connection-limit", fallback=defaults.limit),
+            limit_per_host=config.getint(
+                "mirror", "connection-limit-per-host", fallback=defaults.limit_per_host
+            ),
+            keepalive_timeout=config.getfloat(
+                "mirror", "keepalive-timeout", fallback=defaults.keepalive_timeout
+            ),
+            dns_cache_ttl=config.getint(
+                "mirror", "dns-cache-ttl", fallback=defaults.dns_cache_ttl
+            ),
+        )
+
+    def connector_kwargs(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "use_dns_cache": self.dns_cache_ttl > 0,
+            "ttl_dns_cache": self.dns_cache_ttl or None,
+        }
+
+
+class PoolStats:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.connector: Any = None
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name} pool: {self.requests} requests, "
+            + f"{self.connections_created} connections opened, "
+            + f"{self.reuse_ratio:.0%} reused, {self.waits} waits for a free "
+            + f"connection ({self.wait_seconds:.1f}s), "
+            + f"{self.open_connections} open"
+        )
+
+    @property
+    def reuse_ratio(self) -> float:
+        connections = self.connections_created + self.connections_reused
+        return self.connections_reused / connections if connections else 0.0
+
+    @property
+    def open_connections(self) -> int:
+        """Connections in use plus idle ones kept alive. aiohttp has no public
+        API for this so peek at the connector."""
+        if self.connector is None:
+            return 0
+        acquired = len(getattr(self.connector, "_acquired", ()))
+        idle = sum(
+            len(conns) for conns in getattr(self.connector, "_conns", {}).values()
+        )
+        return acquired + idle
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_connection_queued_start.append(self._on_queued_start)
+        trace_config.on_connection_queued_end.append(self._on_queued_end)
+        return trace_config
+
+    async def _on_request_start(
+        self, session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        self.requests += 1
+
+    async def _on_connection_create_end(
+        self, session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(
+        self, session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        self.connections_reused += 1
+
+    async def _on_queued_start(
+        self, session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        self.waits += 1
+        ctx.queued_at = time.monotonic()
+
+    async def _on_queued_end(
+        self, session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        self.wait_seconds += time.monotonic() - getattr(
+            ctx, "queued_at", time.monotonic()
+        )
@@ -13,6 +13,8 @@ from urllib.parse import urlparse
 from packaging.utils import canonicalize_name
 
 from .master import Master
+from .package_index import PACKAGE_INDEX_FILE, PackageIndex
+from .shards import ShardOptions
 from .storage import storage_backend_plugins
 from .verify import get_latest_json
 
@@ -113,6 +115,25 @@ async def delete_packages(config: ConfigParser, args: Namespace, master: Master)
 
     if args.dry_run:
         logger.info("-- bandersnatch delete DRY RUN --")
+    else:
+        mirror_base_path = storage_backend.mirror_base_path
+        index_dirs = [mirror_base_path]
+        shard = ShardOptions.from_config(config)
+        # The shards' indexes make up the root index on the next coordination
+        if shard.enabled:
+            index_dirs += [
+                shard.directory(mirror_base_path, index)
+                for index in range(shard.shard_count)
+            ]
+        for index_dir in index_dirs:
+            package_index = PackageIndex(
+                storage_backend, index_dir / PACKAGE_INDEX_FILE
+            )
+            # Without an index the next sync rebuilds it from the simple
+            # directory
+            if package_index.exists():
+                package_index.remove(args.pypi_packages)
+                package_index.save()
     if delete_coros:
         logger.info(f"Attempting to remove {len(delete_coros)} files")
         return sum(await asyncio.gather(*delete_coros))
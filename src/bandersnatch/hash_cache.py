@@ -0,0 +1,61 @@
+"""
+Persistent cache of file digests
+
+Checking whether a release file we already have matches its expected digest
+means reading the whole file. The digests are cached in a local sqlite
+database, keyed by path and an identity of the stored file (e.g. size, mtime
+and inode) that changes whenever the file is rewritten. An entry is only used
+while the identity still matches.
+"""
+import logging
+from pathlib import Path
+from typing import Optional, Union
+
+from .sqlite_cache import SqliteCache
+
+logger = logging.getLogger(__name__)
+
+
+class HashCache:
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        self._db = SqliteCache(
+            self.path,
+            "digests",
+            ("path", "function", "identity", "digest"),
+            2,
+            "path TEXT NOT NULL, function TEXT NOT NULL, "
+            + "identity TEXT NOT NULL, digest TEXT NOT NULL, "
+            + "PRIMARY KEY (path, function)",
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self) -> str:
+        return f"hash cache {self.path}: {self.hits} hits, {self.misses} misses"
+
+    def get(self, path: str, identity: str, function: str = "sha256") -> Optional[str]:
+        """Return the cached digest of path if the file is still the one that
+        was hashed. A stale entry is removed."""
+        row = self._db.select((path, function))
+        if row is None:
+            self.misses += 1
+            return None
+        if row[2] != identity:
+            logger.debug(f"{path} changed since it was hashed")
+            self._db.delete((path, function))
+            self.misses += 1
+            return None
+        self.hits += 1
+        return str(row[3])
+
+    def set(
+        self, path: str, identity: str, digest: str, function: str = "sha256"
+    ) -> None:
+        self._db.replace((path, function, identity, digest))
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,194 @@
+"""
+Hedged requests against slow responses
+
+A few responses that take much longer than the rest (a stuck CDN edge, a
+connection to an overloaded host) decide when a sync finishes. With hedging
+enabled, a request that hasn't got its response headers after the
+``hedge-percentile`` of the times measured so far in the run is sent a second
+time and whichever response arrives first is used, the other request is
+cancelled. At most ``hedge-budget`` percent of the requests are duplicated so
+a slow upstream doesn't get twice the load. Metadata and release file
+requests are measured separately.
+"""
+import asyncio
+import configparser
+import logging
+import time
+from collections import deque
+from typing import (
+    Any,
+    AsyncContextManager,
+    Awaitable,
+    Callable,
+    Deque,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Requests measured before any is hedged
+MIN_SAMPLES = 20
+# Most recent requests the percentile is taken over
+MAX_SAMPLES = 1000
+# Requests between updates of the hedging delay
+UPDATE_INTERVAL = 25
+# Never hedge requests sooner than this many seconds
+MIN_DELAY = 0.05
+
+
+class HedgeOptions(NamedTuple):
+    # Percentile of response times after which a request is hedged, 0 disables
+    percentile: float = 0.0
+    # Percent of requests that may be hedged
+    budget: float = 5.0
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> "HedgeOptions":
+        defaults = cls()
+        options = cls(
+            percentile=config.getfloat(
+                "mirror", "hedge-percentile", fallback=defaults.percentile
+            ),
+            budget=config.getfloat("mirror", "hedge-budget", fallback=defaults.budget),
+        )
+        if not 0 <= options.percentile < 100:
+            raise ValueError(
+                f"Supplied hedge-percentile {options.percentile} is not supported! "
+                + "Please update hedge-percentile to a value from 0 (disabled) to "
+                + "99.9 in the [mirror] section."
+            )
+        return options
+
+    @property
+    def enabled(self) -> bool:
+        return self.percentile > 0 and self.budget > 0
+
+
+class HedgePolicy:
+    def __init__(self, name: str, options: HedgeOptions) -> None:
+        self.name = name
+        self.options = options
+        self.samples: Deque[float] = deque(maxlen=MAX_SAMPLES)
+        self.delay: Optional[float] = None
+        self.requests = 0
+        self.hedges = 0
+        self.hedges_won = 0
+        self._new_samples = 0
+
+    def __str__(self) -> str:
+        delay = f"{self.delay:.2f}s" if self.delay is not None else "-"
+        return (
+            f"{self.name} hedging: {self.hedges} of {self.requests} requests hedged "
+            + f"after {delay}, {self.hedges_won} hedges were faster"
+        )
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self._new_samples += 1
+        if len(self.samples) < MIN_SAMPLES or (
+            self.delay is not None and self._new_samples < UPDATE_INTERVAL
+        ):
+            return
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.options.percentile / 100))
+        self.delay = max(ordered[index], MIN_DELAY)
+        self._new_samples = 0
+
+    def may_hedge(self) -> bool:
+        return self.hedges < self.requests * self.options.budget / 100
+
+
+class HedgedRequest:
+    """Async context manager sending a request with send and, if it takes
+    longer than policy allows, a second one. Whichever response arrives first
+    is returned. The caller admits the first request to the host, the second
+    one waits for admit and is let go with release once the response is done
+    with."""
+
+    def __init__(
+        self,
+        send: Callable[[], AsyncContextManager[aiohttp.ClientResponse]],
+        policy: HedgePolicy,
+        admit: Optional[Callable[[], Awaitable[None]]] = None,
+        release: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self._send = send
+        self._policy = policy
+        self._admit = admit
+        self._release = release
+        self._admitted = False
+        self._request: Optional[AsyncContextManager[aiohttp.ClientResponse]] = None
+
+    async def _start(self, hedge: bool = False) -> Any:
+        if hedge and self._admit is not None:
+            await self._admit()
+            self._admitted = True
+        request = self._send()
+        start = time.monotonic()
+        response = await request.__aenter__()
+        self._policy.record(time.monotonic() - start)
+        return request, response
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        self._policy.requests += 1
+        first = asyncio.ensure_future(self._start())
+        attempts = [first]
+        entered = False
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self._policy.delay)
+            if not done and self._policy.may_hedge():
+                logger.debug(f"Hedging a {self._policy.name} request")
+                self._policy.hedges += 1
+                attempts.append(asyncio.ensure_future(self._start(hedge=True)))
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                winner = next((a for a in done if not a.exception()), None)
+                if winner is not None:
+                    break
+            else:
+                # Every attempt failed, raise the error of the original request
+                error = first.exception()
+                assert error is not None
+                raise error
+            if winner is not first:
+                self._policy.hedges_won += 1
+            response: aiohttp.ClientResponse
+            self._request, response = winner.result()
+            entered = True
+            return response
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+            await self._release_losers(attempts)
+            # Without a response there's no __aexit__ to let the hedge go
+            if not entered:
+                self._release_hedge()
+
+    async def _release_losers(self, attempts: Sequence["asyncio.Future[Any]"]) -> None:
+        await asyncio.gather(*attempts, return_exceptions=True)
+        for attempt in attempts:
+            if attempt.cancelled() or attempt.exception() is not None:
+                continue
+            request, _ = attempt.result()
+            if request is not self._request:
+                await request.__aexit__(None, None, None)
+
+    async def __aexit__(self, *exc: Any) -> None:
+        try:
+            if self._request is not None:
+                await self._request.__aexit__(*exc)
+        finally:
+            self._release_hedge()
+
+    def _release_hedge(self) -> None:
+        if self._admitted and self._release is not None:
+            self._admitted = False
+            self._release()
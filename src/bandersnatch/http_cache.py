@@ -0,0 +1,100 @@
+"""
+Persistent cache of HTTP validators for package JSON metadata
+
+Most packages have not changed since the last time we fetched their JSON
+metadata. Remembering the ETag / Last-Modified validators upstream sent along
+with the copy we saved lets us ask for the document conditionally and reuse
+our local copy when the answer is 304 Not Modified. The validators are kept in
+a local sqlite database keyed by package name, together with the PyPI serial
+the saved copy was fetched at.
+"""
+import logging
+from pathlib import Path
+from typing import Dict, Mapping, NamedTuple, Optional, Union
+
+from .sqlite_cache import SqliteCache
+
+logger = logging.getLogger(__name__)
+
+
+class Validators(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    serial: int
+
+    @classmethod
+    def from_headers(
+        cls,
+        headers: Mapping[str, str],
+        serial: Optional[int],
+        previous: Optional["Validators"] = None,
+    ) -> "Validators":
+        """Build validators from response headers. A 304 response may leave
+        headers out, in which case the previous values still apply."""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if previous is not None:
+            etag = etag or previous.etag
+            last_modified = last_modified or previous.last_modified
+            serial = serial or previous.serial
+        return cls(etag, last_modified, serial or 0)
+
+    def request_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ValidatorCache:
+    def __init__(self, path: Union[Path, str]) -> None:
+        self.path = Path(path)
+        self._db = SqliteCache(
+            self.path,
+            "validators",
+            ("name", "etag", "last_modified", "serial"),
+            1,
+            "name TEXT PRIMARY KEY NOT NULL, etag TEXT, last_modified TEXT, "
+            + "serial INTEGER NOT NULL",
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self) -> str:
+        return (
+            f"HTTP validator cache {self.path}: {self.hits} not modified, "
+            + f"{self.misses} fetched"
+        )
+
+    def get(self, name: str) -> Optional[Validators]:
+        row = self._db.select((name,))
+        if row is None:
+            return None
+        return Validators(row[1], row[2], int(row[3]))
+
+    def set(self, name: str, validators: Validators) -> None:
+        if not validators.etag and not validators.last_modified:
+            # Nothing to revalidate with next time
+            self.delete(name)
+            return
+        self._db.replace(
+            (name, validators.etag, validators.last_modified, validators.serial)
+        )
+
+    def delete(self, name: str) -> None:
+        self._db.delete((name,))
+
+    def record(self, modified: bool) -> None:
+        """Count whether a conditional request had to fetch the document"""
+        if modified:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
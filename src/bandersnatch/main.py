@@ -12,9 +12,10 @@ from typing import Optional
 import bandersnatch.configuration
 import bandersnatch.delete
 import bandersnatch.log
-import bandersnatch.master
 import bandersnatch.mirror
+import bandersnatch.plan
 import bandersnatch.verify
+from bandersnatch.shards import ShardOptions
 from bandersnatch.storage import storage_backend_plugins
 
 logger = logging.getLogger(__name__)  # pylint: disable=C0103
@@ -59,6 +60,15 @@ def _mirror_parser(subparsers: argparse._SubParsersAction) -> None:
             + "perform a full sync"
         ),
     )
+    m.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help=(
+            "Split the packages to sync between this many processes, each with "
+            + "its own event loop (default: %(default)s)"
+        ),
+    )
     m.set_defaults(op="mirror")
 
 
@@ -93,6 +103,35 @@ def _verify_parser(subparsers: argparse._SubParsersAction) -> None:
     v.set_defaults(op="verify")
 
 
+def _plan_parser(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "plan",
+        help=(
+            "Estimate the files, bytes and time the next sync would take "
+            + "without downloading release files"
+        ),
+    )
+    p.add_argument(
+        "--force-check",
+        action="store_true",
+        default=False,
+        help="Plan a full sync, as mirror --force-check would perform",
+    )
+    p.add_argument(
+        "--throughput",
+        type=float,
+        default=10.0,
+        help="Expected download throughput in MB/s for the ETA (default: %(default)s)",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="# of concurrent metadata requests [Defaults to bandersnatch.conf]",
+    )
+    p.set_defaults(op="plan")
+
+
 def _sync_parser(subparsers: argparse._SubParsersAction) -> None:
     m = subparsers.add_parser(
         "sync",
@@ -109,22 +148,22 @@ def _sync_parser(subparsers: argparse._SubParsersAction) -> None:
 
 async def async_main(args: argparse.Namespace, config: ConfigParser) -> int:
     if args.op.lower() == "delete":
-        async with bandersnatch.master.Master(
-            config.get("mirror", "master"),
-            config.getfloat("mirror", "timeout"),
-            config.getfloat("mirror", "global-timeout", fallback=None),
-        ) as master:
+        async with bandersnatch.mirror.master_from_config(config) as master:
             return await bandersnatch.delete.delete_packages(config, args, master)
     elif args.op.lower() == "verify":
         return await bandersnatch.verify.metadata_verify(config, args)
+    elif args.op.lower() == "plan":
+        return await bandersnatch.plan.plan(config, args)
     elif args.op.lower() == "sync":
         return await bandersnatch.mirror.mirror(config, args.packages)
 
     if args.force_check:
         storage_plugin = next(iter(storage_backend_plugins()))
-        status_file = (
-            storage_plugin.PATH_BACKEND(config.get("mirror", "directory")) / "status"
+        # The shard this node syncs keeps its status in a directory of its own
+        statedir = ShardOptions.from_config(config).directory(
+            Path(config.get("mirror", "directory"))
         )
+        status_file = storage_plugin.PATH_BACKEND(str(statedir)) / "status"
         if status_file.exists():
             tmp_status_file = Path(gettempdir()) / "status"
             try:
@@ -143,7 +182,7 @@ async def async_main(args: argparse.Namespace, config: ConfigParser) -> int:
                 f"No status file to move ({status_file}) - Full sync will occur"
             )
 
-    return await bandersnatch.mirror.mirror(config)
+    return await bandersnatch.mirror.mirror(config, processes=args.processes)
 
 
 def main(loop: Optional[asyncio.AbstractEventLoop] = None) -> int:
@@ -170,6 +209,7 @@ def main(loop: Optional[asyncio.AbstractEventLoop] = None) -> int:
     _delete_parser(subparsers)
     _mirror_parser(subparsers)
     _verify_parser(subparsers)
+    _plan_parser(subparsers)
     _sync_parser(subparsers)
 
     if len(sys.argv) < 2:
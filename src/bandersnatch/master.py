@@ -1,11 +1,20 @@
 import asyncio
 import logging
 import re
+import time
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import partial
 from os import environ
 from pathlib import Path
-from typing import Any, AsyncGenerator, Dict, Optional, Union
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncGenerator,
+    Dict,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import aiohttp
 from aiohttp_socks import ProxyConnector
@@ -13,12 +22,21 @@ from aiohttp_xmlrpc.client import ServerProxy
 
 import bandersnatch
 
+from .concurrency import BACKOFF_STATUSES, AdaptiveLimiter
+from .connection_pool import PoolOptions, PoolStats
 from .errors import PackageNotFound
+from .hedging import HedgedRequest, HedgeOptions, HedgePolicy
+from .http_cache import Validators
+from .rate_limit import HostRateLimit, RateLimits, parse_retry_after
+from .transfer import DownloadTimeouts
+from .upstreams import Route, Upstreams
 from .utils import USER_AGENT
 
 logger = logging.getLogger(__name__)
 FIVE_HOURS_FLOAT = 5 * 60 * 60.0
 PYPI_SERIAL_HEADER = "X-PYPI-LAST-SERIAL"
+# How often a request is retried after upstream told us to back off
+BACKOFF_RETRIES = 5
 
 
 class StalePage(Exception):
@@ -29,23 +47,67 @@ class XmlRpcError(aiohttp.ClientError):
     """Issue getting package listing from PyPI Repository"""
 
 
+class ResponseContext:
+    """Async context manager around a Master.get generator. The response goes
+    back to the connection pool, and the request's concurrency slot is freed,
+    as soon as the block exits."""
+
+    def __init__(self, generator: AsyncGenerator[aiohttp.ClientResponse, None]) -> None:
+        self._generator = generator
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        return await self._generator.asend(None)
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self._generator.aclose()
+
+
 class Master:
     def __init__(
         self,
         url: str,
         timeout: float = 10.0,
         global_timeout: Optional[float] = FIVE_HOURS_FLOAT,
+        metadata_limiter: Optional[AdaptiveLimiter] = None,
+        file_limiter: Optional[AdaptiveLimiter] = None,
+        rate_limits: Optional[RateLimits] = None,
+        pool_options: Optional[PoolOptions] = None,
+        upstreams: Optional[Upstreams] = None,
+        hedge_options: Optional[HedgeOptions] = None,
+        download_timeouts: Optional[DownloadTimeouts] = None,
     ) -> None:
         self.loop = asyncio.get_event_loop()
         self.timeout = timeout
         self.global_timeout = global_timeout or FIVE_HOURS_FLOAT
         self.url = url
-        if self.url.startswith("http://"):
-            err = f"Master URL {url} is not https scheme"
-            logger.error(err)
-            raise ValueError(err)
-
-    def _check_for_socks_proxy(self) -> Optional[ProxyConnector]:
+        # Optional adaptive limits on in-flight requests to the master itself
+        # (metadata) and everywhere else (release files)
+        self.metadata_limiter = metadata_limiter
+        self.file_limiter = file_limiter
+        # Optional request rate and bandwidth limits per host
+        self.rate_limits = rate_limits
+        # Metadata requests to the master and release file downloads from
+        # everywhere else use separate sessions and connection pools
+        self.pool_options = pool_options or PoolOptions()
+        self.pool_stats = {name: PoolStats(name) for name in ("index", "files")}
+        self.files_session: Optional[aiohttp.ClientSession] = None
+        # Optionally duplicate requests that are slower than most in this run
+        self.hedge_policies: Dict[str, HedgePolicy] = {}
+        if hedge_options is not None and hedge_options.enabled:
+            self.hedge_policies = {
+                name: HedgePolicy(name, hedge_options) for name in ("index", "files")
+            }
+        # Release files get a deadline by their size instead of global_timeout
+        self.download_timeouts = download_timeouts or DownloadTimeouts()
+        # Further metadata and file sources requests can fail over to
+        self.upstreams = upstreams or Upstreams(url)
+        for source_url in (self.url, *self.upstreams.urls):
+            if source_url.startswith("http://"):
+                err = f"Master URL {source_url} is not https scheme"
+                logger.error(err)
+                raise ValueError(err)
+
+    def _check_for_socks_proxy(self, **kwargs: Any) -> Optional[ProxyConnector]:
         """ Check env for a SOCKS proxy URL and return a connector if found """
         proxy_vars = (
             "https_proxy",
@@ -67,31 +129,53 @@ class Master:
             return None
 
         logger.debug(f"Creating a SOCKS ProxyConnector to use {proxy_url}")
-        return ProxyConnector.from_url(proxy_url)
+        return ProxyConnector.from_url(proxy_url, **kwargs)
 
-    async def __aenter__(self) -> "Master":
-        logger.debug("Initializing Master's aiohttp ClientSession")
+    def _create_session(
+        self, stats: PoolStats, total_timeout: Optional[float]
+    ) -> aiohttp.ClientSession:
         custom_headers = {"User-Agent": USER_AGENT}
         skip_headers = {"User-Agent"}
         aiohttp_timeout = aiohttp.ClientTimeout(
-            total=self.global_timeout,
+            total=total_timeout,
             sock_connect=self.timeout,
             sock_read=self.timeout,
         )
-        socks_connector = self._check_for_socks_proxy()
-        self.session = aiohttp.ClientSession(
-            connector=socks_connector,
+        connector_kwargs = self.pool_options.connector_kwargs()
+        socks_connector = self._check_for_socks_proxy(**connector_kwargs)
+        connector = socks_connector or aiohttp.TCPConnector(**connector_kwargs)
+        stats.connector = connector
+        return aiohttp.ClientSession(
+            connector=connector,
             headers=custom_headers,
             skip_auto_headers=skip_headers,
             timeout=aiohttp_timeout,
             trust_env=True if not socks_connector else False,
             raise_for_status=True,
+            trace_configs=[stats.trace_config()],
+        )
+
+    async def __aenter__(self) -> "Master":
+        logger.debug("Initializing Master's aiohttp ClientSessions")
+        self.session = self._create_session(
+            self.pool_stats["index"], self.global_timeout
+        )
+        self.files_session = self._create_session(
+            self.pool_stats["files"],
+            None if self.download_timeouts.enabled else self.global_timeout,
         )
         return self
 
     async def __aexit__(self, *exc: Any) -> None:
-        logger.debug("Closing Master's aiohttp ClientSession and waiting 0.1 seconds")
+        for stats in self.pool_stats.values():
+            logger.info(f"Connection {stats}")
+        for policy in self.hedge_policies.values():
+            logger.info(f"Finished with {policy}")
+        logger.info(f"Finished with {self.upstreams}")
+        logger.debug("Closing Master's aiohttp ClientSessions and waiting 0.1 seconds")
         await self.session.close()
+        if self.files_session is not None:
+            await self.files_session.close()
         # Give time for things to actually close to avoid warnings
         # https://github.com/aio-libs/aiohttp/issues/1115
         await asyncio.sleep(0.1)
@@ -134,21 +218,196 @@ class Master:
                     + "HTTP PURGE has been issued to the request url"
                 )
 
+    def _session_for(self, url: str) -> aiohttp.ClientSession:
+        if (
+            url.startswith(self.url)
+            or self.upstreams.is_metadata(url)
+            or self.files_session is None
+        ):
+            return self.session
+        return self.files_session
+
+    def request(
+        self,
+        path: str,
+        required_serial: Optional[int],
+        not_modified_serial: Optional[int] = None,
+        **kw: Any,
+    ) -> ResponseContext:
+        """Like get, but used as ``async with master.request(...) as response``
+        so the response can't be left unreleased"""
+        return ResponseContext(
+            self.get(path, required_serial, not_modified_serial, **kw)
+        )
+
     async def get(
-        self, path: str, required_serial: Optional[int], **kw: Any
+        self,
+        path: str,
+        required_serial: Optional[int],
+        not_modified_serial: Optional[int] = None,
+        **kw: Any,
     ) -> AsyncGenerator[aiohttp.ClientResponse, None]:
+        """Get path from upstream, making sure the response is at least as new
+        as required_serial. not_modified_serial is the serial of the copy a
+        conditional request's validators describe, which a 304 response
+        without a serial of its own is about."""
         logger.debug(f"Getting {path} (serial {required_serial})")
         if not path.startswith(("https://", "http://")):
             path = self.url + path
 
-        async with self.session.get(path, **kw) as r:
-            got_serial = (
-                int(r.headers[PYPI_SERIAL_HEADER])
-                if PYPI_SERIAL_HEADER in r.headers
+        routes = self.upstreams.routes(path)
+        # The error of a failed source, to raise if the sources after it can
+        # only tell us they don't have path
+        failure: Optional[Exception] = None
+        for index, route in enumerate(routes):
+            last_route = index == len(routes) - 1
+            limiter = self.metadata_limiter if route.metadata else self.file_limiter
+            session = self._session_for(route.url)
+            rate_limit = (
+                self.rate_limits.for_url(route.url)
+                if self.rate_limits is not None
                 else None
             )
-            await self.check_for_stale_cache(path, required_serial, got_serial)
-            yield r
+            attempt = 0
+            while True:
+                await self._admit(rate_limit, limiter)
+                start = time.monotonic()
+                try:
+                    async with self._send(session, route, kw, rate_limit, limiter) as r:
+                        latency = time.monotonic() - start
+                        got_serial = (
+                            int(r.headers[PYPI_SERIAL_HEADER])
+                            if PYPI_SERIAL_HEADER in r.headers
+                            else None
+                        )
+                        if got_serial is None and r.status == 304:
+                            got_serial = not_modified_serial
+                        await self.check_for_stale_cache(
+                            route.url, required_serial, got_serial
+                        )
+                        route.upstream.on_success(latency)
+                        if limiter is not None:
+                            limiter.on_success(latency)
+                        yield r
+                    return
+                except StalePage:
+                    if limiter is not None:
+                        limiter.on_backoff(f"stale page for {route.url}")
+                    if last_route:
+                        raise
+                    logger.info(f"Stale page from {route.upstream.url}, failing over")
+                    break
+                except aiohttp.ClientResponseError as cre:
+                    if limiter is not None and cre.status in BACKOFF_STATUSES:
+                        limiter.on_backoff(f"HTTP {cre.status} for {route.url}")
+                    if self._pause_for_backoff(rate_limit, cre, attempt):
+                        attempt += 1
+                        continue
+                    if cre.status < 500 and cre.status != 429:
+                        # Only the authoritative source can tell us path is
+                        # missing, the others may just not have it yet
+                        if route.authoritative:
+                            raise
+                        if last_route:
+                            raise failure or cre
+                        break
+                    route.upstream.on_failure(f"HTTP {cre.status}")
+                    if last_route:
+                        raise
+                    self._log_fail_over(route, cre)
+                    failure = cre
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    route.upstream.on_failure(repr(e))
+                    if last_route:
+                        raise
+                    self._log_fail_over(route, e)
+                    failure = e
+                    break
+                finally:
+                    if limiter is not None:
+                        limiter.release()
+
+    @staticmethod
+    async def _admit(
+        rate_limit: Optional[HostRateLimit], limiter: Optional[AdaptiveLimiter]
+    ) -> None:
+        """Wait until a request may be sent to the host. The caller releases
+        the limiter once it's done with the response."""
+        if rate_limit is not None:
+            await rate_limit.before_request()
+        if limiter is not None:
+            await limiter.acquire()
+
+    def _send(
+        self,
+        session: aiohttp.ClientSession,
+        route: Route,
+        kw: Dict[str, Any],
+        rate_limit: Optional[HostRateLimit],
+        limiter: Optional[AdaptiveLimiter],
+    ) -> AsyncContextManager[aiohttp.ClientResponse]:
+        policy = self.hedge_policies.get("index" if route.metadata else "files")
+        if policy is None:
+            request: AsyncContextManager[aiohttp.ClientResponse] = session.get(
+                route.url, **kw
+            )
+            return request
+        # The hedge counts against the host's limits like any other request
+        return HedgedRequest(
+            partial(session.get, route.url, **kw),
+            policy,
+            admit=partial(self._admit, rate_limit, limiter),
+            release=limiter.release if limiter is not None else None,
+        )
+
+    @staticmethod
+    def _log_fail_over(route: Route, error: Exception) -> None:
+        logger.info(f"Request to {route.upstream.url} failed, failing over: {error!r}")
+
+    @staticmethod
+    def _pause_for_backoff(
+        rate_limit: Optional[HostRateLimit],
+        cre: aiohttp.ClientResponseError,
+        attempt: int,
+    ) -> bool:
+        """Pause requests to the host if upstream told us to back off. Returns
+        whether the request should be retried once the pause is over."""
+        if rate_limit is None or attempt >= BACKOFF_RETRIES:
+            return False
+        retry_after = parse_retry_after(
+            cre.headers.get("Retry-After") if cre.headers else None
+        )
+        if cre.status != 429 and retry_after is None:
+            return False
+        if retry_after is None:
+            retry_after = float(2 ** attempt)
+        rate_limit.pause(retry_after, f"HTTP {cre.status}")
+        return True
+
+    async def read(self, response: aiohttp.ClientResponse) -> bytes:
+        """Read the whole body of response within our bandwidth limits"""
+        body: bytes = await response.read()
+        if self.rate_limits is not None:
+            await self.rate_limits.for_url(str(response.url)).on_bytes(len(body))
+        return body
+
+    async def read_chunks(
+        self, response: aiohttp.ClientResponse, chunk_size: int = 65536
+    ) -> AsyncGenerator[bytes, None]:
+        """Iterate over the body of response within our bandwidth limits"""
+        rate_limit = (
+            self.rate_limits.for_url(str(response.url))
+            if self.rate_limits is not None
+            else None
+        )
+        while True:
+            chunk = await response.content.read(chunk_size)
+            if not chunk:
+                break
+            if rate_limit is not None:
+                await rate_limit.on_bytes(len(chunk))
+            yield chunk
 
     # TODO: Add storage backend support / refactor - #554
     async def url_fetch(
@@ -164,7 +423,7 @@ class Master:
             executor, partial(file_path.parent.mkdir, parents=True, exist_ok=True)
         )
 
-        async with self.session.get(url) as response:
+        async with self._session_for(url).get(url) as response:
             with file_path.open("wb") as fd:
                 while True:
                     chunk = await response.content.read(chunk_size)
@@ -226,12 +485,64 @@ class Master:
                 packages[package] = serial
         return packages
 
-    async def get_package_metadata(self, package_name: str, serial: int = 0) -> Any:
+    async def get_package_metadata(
+        self, package_name: str, serial: int = 0, raw: bool = False
+    ) -> Any:
+        """Return the parsed JSON metadata of package_name or, if raw is set,
+        the response body as is"""
         try:
-            metadata_generator = self.get(f"/pypi/{package_name}/json", serial)
-            metadata_response = await metadata_generator.asend(None)
-            metadata = await metadata_response.json()
-            return metadata
+            async with self.request(
+                f"/pypi/{package_name}/json", serial
+            ) as metadata_response:
+                body = await self.read(metadata_response)
+                if raw:
+                    return body
+                metadata = await metadata_response.json()
+                return metadata
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                raise PackageNotFound(package_name)
+            raise
+
+    async def get_package_metadata_if_changed(
+        self,
+        package_name: str,
+        serial: Optional[int] = 0,
+        validators: Optional[Validators] = None,
+    ) -> Tuple[Optional[bytes], Validators]:
+        """Conditionally fetch the raw JSON metadata of package_name.
+
+        validators describe the copy we already have. They are only sent if
+        that copy is at least as new as serial, so a 304 can't hand us back an
+        outdated document. Returns None instead of the body if upstream says
+        our copy is still current, along with the validators of the response.
+        """
+        headers: Dict[str, str] = {}
+        not_modified_serial = None
+        if validators is not None and (serial is None or validators.serial >= serial):
+            headers = validators.request_headers()
+            not_modified_serial = validators.serial
+        try:
+            async with self.request(
+                f"/pypi/{package_name}/json",
+                serial,
+                not_modified_serial,
+                headers=headers,
+            ) as metadata_response:
+                got_serial = (
+                    int(metadata_response.headers[PYPI_SERIAL_HEADER])
+                    if PYPI_SERIAL_HEADER in metadata_response.headers
+                    else None
+                )
+                if headers and metadata_response.status == 304:
+                    logger.debug(f"{package_name} metadata not modified")
+                    return None, Validators.from_headers(
+                        metadata_response.headers, got_serial, validators
+                    )
+                return (
+                    await self.read(metadata_response),
+                    Validators.from_headers(metadata_response.headers, got_serial),
+                )
         except aiohttp.ClientResponseError as e:
             if e.status == 404:
                 raise PackageNotFound(package_name)
@@ -1,33 +1,65 @@
+import argparse
 import asyncio
 import configparser
 import datetime
 import hashlib
-import html
 import logging
+import logging.config
 import os
+import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from json import dump
 from pathlib import Path
 from shutil import rmtree
 from threading import RLock
-from typing import Any, Awaitable, Dict, List, Optional, Set, Union
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set, Tuple, Union
 from unittest.mock import Mock
 from urllib.parse import unquote, urlparse
 
+import aiohttp
 from filelock import Timeout
 from packaging.utils import canonicalize_name
 
 from . import utils
-from .configuration import validate_config_values
+from .concurrency import AdaptiveLimiter, LoopLagMonitor
+from .configuration import BandersnatchConfig, validate_config_values
+from .connection_pool import PoolOptions
 from .errors import PackageNotFound
 from .filter import LoadedFilters
+from .hedging import HedgeOptions
+from .http_cache import ValidatorCache, Validators
+from .log import setup_logging
 from .master import Master
 from .package import Package
+from .package_index import PACKAGE_INDEX_FILE, PackageIndex
+from .pipeline import ErrorHandler, Pipeline, Stage
+from .processes import Partition, PartitionResult, partition_packages, run_partitions
+from .rate_limit import RateLimits
+from .scheduler import SchedulingPolicy, get_scheduling_policy
+from .shards import ShardCoordinator, ShardOptions
+from .simple import (
+    SIMPLE_JSON_FILE,
+    PageRenderer,
+    RenderedPage,
+    RenderOptions,
+    SimpleFile,
+    SimplePage,
+    data_requires_python,
+    render_page,
+    render_simple_index_json,
+    render_simple_page,
+)
 from .storage import storage_backend_plugins
+from .transfer import DownloadTimeouts, StallMonitor
+from .upstreams import Upstreams
+from .writer import ChunkWriter
 
 LOG_PLUGINS = True
 logger = logging.getLogger(__name__)
+SIMPLE_PAGE_SERIAL_RE = re.compile(r"<!--SERIAL (\d+)-->")
 
 
 class Mirror:
@@ -41,12 +73,35 @@ class Mirror:
     # of it when starting to sync.
     now = None
 
+    # Keep the metadata response as upstream sent it in Package.raw_metadata
+    keep_raw_metadata = False
+    # Order packages are synced in. Without a policy they are synced in the
+    # order sync_packages lists them.
+    scheduling_policy: Optional[SchedulingPolicy] = None
+    # Times metadata is fetched before a package that keeps getting stale
+    # pages fails, and the seconds it's requeued for after the first one
+    # (doubling every time)
+    stale_attempts = 3
+    stale_backoff = 1.0
+    # Times packages that failed are run through the pipeline again at the
+    # end of a sync, and the seconds waited before the first time (doubling)
+    retry_attempts = 0
+    retry_backoff = 10.0
+
     def __init__(self, master: Master, workers: int = 3):
         self.master = master
         self.filters = LoadedFilters(load_all=True)
+        # Upper bound of packages processed concurrently. How many requests are
+        # actually in flight is up to the master's (adaptive) limiters.
         self.workers = workers
-        if self.workers > 10:
-            raise ValueError("Downloading with more than 10 workers is not allowed")
+        # Number of packages in the download stage of the sync pipeline
+        self.download_concurrency = workers
+        # Number of packages in the publish stage of the sync pipeline
+        self.publish_concurrency = 1
+        # Package name -> priority from the scheduling policy for this sync
+        self.priorities: Dict[str, Any] = {}
+        # Project filter plugin name -> number of packages it filtered out
+        self.filtered_projects: Dict[str, int] = {}
 
         # Lets record and report back the changes we do each run
         # Format: dict['pkg_name'] = [set(removed), Set[added]
@@ -106,11 +161,18 @@ class Mirror:
         # as we may delete packages during iteration
         packages = list(self.packages_to_sync.keys())
         for package_name in packages:
-            if not all(
-                plugin.filter({"info": {"name": package_name}})
-                for plugin in filter_plugins
-                if plugin
-            ):
+            rejected_by = next(
+                (
+                    plugin
+                    for plugin in filter_plugins
+                    if plugin and not plugin.filter({"info": {"name": package_name}})
+                ),
+                None,
+            )
+            if rejected_by is not None:
+                self.filtered_projects[rejected_by.name] = (
+                    self.filtered_projects.get(rejected_by.name, 0) + 1
+                )
                 if package_name not in self.packages_to_sync:
                     logger.debug(f"{package_name} not found in packages to sync")
                 else:
@@ -123,51 +185,148 @@ class Mirror:
         """
         raise NotImplementedError()
 
-    async def package_syncer(self, idx: int) -> None:
-        logger.debug(f"Package syncer {idx} started for duty")
-        while True:
-            try:
-                package = self.package_queue.get_nowait()
-                await package.update_metadata(self.master, attempts=3)
-                await self.process_package(package)
-            except asyncio.QueueEmpty:
-                logger.debug(f"Package syncer {idx} emptied queue")
-                break
-            except PackageNotFound:
-                continue
-            except Exception as e:
-                self.on_error(e, package=package)
+    async def fetch_metadata(self, package: Package) -> bool:
+        """First pipeline stage: fetch the package's metadata from the master"""
+        try:
+            await package.update_metadata(
+                self.master,
+                attempts=self.stale_attempts,
+                keep_raw=self.keep_raw_metadata,
+                backoff=self.stale_backoff,
+                requeue_on_stale=True,
+            )
+        except PackageNotFound:
+            return False
+        return True
+
+    async def filter_package(self, package: Package) -> bool:
+        """Second pipeline stage: apply filters to the package's metadata.
+        Returning False stops processing the package."""
+        return True
+
+    async def download_package(self, package: Package) -> bool:
+        """Third pipeline stage: mirror the package. Mirrors that don't split
+        their work into stages only need to implement process_package."""
+        await self.process_package(package)
+        return True
+
+    async def publish_package(self, package: Package) -> bool:
+        """Last pipeline stage: make the mirrored package visible"""
+        return True
 
     async def process_package(self, package: Package) -> None:
         raise NotImplementedError()
 
+    def package_priority(self, package: Package) -> Any:
+        return self.priorities[package.name]
+
+    def pipeline_stages(self) -> List[Stage]:
+        return [
+            Stage(
+                "metadata",
+                self.fetch_metadata,
+                self.workers,
+                priority=self.package_priority if self.scheduling_policy else None,
+            ),
+            Stage("filter", self.filter_package, self.workers, self.workers * 2),
+            Stage(
+                "download",
+                self.download_package,
+                self.download_concurrency,
+                self.download_concurrency * 2,
+            ),
+            Stage(
+                "publish",
+                self.publish_package,
+                self.publish_concurrency,
+                max(self.workers * 2, self.publish_concurrency),
+            ),
+        ]
+
     async def sync_packages(self) -> None:
         try:
-            self.package_queue: asyncio.Queue = asyncio.Queue()
             # Sorting the packages alphabetically makes it more predictable:
             # easier to debug and easier to follow in the logs.
-            for name in sorted(self.packages_to_sync):
-                serial = int(self.packages_to_sync[name])
-                await self.package_queue.put(Package(name, serial=serial))
-
-            sync_coros: List[Awaitable] = [
-                self.package_syncer(idx) for idx in range(self.workers)
+            packages = [
+                Package(name, serial=int(self.packages_to_sync[name]))
+                for name in sorted(self.packages_to_sync)
             ]
-            try:
-                await asyncio.gather(*sync_coros)
-            except KeyboardInterrupt as e:
-                self.on_error(e)
         except (ValueError, TypeError) as e:
             # This is for when self.packages_to_sync isn't of type Dict[str, int]
             # Which occurs during testing or if BandersnatchMirror's todolist is
             # corrupted in determine_packages_to_sync()
             # TODO Remove this check by following packages_to_sync's typing
             self.on_error(e)
+            return
+
+        if self.scheduling_policy is not None:
+            logger.info(f"Ordering packages {self.scheduling_policy.name}")
+            loop = asyncio.get_event_loop()
+            self.priorities = await loop.run_in_executor(
+                None, self.scheduling_policy.priorities, packages
+            )
+
+        self.pipeline = Pipeline(
+            self.pipeline_stages(),
+            self._pipeline_error_handler(final=not self.retry_attempts),
+        )
+        try:
+            await self.pipeline.run(packages)
+        except KeyboardInterrupt as e:
+            self.on_error(e)
+            return
+        finally:
+            for stage in self.pipeline.stages:
+                logger.info(f"Pipeline stage {stage}")
+        try:
+            await self.retry_failed_packages(self.pipeline.failures)
+        except KeyboardInterrupt as e:
+            self.on_error(e)
+
+    def _pipeline_error_handler(self, final: bool) -> ErrorHandler:
+        def on_error(exception: BaseException, package: Package) -> None:
+            if final:
+                self.on_error(exception, package=package)
+            else:
+                logger.warning(
+                    f"Error syncing package: {package.name}@{package.serial}, "
+                    + f"retrying it later: {exception!r}"
+                )
+
+        return on_error
+
+    async def retry_failed_packages(self, failures: List[Tuple[int, Package]]) -> None:
+        """Run packages that failed in the sync pipeline through the stages
+        from the one they failed in again, waiting longer before every
+        attempt. Only failures of the last attempt are passed to on_error."""
+        for attempt in range(1, self.retry_attempts + 1):
+            if not failures:
+                return
+            delay = self.retry_backoff * 2 ** (attempt - 1)
+            logger.info(
+                f"Retrying {len(failures)} failed packages in {delay:.0f}s "
+                + f"(attempt {attempt} of {self.retry_attempts})"
+            )
+            await asyncio.sleep(delay)
+            final = attempt == self.retry_attempts
+            on_error = self._pipeline_error_handler(final)
+            retried: List[Tuple[int, Package]] = []
+            for start in sorted({index for index, _ in failures}):
+                pipeline = Pipeline(self.pipeline_stages()[start:], on_error)
+                await pipeline.run(
+                    [package for index, package in failures if index == start]
+                )
+                retried.extend(
+                    (start + index, package) for index, package in pipeline.failures
+                )
+            failures = retried
+        if failures and self.retry_attempts:
+            logger.error(f"{len(failures)} packages still failed after retrying")
 
     def finalize_sync(self) -> None:
         raise NotImplementedError()
 
-    def on_error(self, exception: BaseException, **kwargs: Dict) -> None:
+    def on_error(self, exception: BaseException, **kwargs: Any) -> None:
         raise NotImplementedError()
 
 
@@ -178,6 +337,13 @@ class BandersnatchMirror(Mirror):
 
     need_wrapup = False
 
+    # Shared release file download pool - only set while sync_packages runs
+    download_queue: Optional[asyncio.Queue] = None
+
+    # Finished packages are appended to the todo journal. The todo list itself
+    # is only rewritten (compacted) after this many finished packages.
+    todo_compaction_interval = 1000
+
     def __init__(
         self,
         homedir: Path,
@@ -198,9 +364,31 @@ class BandersnatchMirror(Mirror):
         *,
         cleanup: bool = False,
         release_files_save: bool = True,
+        download_workers: int = 0,
+        existing_file_check: str = "full",
+        json_passthrough: bool = False,
+        http_cache: str = "",
+        skip_unchanged: bool = False,
+        package_order: str = "alphabetical",
+        download_stats: str = "",
+        stale_attempts: int = 3,
+        stale_backoff: float = 1.0,
+        retry_attempts: int = 0,
+        retry_backoff: float = 10.0,
+        shard: Optional[ShardOptions] = None,
+        processes: int = 1,
+        partition: Optional[Partition] = None,
+        render: Optional[RenderOptions] = None,
+        simple_json: bool = False,
+        read_only: bool = False,
     ) -> None:
         super().__init__(master=master, workers=workers)
         self.cleanup = cleanup
+        # Only look at the mirror, e.g. to plan a sync: nothing is set up,
+        # locked, removed or written
+        self.read_only = read_only
+        # Whether to resume from the todo list if there is one
+        self.resume_todo = True
 
         if storage_backend:
             self.storage_backend = next(iter(storage_backend_plugins(storage_backend)))
@@ -209,7 +397,12 @@ class BandersnatchMirror(Mirror):
         self.stop_on_error = stop_on_error
         self.loop = asyncio.get_event_loop()
         self.homedir = self.storage_backend.PATH_BACKEND(str(homedir))
-        self.lockfile_path = self.homedir / ".lock"
+        # Which of the mirror's packages we sync. Each shard keeps its lock, todo
+        # list, package index and serial in its own state directory.
+        self.shard = shard or ShardOptions()
+        self.statedir = self.shard.directory(self.homedir)
+        self.lockfile_path = self.statedir / ".lock"
+        self.flock_timeout = flock_timeout
         self.master = master
         self.filters = LoadedFilters(load_all=True)
 
@@ -220,6 +413,21 @@ class BandersnatchMirror(Mirror):
         self.json_save = json_save
         # Whether or not to mirror PyPI release files to disk
         self.release_files_save = release_files_save
+        # How much to trust release files that are already on disk: "full"
+        # checks the hash, "size" the file size and "exists" nothing at all.
+        # File names contain their hash so a present file is rarely wrong.
+        self.existing_file_check = existing_file_check
+        # Write upstream's JSON metadata as is instead of re-serializing it
+        self.keep_raw_metadata = json_save and json_passthrough
+        # Revalidate saved JSON metadata with upstream instead of refetching it
+        self.validator_cache: Optional[ValidatorCache] = None
+        if json_save and http_cache:
+            # A read-only mirror doesn't create a cache that isn't there yet
+            if not read_only or Path(http_cache).exists():
+                self.validator_cache = ValidatorCache(http_cache)
+        # Keep partially downloaded files so an interrupted download can be
+        # continued. This appends to files in place, so only for local storage.
+        self.resume_downloads = self.storage_backend.PATH_BACKEND is Path
         self.hash_index = hash_index
         # Allow configuring a root_uri to make generated index pages absolute.
         # This is generally not necessary, but was added for the official internal
@@ -231,12 +439,51 @@ class BandersnatchMirror(Mirror):
         self.diff_full_path = diff_full_path
         self.keep_index_versions = keep_index_versions
         self.digest_name = digest_name if digest_name else "sha256"
+        # Write PEP 691 JSON simple pages next to the HTML ones
+        self.simple_json = simple_json
         self.workers = workers
         self.diff_file_list = diff_file_list or []
-        if self.workers > 10:
-            raise ValueError("Downloading with more than 10 workers is not allowed.")
+        # Number of release files downloaded concurrently across all packages
+        self.download_workers = download_workers or workers
+        # Packages waiting on the download pool at once. This bounds how much
+        # metadata we hold in memory while keeping the pool busy.
+        self.download_concurrency = self.download_workers * 4
+        # Disk writes and hashing of downloads happen here instead of blocking
+        # the event loop
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=self.download_workers, thread_name_prefix="bandersnatch-io"
+        )
         self._bootstrap(flock_timeout)
         self._finish_lock = RLock()
+        self._journal_entries = 0
+        self.package_index = PackageIndex(
+            self.storage_backend, self.statedir / PACKAGE_INDEX_FILE
+        )
+        self.rebuild_package_index = False
+        # Skip packages whose mirrored serial is already current when syncing
+        # from a full package listing or resuming from a todo list
+        self.skip_unchanged = skip_unchanged
+        # Local file of package download counts for the popular-first order
+        self.download_stats = download_stats
+        self.scheduling_policy = get_scheduling_policy(package_order, self)
+        self.stale_attempts = stale_attempts
+        self.stale_backoff = stale_backoff
+        # Stopping on the first error leaves nothing to retry
+        self.retry_attempts = 0 if stop_on_error else retry_attempts
+        self.retry_backoff = retry_backoff
+        # Child processes the packages to sync are split between
+        self.processes = processes
+        # The packages to sync when running in a child process. The parent
+        # keeps the todo list, package index, root index page and serial.
+        self.partition = partition
+        # Render simple pages in batches in a process pool. Partitions already
+        # run in processes of their own, which can't start further ones.
+        self.page_renderer: Optional[PageRenderer] = None
+        render = render or RenderOptions()
+        if render.enabled and partition is None:
+            self.page_renderer = PageRenderer(render, simple_json)
+            # Enough packages waiting on the renderer to fill a batch
+            self.publish_concurrency = render.batch_size
 
     @property
     def webdir(self) -> Path:
@@ -244,21 +491,40 @@ class BandersnatchMirror(Mirror):
 
     @property
     def todolist(self) -> Path:
-        return self.homedir / "todo"
+        return self.statedir / "todo"
+
+    @property
+    def todo_journal(self) -> Path:
+        return self.statedir / "todo.journal"
+
+    @property
+    def staging_dir(self) -> Path:
+        return self.homedir / "staging"
 
     async def determine_packages_to_sync(self) -> None:
         """
         Update the self.packages_to_sync to contain packages that need to be
         synced.
         """
+        if self.partition is not None:
+            self.packages_to_sync = dict(self.partition.packages)
+            self.target_serial = self.partition.target_serial
+            # Finished packages are journaled for the parent's todo list
+            self.need_wrapup = True
+            logger.info(
+                f"Syncing partition {self.partition.number}: "
+                + f"{len(self.packages_to_sync)} packages."
+            )
+            return
         # In case we don't find any changes we will stay on the currently
         # synced serial.
         self.target_serial = self.synced_serial
         self.packages_to_sync = {}
         logger.info(f"Current mirror serial: {self.synced_serial}")
         self.need_wrapup = True
+        resuming = self.resume_todo and self.storage_backend.exists(self.todolist)
 
-        if self.storage_backend.exists(self.todolist):
+        if resuming:
             # We started a sync previously and left a todo list as well as the
             # targetted serial. We'll try to keep going through the todo list
             # and then mark the targetted serial as done
@@ -269,6 +535,11 @@ class BandersnatchMirror(Mirror):
                 for line in saved_todo:
                     package, serial = line.strip().split()
                     self.packages_to_sync[package] = int(serial)
+            for package in self._read_todo_journal():
+                self.packages_to_sync.pop(package, None)
+            # Packages finished by the interrupted run never made it into the
+            # package index
+            self.rebuild_package_index = True
         elif not self.synced_serial:
             logger.info("Syncing all packages.")
             # First get the current serial, then start to sync. This makes us
@@ -279,6 +550,7 @@ class BandersnatchMirror(Mirror):
             self.target_serial = max(
                 [self.synced_serial] + [int(v) for v in self.packages_to_sync.values()]
             )
+            self._filter_shard()
         else:
             logger.info("Syncing based on changelog.")
             changed_packages = await self.master.changed_packages(self.synced_serial)
@@ -286,51 +558,272 @@ class BandersnatchMirror(Mirror):
             self.target_serial = max(
                 [self.synced_serial] + [int(v) for v in self.packages_to_sync.values()]
             )
+            self._filter_shard()
             # We can avoid writing the main index page if we don't have
             # anything todo at all during a changelog-based sync.
             self.need_index_sync = bool(self.packages_to_sync)
 
+        if self.skip_unchanged and (resuming or not self.synced_serial):
+            skipped = await self.loop.run_in_executor(
+                self.io_executor, self._skip_unchanged_packages
+            )
+            logger.info(f"Skipping {skipped} packages already mirrored at their serial")
+
         self._filter_packages()
         logger.info(f"Trying to reach serial: {self.target_serial}")
         pkg_count = len(self.packages_to_sync)
         logger.info(f"{pkg_count} packages to sync.")
 
+    def _filter_shard(self) -> None:
+        """Drop the packages other shards sync. The target serial is taken
+        before this so every shard works towards the same one."""
+        if not self.shard.enabled:
+            return
+        self.packages_to_sync = {
+            name: serial
+            for name, serial in self.packages_to_sync.items()
+            if self.shard.owns(name)
+        }
+        logger.info(
+            f"Syncing shard {self.shard.shard_index} of {self.shard.shard_count}."
+        )
+
+    def mirrored_serial(self, package_name: str) -> int:
+        """The serial package_name was last mirrored at, 0 if we don't know"""
+        serial = self.package_index.serial(package_name)
+        if serial:
+            return serial
+        # Pages written before the package index kept serials
+        simple_page = self.simple_directory(Package(package_name)) / "index.html"
+        if not self.storage_backend.exists(simple_page):
+            return 0
+        content = self.storage_backend.read_file(simple_page, text=True)
+        assert isinstance(content, str)
+        match = SIMPLE_PAGE_SERIAL_RE.search(content[-64:])
+        return int(match.group(1)) if match else 0
+
+    def _skip_unchanged_packages(self) -> int:
+        skipped = [
+            name
+            for name, serial in self.packages_to_sync.items()
+            if serial and self.mirrored_serial(name) >= int(serial)
+        ]
+        for name in skipped:
+            del self.packages_to_sync[name]
+        return len(skipped)
+
     async def process_package(self, package: Package) -> None:
+        if not await self.filter_package(package):
+            return None
+        await self.download_package(package)
+        await self.publish_package(package)
+
+    async def fetch_metadata(self, package: Package) -> bool:
+        if self.validator_cache is None:
+            return await super().fetch_metadata(package)
+
+        validators = await self.loop.run_in_executor(
+            self.io_executor, self._cached_validators, package.name
+        )
+        try:
+            await package.update_metadata(
+                self.master,
+                attempts=self.stale_attempts,
+                keep_raw=self.keep_raw_metadata,
+                conditional=True,
+                validators=validators,
+                backoff=self.stale_backoff,
+                requeue_on_stale=True,
+            )
+        except PackageNotFound:
+            return False
+        self.validator_cache.record(not package.not_modified)
+        if package.not_modified:
+            # Upstream confirmed the copy we saved last time is still current
+            raw_metadata = await self.loop.run_in_executor(
+                self.io_executor,
+                partial(
+                    self.storage_backend.read_file,
+                    self.json_file(package.name),
+                    text=False,
+                ),
+            )
+            assert isinstance(raw_metadata, bytes)
+            package.load_metadata(raw_metadata)
+        return True
+
+    def _cached_validators(self, package_name: str) -> Optional[Validators]:
+        """Validators are only worth sending if we still have the copy of the
+        metadata they belong to"""
+        assert self.validator_cache is not None
+        if not self.storage_backend.exists(self.json_file(package_name)):
+            return None
+        return self.validator_cache.get(package_name)
+
+    async def filter_package(self, package: Package) -> bool:
         # Don't save anything if our metadata filters all fail.
         if not package.filter_metadata(self.filters.filter_metadata_plugins()):
-            return None
+            return False
 
         # save the metadata before filtering releases
         # (dalley): why? the original author does not remember, and it doesn't seem
         # to make a lot of sense.
         # https://github.com/pypa/bandersnatch/commit/2a8cf8441b97f28eb817042a65a042d680fa527e#r39676370
-        if self.json_save:
+        if self.json_save and not package.not_modified:
             loop = asyncio.get_event_loop()
             json_saved = await loop.run_in_executor(
-                None, self.save_json_metadata, package.metadata, package.name
+                None,
+                self.save_json_metadata,
+                package.metadata,
+                package.name,
+                package.raw_metadata,
             )
             assert json_saved
+            # Parsed metadata is all we need from here on
+            package.raw_metadata = None
+        if self.validator_cache is not None and package.validators is not None:
+            await self.loop.run_in_executor(
+                self.io_executor,
+                self.validator_cache.set,
+                package.name,
+                package.validators,
+            )
 
         package.filter_all_releases_files(self.filters.filter_release_file_plugins())
         package.filter_all_releases(self.filters.filter_release_plugins())
+        return True
 
+    async def download_package(self, package: Package) -> bool:
         if self.release_files_save:
             await self.sync_release_files(package)
+        return True
 
-        self.sync_simple_page(package)
+    async def publish_package(self, package: Package) -> bool:
+        if self.page_renderer is not None:
+            await self.render_simple_page(package)
+        else:
+            self.sync_simple_page(package)
         # XMLRPC PyPI Endpoint stores raw_name so we need to provide it
         self.record_finished_package(package.raw_name)
 
         # Cleanup old legacy non PEP 503 Directories created for the Simple API
         await self.cleanup_non_pep_503_paths(package)
+        return True
+
+    async def download_worker(self, idx: int) -> None:
+        assert self.download_queue is not None
+        logger.debug(f"Download worker {idx} started for duty")
+        while True:
+            url, sha256sum, size, result = await self.download_queue.get()
+            try:
+                downloaded_file = await self.download_file(url, sha256sum, size=size)
+            except Exception as e:
+                if not result.cancelled():
+                    result.set_exception(e)
+            else:
+                if not result.cancelled():
+                    result.set_result(downloaded_file)
+            finally:
+                self.download_queue.task_done()
+
+    async def sync_packages(self) -> None:
+        if self.need_wrapup:
+            # Start from a compact todo list that finished packages get
+            # journaled against
+            self._write_todo()
+        if self.processes > 1 and len(self.packages_to_sync) > 1:
+            await self.sync_partitions()
+        else:
+            await self.sync_packages_in_process()
+        if self.need_wrapup:
+            self._write_todo()
+
+    async def sync_packages_in_process(self) -> None:
+        self.download_queue = asyncio.Queue()
+        download_workers = [
+            asyncio.ensure_future(self.download_worker(idx))
+            for idx in range(self.download_workers)
+        ]
+        if self.page_renderer is not None:
+            self.page_renderer.start()
+        try:
+            await super().sync_packages()
+        finally:
+            for worker in download_workers:
+                worker.cancel()
+            await asyncio.gather(*download_workers, return_exceptions=True)
+            self.download_queue = None
+            if self.page_renderer is not None:
+                self.page_renderer.close()
+            # The caches only write in batches
+            if self.validator_cache is not None:
+                self.validator_cache.commit()
+            if self.storage_backend.hash_cache is not None:
+                self.storage_backend.hash_cache.commit()
+
+    async def sync_partitions(self) -> None:
+        """Sync the packages in child processes, see processes.py"""
+        debug = logger.isEnabledFor(logging.DEBUG)
+        packages = [
+            partition
+            for partition in partition_packages(self.packages_to_sync, self.processes)
+            if partition
+        ]
+        partitions = [
+            Partition(
+                number,
+                partition,
+                int(self.target_serial or 0),
+                debug,
+                processes=len(packages),
+            )
+            for number, partition in enumerate(packages)
+        ]
+        config_file = BandersnatchConfig().config_file or ""
+        results = await run_partitions(sync_partition, config_file, partitions)
+        self.packages_to_sync = {}
+        stopped = False
+        for result in results:
+            self.altered_packages.update(result.altered_packages)
+            self.diff_file_list.extend(
+                self.storage_backend.PATH_BACKEND(path)
+                for path in result.diff_file_list
+            )
+            for name, serial in result.package_serials.items():
+                self.package_index.add([name], serial)
+            self.packages_to_sync.update(result.unfinished)
+            self.errors = self.errors or result.errors
+            stopped = stopped or result.stopped
+        if stopped:
+            logger.error("Exiting early after error.")
+            sys.exit(1)
+
+    def partition_result(self, stopped: bool = False) -> PartitionResult:
+        assert self.partition is not None
+        synced = [
+            name
+            for name in self.partition.packages
+            if name not in self.packages_to_sync and name in self.package_index
+        ]
+        return PartitionResult(
+            altered_packages=self.altered_packages,
+            diff_file_list=[str(path) for path in self.diff_file_list],
+            package_serials={name: self.package_index.serial(name) for name in synced},
+            unfinished=self.packages_to_sync,
+            errors=self.errors,
+            stopped=stopped,
+        )
 
     def finalize_sync(self) -> None:
+        if self.partition is not None:
+            # The parent process finalizes the sync once every partition is done
+            return
         self.sync_index_page()
         if self.need_wrapup:
             self.wrapup_successful_sync()
         return None
 
-    def on_error(self, exception: BaseException, **kwargs: Dict) -> None:
+    def on_error(self, exception: BaseException, **kwargs: Any) -> None:
         self.errors = True
         if isinstance(exception, KeyboardInterrupt):
             # Setting self.errors to True to ensure we don't save Serial
@@ -369,12 +862,39 @@ class BandersnatchMirror(Mirror):
                 # killed e.g. by the timeout wrapper. Just remove it - we'll
                 # just have to do whatever happened since the last successful
                 # sync.
+                if self.read_only:
+                    logger.error("Ignoring inconsistent todo list.")
+                    self.resume_todo = False
+                    return
                 logger.error("Removing inconsistent todo list.")
                 self.storage_backend.delete_file(self.todolist)
-
-    def record_finished_package(self, name: str) -> None:
+        if self.read_only:
+            return
+        if not self.storage_backend.exists(
+            self.todolist
+        ) and self.storage_backend.exists(self.todo_journal):
+            # A journal is meaningless without the todo list it refers to
+            logger.error("Removing todo journal without todo list.")
+            self.storage_backend.delete_file(self.todo_journal)
+
+    def _read_todo_journal(self) -> Set[str]:
+        """Return the packages finished since the todo list was last written.
+
+        Anything after the last newline was cut off while being written (e.g.
+        we got killed) and is ignored: that package is simply synced again."""
+        if not self.storage_backend.exists(self.todo_journal):
+            return set()
+        journal = self.storage_backend.read_file(self.todo_journal, text=True)
+        assert isinstance(journal, str)
+        return {name for name in journal.split("\n")[:-1] if name}
+
+    def _write_todo(self) -> None:
+        """Write the packages we still have to sync and start a new journal"""
+        if self.partition is not None:
+            # The parent process owns the todo list, we only append to the
+            # journal
+            return
         with self._finish_lock:
-            del self.packages_to_sync[name]
             with self.storage_backend.update_safe(
                 self.todolist, mode="w+", encoding="utf-8"
             ) as f:
@@ -386,6 +906,24 @@ class BandersnatchMirror(Mirror):
                     for name_, serial in self.packages_to_sync.items()
                 ]
                 f.write("\n".join(todo))
+            if self.storage_backend.exists(self.todo_journal):
+                self.storage_backend.delete_file(self.todo_journal)
+            self._journal_entries = 0
+
+    def record_finished_package(self, name: str) -> None:
+        with self._finish_lock:
+            # A package retried after failing late in the pipeline may have
+            # been recorded before
+            self.packages_to_sync.pop(name, None)
+            if not self.need_wrapup:
+                # Not working towards a serial so there is no todo list to keep
+                return
+            # Appending one line per package keeps this O(1) instead of
+            # rewriting the whole todo list every time
+            self.storage_backend.append_file(self.todo_journal, f"{name}\n")
+            self._journal_entries += 1
+            if self._journal_entries >= self.todo_compaction_interval:
+                self._write_todo()
 
     async def cleanup_non_pep_503_paths(self, package: Package) -> None:
         """
@@ -468,6 +1006,24 @@ class BandersnatchMirror(Mirror):
     def sync_index_page(self) -> None:
         if not self.need_index_sync:
             return
+        simple_dir = self.webdir / "simple"
+        if self.rebuild_package_index or not self.package_index.exists():
+            # This will either be the simple dir, or if we are using index
+            # directory hashing, a list of subdirs to process.
+            self.package_index.rebuild(
+                pkg
+                for subdir in self.get_simple_dirs(simple_dir)
+                for pkg in self.find_package_indexes_in_dir(subdir)
+                if self.shard.owns(pkg)
+            )
+            self.rebuild_package_index = False
+        self.package_index.save()
+        if self.shard.enabled:
+            # The coordinator writes the root page once every shard is done
+            return
+        self.write_index_page(self.package_index)
+
+    def write_index_page(self, package_index: PackageIndex) -> None:
         logger.info("Generating global index page.")
         simple_dir = self.webdir / "simple"
         with self.storage_backend.rewrite(str(simple_dir / "index.html")) as f:
@@ -477,34 +1033,71 @@ class BandersnatchMirror(Mirror):
             f.write("    <title>Simple Index</title>\n")
             f.write("  </head>\n")
             f.write("  <body>\n")
-            # This will either be the simple dir, or if we are using index
-            # directory hashing, a list of subdirs to process.
-            for subdir in self.get_simple_dirs(simple_dir):
-                for pkg in self.find_package_indexes_in_dir(subdir):
-                    # We're really trusty that this is all encoded in UTF-8. :/
-                    f.write(f'    <a href="{pkg}/">{pkg}</a><br/>\n')
+            for pkg in package_index:
+                # We're really trusty that this is all encoded in UTF-8. :/
+                f.write(f'    <a href="{pkg}/">{pkg}</a><br/>\n')
             f.write("  </body>\n</html>")
         self.diff_file_list.append(simple_dir / "index.html")
+        if self.simple_json:
+            with self.storage_backend.rewrite(str(simple_dir / SIMPLE_JSON_FILE)) as f:
+                f.write(render_simple_index_json(package_index))
+            self.diff_file_list.append(simple_dir / SIMPLE_JSON_FILE)
 
     def wrapup_successful_sync(self) -> None:
         if self.errors:
             return
         self.synced_serial = int(self.target_serial) if self.target_serial else 0
-        if self.todolist.exists():
-            self.todolist.unlink()
+        for path in [self.todolist, self.todo_journal]:
+            if path.exists():
+                path.unlink()
         logger.info(f"New mirror serial: {self.synced_serial}")
-        last_modified = self.homedir / "web" / "last-modified"
         if not self.now:
             logger.error(
                 "strftime did not return a valid time - Not updating last modified"
             )
             return
 
-        with self.storage_backend.rewrite(str(last_modified)) as f:
-            f.write(self.now.strftime("%Y%m%dT%H:%M:%S\n"))
+        if self.shard.enabled:
+            self._save()
+            self.coordinate_shards(self.now)
+            return
+        self.write_last_modified(self.now)
         self._save()
 
+    def write_last_modified(self, now: datetime.datetime) -> None:
+        last_modified = self.homedir / "web" / "last-modified"
+        with self.storage_backend.rewrite(str(last_modified)) as f:
+            f.write(now.strftime("%Y%m%dT%H:%M:%S\n"))
+
+    def coordinate_shards(self, now: datetime.datetime) -> None:
+        """Advance the mirror's serial and root index page if this was the
+        last shard to reach a serial"""
+        coordinator = ShardCoordinator(self.storage_backend, self.homedir, self.shard)
+        flock = self.storage_backend.get_lock(str(coordinator.lockfile_path))
+        try:
+            with flock.acquire(timeout=self.flock_timeout):
+                serial = coordinator.advance()
+                if serial is None:
+                    return
+                package_index = coordinator.merged_package_index()
+                package_index.save()
+                self.write_index_page(package_index)
+                self.write_last_modified(now)
+                coordinator.save(serial)
+                logger.info(f"Every shard reached serial {serial}")
+        except Timeout:
+            # Another shard is coordinating right now. It either sees our
+            # serial or a later run of some shard will.
+            logger.info(f"Could not acquire lock on {coordinator.lockfile_path}")
+
     def _bootstrap(self, flock_timeout: float = 1.0) -> None:
+        if self.read_only:
+            # _load tells _validate_todo not to bother if the todo list is
+            # out of date anyway
+            self._load()
+            if self.resume_todo:
+                self._validate_todo()
+            return
         paths = [
             self.storage_backend.PATH_BACKEND(""),
             self.storage_backend.PATH_BACKEND("web/simple"),
@@ -524,6 +1117,9 @@ class BandersnatchMirror(Mirror):
             if not path.exists():
                 logger.info(f"Setting up mirror directory: {path}")
                 path.mkdir(parents=True)
+        if not self.statedir.exists():
+            logger.info(f"Setting up shard directory: {self.statedir}")
+            self.statedir.mkdir(parents=True)
 
         flock = self.storage_backend.get_lock(str(self.lockfile_path))
         try:
@@ -540,14 +1136,18 @@ class BandersnatchMirror(Mirror):
 
     @property
     def statusfile(self) -> Path:
-        return self.storage_backend.PATH_BACKEND(str(self.homedir)) / "status"
+        return self.storage_backend.PATH_BACKEND(str(self.statedir)) / "status"
 
     @property
     def generationfile(self) -> Path:
         return self.storage_backend.PATH_BACKEND(str(self.homedir)) / "generation"
 
     def _reset_mirror_status(self) -> None:
-        for path in [self.statusfile, self.todolist]:
+        if self.read_only:
+            # Carry on as if the status files were gone
+            self.resume_todo = False
+            return
+        for path in [self.statusfile, self.todolist, self.todo_journal]:
             if path.exists():
                 path.unlink()
 
@@ -578,7 +1178,11 @@ class BandersnatchMirror(Mirror):
             generation = 5
         if generation != CURRENT_GENERATION:
             raise RuntimeError(f"Unknown generation {generation} found")
-        self.generationfile.write_text(str(CURRENT_GENERATION), encoding="ascii")
+        if not self.read_only:
+            self.generationfile.write_text(str(CURRENT_GENERATION), encoding="ascii")
+        elif not self.resume_todo:
+            # The status files would have been reset
+            return
         # Now, actually proceed towards using the status files.
         if not self.statusfile.exists():
             logger.info(f"Status file {self.statusfile} missing. Starting over.")
@@ -604,14 +1208,21 @@ class BandersnatchMirror(Mirror):
             return Path(self.webdir / "simple" / package.name[0] / package.name)
         return Path(self.webdir / "simple" / package.name)
 
-    def save_json_metadata(self, package_info: Dict, name: str) -> bool:
+    def save_json_metadata(
+        self, package_info: Dict, name: str, raw_metadata: Optional[bytes] = None
+    ) -> bool:
         """
-        Take the JSON metadata we just fetched and save to disk
+        Take the JSON metadata we just fetched and save to disk. If we have the
+        raw response it is written as is instead of serializing package_info.
         """
         try:
             # TODO: Fix this so it works with swift
-            with self.storage_backend.rewrite(self.json_file(name)) as jf:
-                dump(package_info, jf, indent=4, sort_keys=True)
+            if raw_metadata is not None:
+                with self.storage_backend.rewrite(self.json_file(name), "wb") as jf:
+                    jf.write(raw_metadata)
+            else:
+                with self.storage_backend.rewrite(self.json_file(name)) as jf:
+                    dump(package_info, jf, indent=4, sort_keys=True)
             self.diff_file_list.append(self.json_file(name))
         except Exception as e:
             logger.error(
@@ -635,84 +1246,139 @@ class BandersnatchMirror(Mirror):
         """ Purge + download files returning files removed + added """
         downloaded_files = set()
         deferred_exception = None
-        for release_file in package.release_files:
-            try:
-                downloaded_file = await self.download_file(
-                    release_file["url"], release_file["digests"]["sha256"]
-                )
-                if downloaded_file:
-                    downloaded_files.add(str(downloaded_file.relative_to(self.homedir)))
-            except Exception as e:
-                logger.exception(
+        results: List[Any]
+        if self.download_queue is not None:
+            results = await asyncio.gather(
+                *[
+                    self._queue_download(
+                        release_file["url"],
+                        release_file["digests"]["sha256"],
+                        release_file.get("size"),
+                    )
+                    for release_file in package.release_files
+                ],
+                return_exceptions=True,
+            )
+        else:
+            results = []
+            for release_file in package.release_files:
+                try:
+                    results.append(
+                        await self.download_file(
+                            release_file["url"],
+                            release_file["digests"]["sha256"],
+                            size=release_file.get("size"),
+                        )
+                    )
+                except Exception as e:
+                    results.append(e)
+
+        for release_file, result in zip(package.release_files, results):
+            if isinstance(result, Exception):
+                logger.error(
                     "Continuing to next file after error downloading: "
-                    f"{release_file['url']}"
+                    f"{release_file['url']}",
+                    exc_info=result,
                 )
                 if not deferred_exception:  # keep first exception
-                    deferred_exception = e
+                    deferred_exception = result
+            elif result:
+                downloaded_files.add(str(result.relative_to(self.homedir)))
         if deferred_exception:
             raise deferred_exception  # raise the exception after trying all files
 
         self.altered_packages[package.name] = downloaded_files
 
-    def gen_data_requires_python(self, release: Dict) -> str:
-        if "requires_python" in release and release["requires_python"] is not None:
-            return f' data-requires-python="{html.escape(release["requires_python"])}"'
-        return ""
+    def _queue_download(
+        self, url: str, sha256sum: str, size: Optional[int] = None
+    ) -> "asyncio.Future":
+        assert self.download_queue is not None
+        result = asyncio.get_event_loop().create_future()
+        self.download_queue.put_nowait((url, sha256sum, size, result))
+        return result
 
-    def generate_simple_page(self, package: Package) -> str:
-        # Generate the header of our simple page.
-        simple_page_content = (
-            "<!DOCTYPE html>\n"
-            "<html>\n"
-            "  <head>\n"
-            "    <title>Links for {0}</title>\n"
-            "  </head>\n"
-            "  <body>\n"
-            "    <h1>Links for {0}</h1>\n"
-        ).format(package.raw_name)
+    def gen_data_requires_python(self, release: Dict) -> str:
+        return data_requires_python(release.get("requires_python"))
 
+    def simple_page(self, package: Package) -> SimplePage:
+        """What goes on the simple page of package, without its metadata"""
         release_files = package.release_files
         logger.debug(f"There are {len(release_files)} releases for {package.name}")
         # Lets sort based on the filename rather than the whole URL
         release_files.sort(key=lambda x: x["filename"])
 
         digest_name = self.digest_name
-
-        simple_page_content += "\n".join(
+        return SimplePage(
+            package.raw_name,
             [
-                '    <a href="{}#{}={}"{}>{}</a><br/>'.format(
+                SimpleFile(
+                    r["filename"],
                     self._file_url_to_local_url(r["url"]),
-                    digest_name,
                     r["digests"][digest_name],
-                    self.gen_data_requires_python(r),
-                    r["filename"],
+                    r.get("requires_python"),
+                    self._release_file_size(r),
                 )
                 for r in release_files
-            ]
+            ],
+            digest_name,
+            package.last_serial,
+            tuple(package.releases),
         )
 
-        simple_page_content += (
-            f"\n  </body>\n</html>\n<!--SERIAL {package.last_serial}-->"
-        )
+    def _release_file_size(self, release_file: Dict) -> Optional[int]:
+        """The size upstream reports, or else that of the file we mirrored for
+        the JSON page"""
+        size: Optional[int] = release_file.get("size")
+        if size is not None or not self.simple_json or not self.release_files_save:
+            return size
+        path = self._file_url_to_local_path(release_file["url"])
+        if not self.storage_backend.exists(path):
+            return None
+        return self.storage_backend.get_file_size(path)
 
-        return simple_page_content
+    def generate_simple_page(self, package: Package) -> str:
+        return render_simple_page(self.simple_page(package))
 
     def sync_simple_page(self, package: Package) -> None:
         logger.info(
             f"Storing index page: {package.name} - in {self.simple_directory(package)}"
         )
-        simple_page_content = self.generate_simple_page(package)
+        rendered = render_page(self.simple_page(package), self.simple_json)
+        self.write_simple_page(package, rendered)
+        self.package_index.add([package.name], package.last_serial)
+
+    async def render_simple_page(self, package: Package) -> None:
+        """sync_simple_page, rendering the page in the process pool and
+        writing it in the I/O thread pool"""
+        assert self.page_renderer is not None
+        logger.info(
+            f"Storing index page: {package.name} - in {self.simple_directory(package)}"
+        )
+        rendered = await self.page_renderer.render(self.simple_page(package))
+        await self.loop.run_in_executor(
+            self.io_executor, self.write_simple_page, package, rendered
+        )
+        self.package_index.add([package.name], package.last_serial)
+
+    def write_simple_page(self, package: Package, rendered: RenderedPage) -> None:
         if not self.simple_directory(package).exists():
-            self.simple_directory(package).mkdir(parents=True)
+            self.simple_directory(package).mkdir(parents=True, exist_ok=True)
 
         if self.keep_index_versions > 0:
-            self._save_simple_page_version(simple_page_content, package)
+            self._save_simple_page_version(rendered.html, package)
         else:
             simple_page = self.simple_directory(package) / "index.html"
             with self.storage_backend.rewrite(simple_page, "w", encoding="utf-8") as f:
-                f.write(simple_page_content)
+                f.write(rendered.html)
             self.diff_file_list.append(simple_page)
 
+        if rendered.json is not None:
+            # Only the HTML page is kept in versions
+            simple_json = self.simple_directory(package) / SIMPLE_JSON_FILE
+            with self.storage_backend.rewrite(simple_json, "w", encoding="utf-8") as f:
+                f.write(rendered.json)
+            self.diff_file_list.append(simple_json)
+
     def _save_simple_page_version(
         self, simple_page_content: str, package: Package
     ) -> None:
@@ -765,63 +1431,318 @@ class BandersnatchMirror(Mirror):
         return self.webdir / path
 
     # TODO: This can also return SwiftPath instances now...
+    def _existing_file_valid(
+        self, path: Path, sha256sum: str, size: Optional[int] = None
+    ) -> bool:
+        if self.existing_file_check == "exists":
+            return True
+        if self.existing_file_check == "size" and size is not None:
+            existing_size = self.storage_backend.get_file_size(str(path))
+            if existing_size == size:
+                return True
+            logger.info(
+                f"Size mismatch with local file {path}: expected {size} "
+                + f"got {existing_size}, will re-download."
+            )
+            return False
+        existing_hash = self.storage_backend.get_cached_hash(str(path))
+        if existing_hash == sha256sum:
+            return True
+        logger.info(
+            f"Checksum mismatch with local file {path}: expected {sha256sum} "
+            + f"got {existing_hash}, will re-download."
+        )
+        return False
+
     async def download_file(
-        self, url: str, sha256sum: str, chunk_size: int = 64 * 1024
+        self,
+        url: str,
+        sha256sum: str,
+        chunk_size: int = 64 * 1024,
+        size: Optional[int] = None,
     ) -> Optional[Path]:
         path = self._file_url_to_local_path(url)
+        loop = asyncio.get_event_loop()
+        need_download = await loop.run_in_executor(
+            self.io_executor, self._prepare_download, path, sha256sum, size
+        )
+        if not need_download:
+            return None
 
-        # Avoid downloading again if we have the file and it matches the hash.
-        if path.exists():
-            existing_hash = self.storage_backend.get_hash(str(path))
-            if existing_hash == sha256sum:
-                return None
+        logger.info(f"Downloading: {url}")
+
+        timeouts = self.master.download_timeouts
+        attempt = 0
+        while True:
+            if self.resume_downloads:
+                download = self._download_to_staging(
+                    url, sha256sum, path, chunk_size, size
+                )
             else:
-                logger.info(
-                    f"Checksum mismatch with local file {path}: expected {sha256sum} "
-                    + f"got {existing_hash}, will re-download."
+                download = self._download_rewrite(url, sha256sum, path, chunk_size)
+            try:
+                existing_hash = await asyncio.wait_for(
+                    download, timeouts.deadline(size)
                 )
-                path.unlink()
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= timeouts.retries or not self._retry_download(e):
+                    raise
+                delay = timeouts.retry_delay(attempt)
+                attempt += 1
+                logger.warning(
+                    f"Download of {url} failed ({e!r}), retrying in {delay:.0f}s "
+                    + f"(attempt {attempt} of {timeouts.retries})"
+                )
+                await asyncio.sleep(delay)
 
-        logger.info(f"Downloading: {url}")
+        # Save hashing the file again the next time the package is synced
+        await loop.run_in_executor(
+            self.io_executor, self.storage_backend.cache_hash, str(path), existing_hash
+        )
+        return path
+
+    @staticmethod
+    def _retry_download(error: Exception) -> bool:
+        """Whether a download that failed with error may succeed if retried"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            status: int = error.status
+            return status >= 500 or status == 429
+        return True
+
+    async def _read_download(
+        self, url: str, response: aiohttp.ClientResponse, chunk_size: int
+    ) -> AsyncGenerator[bytes, None]:
+        """Read the body of a release file download, aborting it if it
+        stalls below the minimum speed"""
+        timeouts = self.master.download_timeouts
+        monitor = (
+            StallMonitor(url, timeouts.min_speed, timeouts.stall_window)
+            if timeouts.enabled
+            else None
+        )
+        async for chunk in self.master.read_chunks(response, chunk_size):
+            if monitor is not None:
+                monitor.on_bytes(len(chunk))
+            yield chunk
+
+    def _prepare_download(
+        self, path: Path, sha256sum: str, size: Optional[int] = None
+    ) -> bool:
+        """Return whether path needs to be downloaded and make room for it.
+        This touches the disk so it's run in the I/O thread pool."""
+        # Avoid downloading again if we have the file and it matches the hash.
+        if path.exists():
+            if self._existing_file_valid(path, sha256sum, size):
+                return False
+            path.unlink()
 
         dirname = path.parent
         if not dirname.exists():
-            dirname.mkdir(parents=True)
+            dirname.mkdir(parents=True, exist_ok=True)
+        return True
 
+    async def _download_rewrite(
+        self, url: str, sha256sum: str, path: Path, chunk_size: int
+    ) -> str:
         # Even more special handling for the serial of package files here:
         # We do not need to track a serial for package files
         # as PyPI generally only allows a file to be uploaded once
         # and then maybe deleted. Re-uploading (and thus changing the hash)
         # is only allowed in extremely rare cases with intervention from the
         # PyPI admins.
-        r_generator = self.master.get(url, required_serial=None)
-        response = await r_generator.asend(None)
+        async with self.master.request(url, required_serial=None) as response:
+            checksum = hashlib.sha256()
+
+            with self.storage_backend.rewrite(path, "wb") as f:
+                async with ChunkWriter(f, checksum, self.io_executor) as writer:
+                    async for chunk in self._read_download(url, response, chunk_size):
+                        await writer.write(chunk)
+
+                existing_hash = checksum.hexdigest()
+                if existing_hash != sha256sum:
+                    # Bad case: the file we got does not match the expected
+                    # checksum. Even if this should be the rare case of a
+                    # re-upload this will fix itself in a later run.
+                    raise ValueError(
+                        f"Inconsistent file. {url} has hash {existing_hash} "
+                        + f"instead of {sha256sum}."
+                    )
+        return existing_hash
+
+    async def _download_to_staging(
+        self,
+        url: str,
+        sha256sum: str,
+        path: Path,
+        chunk_size: int,
+        size: Optional[int] = None,
+    ) -> str:
+        """Download into the staging area, continuing a partial download left
+        behind by an earlier attempt, and move the verified file into place"""
+        # Named by the expected hash so we only ever continue the same file.
+        # Identical files can be uploaded under different names.
+        staging_file = self.staging_dir / f"{sha256sum}.{path.name}"
+        loop = asyncio.get_event_loop()
+        offset = await loop.run_in_executor(
+            self.io_executor, self._staged_size, staging_file, size
+        )
 
         checksum = hashlib.sha256()
+        if offset:
+            # hashlib state can't be saved so rebuild it from the partial file
+            await loop.run_in_executor(
+                self.io_executor, self._hash_partial_file, staging_file, checksum
+            )
 
-        with self.storage_backend.rewrite(path, "wb") as f:
-            while True:
-                chunk = await response.content.read(chunk_size)
-                if not chunk:
-                    break
+        if not offset or size is None or offset < size:
+            kw: Dict[str, Any] = {}
+            if offset:
+                logger.info(f"Resuming download of {url} at byte {offset}")
+                kw["headers"] = {"Range": f"bytes={offset}-"}
+            # See _download_rewrite for why we don't require a serial here
+            try:
+                async with self.master.request(
+                    url, required_serial=None, **kw
+                ) as response:
+                    if offset and response.status != 206:
+                        logger.info(f"{url} can't be resumed, downloading it again")
+                        offset = 0
+                        checksum = hashlib.sha256()
+                    with staging_file.open("ab" if offset else "wb") as f:
+                        async with ChunkWriter(f, checksum, self.io_executor) as writer:
+                            async for chunk in self._read_download(
+                                url, response, chunk_size
+                            ):
+                                await writer.write(chunk)
+            except aiohttp.ClientResponseError as cre:
+                if offset and cre.status == 416:
+                    # Range Not Satisfiable - whatever we had is no good
+                    staging_file.unlink()
+                raise
+
+        existing_hash = checksum.hexdigest()
+        if existing_hash != sha256sum:
+            staging_file.unlink()
+            # Bad case: the file we got does not match the expected
+            # checksum. Even if this should be the rare case of a
+            # re-upload this will fix itself in a later run.
+            raise ValueError(
+                f"Inconsistent file. {url} has hash {existing_hash} "
+                + f"instead of {sha256sum}."
+            )
+        await loop.run_in_executor(
+            self.io_executor, self._publish_staged_file, staging_file, path
+        )
+        return existing_hash
+
+    def _staged_size(self, staging_file: Path, size: Optional[int] = None) -> int:
+        if not self.staging_dir.exists():
+            self.staging_dir.mkdir(parents=True, exist_ok=True)
+        offset = staging_file.stat().st_size if staging_file.exists() else 0
+        if size is not None and offset > size:
+            staging_file.unlink()
+            offset = 0
+        return offset
+
+    @staticmethod
+    def _publish_staged_file(staging_file: Path, path: Path) -> None:
+        os.chmod(staging_file, 0o100644)
+        os.replace(staging_file, path)
+
+    @staticmethod
+    def _hash_partial_file(path: Path, checksum: Any) -> None:
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(128 * 1024), b""):
                 checksum.update(chunk)
-                f.write(chunk)
-
-            existing_hash = checksum.hexdigest()
-            if existing_hash != sha256sum:
-                # Bad case: the file we got does not match the expected
-                # checksum. Even if this should be the rare case of a
-                # re-upload this will fix itself in a later run.
-                raise ValueError(
-                    f"Inconsistent file. {url} has hash {existing_hash} "
-                    + f"instead of {sha256sum}."
-                )
 
-        return path
+
+def master_from_config(config: configparser.ConfigParser, processes: int = 1) -> Master:
+    """The master for one of processes syncing at once, which share the
+    workers and rate limits"""
+
+    def share(value: int) -> int:
+        return max(1, value // processes)
+
+    # The configured workers are where the adaptive limiters start. They grow
+    # up to the max-* values while upstream keeps up and back off when not.
+    workers = config.getint("mirror", "workers")
+    min_workers = config.getint("mirror", "min-workers", fallback=1)
+    max_workers = config.getint("mirror", "max-workers", fallback=workers)
+    download_workers = config.getint("mirror", "download-workers", fallback=workers)
+    max_download_workers = config.getint(
+        "mirror", "max-download-workers", fallback=download_workers
+    )
+
+    # Always reference those classes here with the fully qualified name to
+    # allow them being patched by mock libraries!
+    return Master(
+        config.get("mirror", "master"),
+        config.getfloat("mirror", "timeout"),
+        config.getfloat("mirror", "global-timeout", fallback=None),
+        metadata_limiter=AdaptiveLimiter(
+            share(workers), share(min_workers), share(max_workers), name="metadata"
+        ),
+        file_limiter=AdaptiveLimiter(
+            share(download_workers),
+            share(min_workers),
+            share(max_download_workers),
+            name="download",
+        ),
+        rate_limits=RateLimits.from_config(config, processes),
+        pool_options=PoolOptions.from_config(config),
+        upstreams=Upstreams.from_config(config),
+        hedge_options=HedgeOptions.from_config(config),
+        download_timeouts=DownloadTimeouts.from_config(config),
+    )
+
+
+def mirror_from_config(
+    config: configparser.ConfigParser, master: Master, **kwargs: Any
+) -> BandersnatchMirror:
+    config_values = validate_config_values(config)
+    workers = config.getint("mirror", "workers")
+    download_workers = config.getint("mirror", "download-workers", fallback=workers)
+    return BandersnatchMirror(
+        Path(config.get("mirror", "directory")),
+        master,
+        storage_backend=config_values.storage_backend_name,
+        stop_on_error=config.getboolean("mirror", "stop-on-error"),
+        workers=config.getint("mirror", "max-workers", fallback=workers),
+        hash_index=config.getboolean("mirror", "hash-index"),
+        json_save=config_values.json_save,
+        root_uri=config_values.root_uri,
+        digest_name=config_values.digest_name,
+        keep_index_versions=config.getint("mirror", "keep_index_versions", fallback=0),
+        diff_append_epoch=config_values.diff_append_epoch,
+        cleanup=config_values.cleanup,
+        release_files_save=config_values.release_files_save,
+        download_workers=config.getint(
+            "mirror", "max-download-workers", fallback=download_workers
+        ),
+        existing_file_check=config_values.existing_file_check,
+        json_passthrough=config.getboolean(
+            "mirror", "json-passthrough", fallback=False
+        ),
+        http_cache=config.get("mirror", "http-cache", fallback=""),
+        skip_unchanged=config.getboolean("mirror", "skip-unchanged", fallback=False),
+        package_order=config.get("mirror", "package-order", fallback="alphabetical"),
+        download_stats=config.get("mirror", "download-stats", fallback=""),
+        stale_attempts=config.getint("mirror", "stale-attempts", fallback=3),
+        stale_backoff=config.getfloat("mirror", "stale-backoff", fallback=1.0),
+        retry_attempts=config.getint("mirror", "retry-attempts", fallback=0),
+        retry_backoff=config.getfloat("mirror", "retry-backoff", fallback=10.0),
+        shard=ShardOptions.from_config(config),
+        render=RenderOptions.from_config(config),
+        simple_json=config.getboolean("mirror", "simple-json", fallback=False),
+        **kwargs,
+    )
 
 
 async def mirror(
-    config: configparser.ConfigParser, specific_packages: Optional[List[str]] = None
+    config: configparser.ConfigParser,
+    specific_packages: Optional[List[str]] = None,
+    processes: int = 1,
 ) -> int:
 
     config_values = validate_config_values(config)
@@ -853,42 +1774,32 @@ async def mirror(
         elif diff_full_path.is_dir():
             diff_full_path = diff_full_path / "mirrored-files"
 
-    mirror_url = config.get("mirror", "master")
-    timeout = config.getfloat("mirror", "timeout")
-    global_timeout = config.getfloat("mirror", "global-timeout", fallback=None)
-    storage_backend = config_values.storage_backend_name
-    homedir = Path(config.get("mirror", "directory"))
-
-    # Always reference those classes here with the fully qualified name to
-    # allow them being patched by mock libraries!
-    async with Master(mirror_url, timeout, global_timeout) as master:
-        mirror = BandersnatchMirror(
-            homedir,
+    async with master_from_config(config) as master:
+        mirror = mirror_from_config(
+            config,
             master,
-            storage_backend=storage_backend,
-            stop_on_error=config.getboolean("mirror", "stop-on-error"),
-            workers=config.getint("mirror", "workers"),
-            hash_index=config.getboolean("mirror", "hash-index"),
-            json_save=config_values.json_save,
-            root_uri=config_values.root_uri,
-            digest_name=config_values.digest_name,
-            keep_index_versions=config.getint(
-                "mirror", "keep_index_versions", fallback=0
-            ),
             diff_file=diff_file,
-            diff_append_epoch=config_values.diff_append_epoch,
             diff_full_path=diff_full_path if diff_full_path else None,
-            cleanup=config_values.cleanup,
-            release_files_save=config_values.release_files_save,
+            processes=processes,
         )
 
         # TODO: Remove this terrible hack and async mock the code correctly
         # This works around "TypeError: object
         # MagicMock can't be used in 'await' expression"
         changed_packages: Dict[str, Set[str]] = {}
-        if not isinstance(mirror, Mock):
-            changed_packages = await mirror.synchronize(specific_packages)
-
+        loop_monitor = LoopLagMonitor()
+        loop_monitor.start()
+        try:
+            if not isinstance(mirror, Mock):
+                changed_packages = await mirror.synchronize(specific_packages)
+        finally:
+            loop_monitor.stop()
+
+    logger.info(f"Finished with {master.metadata_limiter} and {master.file_limiter}")
+    logger.info(f"Finished with {master.rate_limits}")
+    logger.info(f"The {loop_monitor}")
+    if mirror.validator_cache is not None:
+        logger.info(f"Finished with {mirror.validator_cache}")
     logger.info(f"{len(changed_packages)} packages had changes")
     for package_name, changes in changed_packages.items():
         for change in changes:
@@ -905,3 +1816,36 @@ async def mirror(
         diff_file.write_text(diff_text)
 
     return 0
+
+
+def sync_partition(config_file: str, partition: Partition) -> PartitionResult:
+    """Sync a partition of the packages in a child process of mirror
+    --processes"""
+    setup_logging(argparse.Namespace(debug=partition.debug))
+    config = BandersnatchConfig(config_file=config_file).config
+    if config.has_option("mirror", "log-config"):
+        logging.config.fileConfig(str(Path(config.get("mirror", "log-config"))))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(_sync_partition(config, partition))
+    finally:
+        loop.close()
+
+
+async def _sync_partition(
+    config: configparser.ConfigParser, partition: Partition
+) -> PartitionResult:
+    async with master_from_config(config, partition.processes) as master:
+        mirror = mirror_from_config(config, master, partition=partition)
+        stopped = False
+        try:
+            await mirror.synchronize()
+        except SystemExit:
+            # stop-on-error, let the parent stop too
+            stopped = True
+    logger.info(
+        f"Partition {partition.number} finished with {master.metadata_limiter} "
+        + f"and {master.file_limiter}"
+    )
+    return mirror.partition_result(stopped)
@@ -1,4 +1,5 @@
 import asyncio
+import json
 import logging
 from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
@@ -6,9 +7,11 @@ from packaging.utils import canonicalize_name
 
 from .errors import PackageNotFound, StaleMetadata
 from .master import StalePage
+from .pipeline import Requeue
 
 if TYPE_CHECKING:  # pragma: no cover
     from .filter import Filter
+    from .http_cache import Validators
     from .master import Master
 
 logger = logging.getLogger(__name__)
@@ -21,6 +24,14 @@ class Package:
         self.serial = serial
 
         self._metadata: Optional[Dict] = None
+        # The metadata exactly as upstream sent it, if asked to keep it
+        self.raw_metadata: Optional[bytes] = None
+        # HTTP validators of the last conditional metadata request and whether
+        # it told us our local copy is still current
+        self.validators: Optional["Validators"] = None
+        self.not_modified = False
+        # Stale responses so far, across requeues in the sync pipeline
+        self.stale_attempts = 0
 
     @property
     def metadata(self) -> Dict[str, Any]:
@@ -48,34 +59,78 @@ class Package:
 
         return release_files
 
-    async def update_metadata(self, master: "Master", attempts: int = 3) -> None:
-        tries = 0
-        sleep_on_stale = 1
-
-        while tries < attempts:
+    def load_metadata(self, raw_metadata: bytes, keep_raw: bool = False) -> None:
+        self._metadata = json.loads(raw_metadata)
+        if keep_raw:
+            self.raw_metadata = raw_metadata
+
+    async def update_metadata(
+        self,
+        master: "Master",
+        attempts: int = 3,
+        keep_raw: bool = False,
+        conditional: bool = False,
+        validators: Optional["Validators"] = None,
+        backoff: float = 1.0,
+        requeue_on_stale: bool = False,
+    ) -> None:
+        """Fetch the package's metadata from master.
+
+        With conditional set the metadata is requested with validators of the
+        copy we already have, if any. When upstream answers that our copy is
+        still current not_modified is set and the metadata is left for the
+        caller to load from that copy.
+
+        A stale response is retried after backoff seconds, doubling with every
+        attempt. With requeue_on_stale set Requeue is raised instead of
+        sleeping, for the sync pipeline to try again later."""
+        while self.stale_attempts < attempts:
             try:
                 logger.info(
                     f"Fetching metadata for package: {self.name} (serial {self.serial})"
                 )
-                self._metadata = await master.get_package_metadata(
-                    self.name, serial=self.serial
-                )
+                if conditional:
+                    fetched = await master.get_package_metadata_if_changed(
+                        self.name, serial=self.serial, validators=validators
+                    )
+                    raw_metadata, self.validators = fetched
+                    self.not_modified = raw_metadata is None
+                    if raw_metadata is not None:
+                        self.load_metadata(raw_metadata, keep_raw)
+                elif keep_raw:
+                    self.load_metadata(
+                        await master.get_package_metadata(
+                            self.name, serial=self.serial, raw=True
+                        ),
+                        keep_raw,
+                    )
+                else:
+                    self._metadata = await master.get_package_metadata(
+                        self.name, serial=self.serial
+                    )
+                self.stale_attempts = 0
                 return
             except PackageNotFound as e:
                 logger.info(str(e))
                 raise
             except StalePage:
-                tries += 1
-                logger.error(f"Stale serial for package {self.name} - Attempt {tries}")
-                if tries < attempts:
-                    logger.debug(f"Sleeping {sleep_on_stale}s to give CDN a chance")
-                    await asyncio.sleep(sleep_on_stale)
-                    sleep_on_stale *= 2
+                self.stale_attempts += 1
+                logger.error(
+                    f"Stale serial for package {self.name} - "
+                    + f"Attempt {self.stale_attempts}"
+                )
+                if self.stale_attempts < attempts:
+                    delay = backoff * 2 ** (self.stale_attempts - 1)
+                    if requeue_on_stale:
+                        raise Requeue(delay, "stale serial")
+                    logger.debug(f"Sleeping {delay}s to give CDN a chance")
+                    await asyncio.sleep(delay)
                     continue
                 logger.error(
                     f"Stale serial for {self.name} ({self.serial}) "
                     + "not updating. Giving up."
                 )
+                self.stale_attempts = 0
                 raise StaleMetadata(package_name=self.name, attempts=attempts)
 
     def filter_metadata(self, metadata_filters: List["Filter"]) -> bool:
@@ -0,0 +1,102 @@
+"""
+Persistent sorted index of the package names a mirror serves
+
+The root simple page lists every package of the mirror. Instead of listing
+every directory below ``web/simple`` on each sync, the names are kept in a
+text file (one normalized name per line, sorted) that only gets updated with
+the packages added or removed during a run.
+
+A name may be followed by the PyPI serial the package was last mirrored at,
+which lets a full sync skip packages that haven't changed since.
+"""
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, KeysView, Optional, Set
+
+from packaging.utils import canonicalize_name
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_INDEX_FILE = "package-index"
+
+
+class PackageIndex:
+    def __init__(self, storage_backend: "Storage", path: Path) -> None:
+        self.storage_backend = storage_backend
+        self.path = path
+        self._serials: Optional[Dict[str, int]] = None
+
+    def __contains__(self, name: str) -> bool:
+        return canonicalize_name(name) in self.names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self.names))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def serials(self) -> Dict[str, int]:
+        """Package names mapped to the serial they were mirrored at, 0 if we
+        don't know it"""
+        if self._serials is None:
+            loaded = self.load_serials()
+            self._serials = loaded if loaded is not None else {}
+        return self._serials
+
+    @property
+    def names(self) -> KeysView[str]:
+        return self.serials.keys()
+
+    def exists(self) -> bool:
+        return self.storage_backend.exists(self.path)
+
+    def load(self) -> Optional[Set[str]]:
+        """Read the index. Returns None if there is no index to read"""
+        serials = self.load_serials()
+        return set(serials) if serials is not None else None
+
+    def load_serials(self) -> Optional[Dict[str, int]]:
+        if not self.exists():
+            return None
+        contents = self.storage_backend.read_file(self.path, text=True)
+        assert isinstance(contents, str)
+        serials: Dict[str, int] = {}
+        for line in contents.splitlines():
+            if not line:
+                continue
+            name, _, serial = line.partition(" ")
+            serials[name] = int(serial) if serial else 0
+        return serials
+
+    def serial(self, name: str) -> int:
+        return self.serials.get(canonicalize_name(name), 0)
+
+    def add(self, names: Iterable[str], serial: int = 0) -> None:
+        for name in names:
+            name = canonicalize_name(name)
+            if serial or name not in self.serials:
+                self.serials[name] = serial
+
+    def remove(self, names: Iterable[str]) -> None:
+        for name in names:
+            self.serials.pop(canonicalize_name(name), None)
+
+    def rebuild(self, names: Iterable[str]) -> None:
+        """Replace the index with names, usually found by listing every
+        directory of the simple API. Only do this if the index is missing or
+        can't be trusted. Serials of names we already knew are kept."""
+        logger.info(f"Rebuilding package index {self.path}")
+        known = self.serials
+        self._serials = {
+            name: known.get(name, 0) for name in map(canonicalize_name, names)
+        }
+
+    def save(self) -> None:
+        with self.storage_backend.rewrite(self.path, "w", encoding="utf-8") as f:
+            for name in self:
+                serial = self.serials[name]
+                f.write(f"{name} {serial}\n" if serial else f"{name}\n")
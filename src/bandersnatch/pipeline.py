@@ -0,0 +1,213 @@
+"""
+Staged processing of packages during a sync
+
+Each stage has its own bounded queue and a number of workers. A package is
+passed on to the next stage once a stage's handler returns True, so work for
+different packages overlaps across stages: metadata for the next packages is
+fetched while release files of earlier ones are downloaded.
+
+A stage with a priority function hands out packages lowest priority first
+instead of in the order they arrived.
+
+A handler raising Requeue has the package put back on its stage's queue once
+the given delay has passed. The worker moves on to other packages meanwhile
+and the stage only finishes once no package is waiting to be requeued.
+
+Packages a handler failed on are reported to the error handler and kept in
+Pipeline.failures along with the stage they failed in, so they can be run
+through the remaining stages again later.
+"""
+import asyncio
+import itertools
+import logging
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .package import Package
+
+logger = logging.getLogger(__name__)
+
+StageHandler = Callable[["Package"], Awaitable[bool]]
+ErrorHandler = Callable[[BaseException, "Package"], None]
+PriorityFunction = Callable[["Package"], Any]
+
+
+class Requeue(Exception):
+    """Handle the package in the same stage again after delay seconds"""
+
+    def __init__(self, delay: float, reason: str = "") -> None:
+        super().__init__(reason)
+        self.delay = delay
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        handler: StageHandler,
+        concurrency: int = 1,
+        maxsize: int = 0,
+        priority: Optional[PriorityFunction] = None,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.maxsize = maxsize
+        self.priority = priority
+        self.queue: Optional[asyncio.Queue] = None
+        # Packages waiting for their delay to pass before they are requeued,
+        # and an event set whenever there are none
+        self.delayed = 0
+        self.none_delayed: Optional[asyncio.Event] = None
+        # Breaks ties between equal priorities in arrival order
+        self._sequence = itertools.count()
+
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.requeued = 0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+
+    def __str__(self) -> str:
+        mean_depth = (
+            self._depth_total / self._depth_samples if self._depth_samples else 0
+        )
+        return (
+            f"{self.name}: {self.processed} processed, {self.dropped} dropped, "
+            + f"{self.errors} errors, {self.requeued} requeued, "
+            + f"queue depth mean {mean_depth:.1f} max {self.max_depth} "
+            + f"({self.concurrency} workers)"
+        )
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    def start(self) -> None:
+        self.queue = self.new_queue()
+        self.delayed = 0
+        self.none_delayed = asyncio.Event()
+        self.none_delayed.set()
+
+    def new_queue(self) -> asyncio.Queue:
+        if self.priority is not None:
+            return asyncio.PriorityQueue(maxsize=self.maxsize)
+        return asyncio.Queue(maxsize=self.maxsize)
+
+    async def put(self, package: Optional["Package"]) -> None:
+        assert self.queue is not None
+        if self.priority is None:
+            await self.queue.put(package)
+        elif package is None:
+            # Workers are told to stop once every package has been handed out
+            await self.queue.put((1, next(self._sequence), None))
+        else:
+            await self.queue.put(
+                (0, self.priority(package), next(self._sequence), package)
+            )
+        if package is not None:
+            depth = self.queue.qsize()
+            self.max_depth = max(self.max_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    def requeue(self, package: "Package", delay: float) -> None:
+        """Put package back on the queue after delay seconds"""
+        assert self.none_delayed is not None
+        self.requeued += 1
+        self.delayed += 1
+        self.none_delayed.clear()
+        asyncio.ensure_future(self._requeue_later(package, delay))
+
+    async def _requeue_later(self, package: "Package", delay: float) -> None:
+        assert self.none_delayed is not None
+        try:
+            await asyncio.sleep(delay)
+            await self.put(package)
+        finally:
+            self.delayed -= 1
+            if not self.delayed:
+                self.none_delayed.set()
+
+    async def get(self) -> Optional["Package"]:
+        assert self.queue is not None
+        item = await self.queue.get()
+        package: Optional["Package"] = item if self.priority is None else item[-1]
+        return package
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], on_error: ErrorHandler) -> None:
+        self.stages = stages
+        self.on_error = on_error
+        # Index of the stage and package of every failed handler
+        self.failures: List[Tuple[int, "Package"]] = []
+
+    async def run(self, packages: Iterable["Package"]) -> None:
+        for stage in self.stages:
+            stage.start()
+        await asyncio.gather(
+            self._feed(packages),
+            *[self._run_stage(idx) for idx in range(len(self.stages))],
+        )
+
+    async def _feed(self, packages: Iterable["Package"]) -> None:
+        first = self.stages[0]
+        for package in packages:
+            await first.put(package)
+        for _ in range(first.concurrency):
+            await first.put(None)
+
+    async def _run_stage(self, idx: int) -> None:
+        stage = self.stages[idx]
+        next_stage = self.stages[idx + 1] if idx + 1 < len(self.stages) else None
+        await asyncio.gather(
+            *[self._stage_worker(stage, next_stage) for _ in range(stage.concurrency)]
+        )
+        logger.debug(f"Pipeline stage {stage.name} finished")
+        if next_stage:
+            for _ in range(next_stage.concurrency):
+                await next_stage.put(None)
+
+    async def _stage_worker(self, stage: Stage, next_stage: Optional[Stage]) -> None:
+        while True:
+            package = await stage.get()
+            if package is None:
+                if not stage.delayed:
+                    break
+                # Packages waiting to be requeued still need a worker. Their
+                # requeue goes ahead of our stop signal.
+                assert stage.none_delayed is not None
+                await stage.none_delayed.wait()
+                await stage.put(None)
+                continue
+            try:
+                passed = await stage.handler(package)
+            except Requeue as requeue:
+                logger.debug(
+                    f"Requeueing {package.name} in stage {stage.name} in "
+                    + f"{requeue.delay}s: {requeue}"
+                )
+                stage.requeue(package, requeue.delay)
+                continue
+            except Exception as e:
+                stage.errors += 1
+                self.failures.append((self.stages.index(stage), package))
+                self.on_error(e, package)
+                continue
+            stage.processed += 1
+            if not passed:
+                stage.dropped += 1
+            elif next_stage:
+                await next_stage.put(package)
@@ -0,0 +1,254 @@
+"""
+Estimate what a sync would transfer without downloading any release files
+
+The packages to sync are determined like a sync would, their metadata is
+fetched (or revalidated with the HTTP cache) and run through all filters, and
+the remaining release files are compared against what is already mirrored.
+The mirror is only read: its status, todo list and generation files are left
+as they are and no lock is taken.
+"""
+import asyncio
+import json
+import logging
+import time
+from argparse import Namespace
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from .configuration import validate_config_values
+from .mirror import BandersnatchMirror, master_from_config
+from .package import Package
+from .pipeline import Pipeline, Stage
+from .shards import ShardOptions
+
+logger = logging.getLogger(__name__)
+
+MEGABYTE = 1000 * 1000
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(size) < 1000 or unit == "TB":
+            break
+        size /= 1000
+    return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+
+
+class FileCount:
+    def __init__(self) -> None:
+        self.files = 0
+        self.bytes = 0
+
+    def __str__(self) -> str:
+        return f"{self.files} files ({format_bytes(self.bytes)})"
+
+    def add(self, release_files: List[Dict]) -> None:
+        self.files += len(release_files)
+        self.bytes += sum(
+            release_file.get("size") or 0 for release_file in release_files
+        )
+
+
+class Plan:
+    def __init__(self, mirror: BandersnatchMirror) -> None:
+        self.mirror = mirror
+        self.packages = 0
+        self.packages_missing = 0
+        self.packages_filtered = 0
+        self.errors = 0
+        self.new = FileCount()
+        self.changed = FileCount()
+        self.unchanged = FileCount()
+        self.unreferenced = FileCount()
+        # Filter plugin name -> what it kept out of the mirror
+        self.filter_savings: Dict[str, FileCount] = {}
+        self.metadata_seconds = 0.0
+
+    @property
+    def transfer_bytes(self) -> int:
+        return self.new.bytes + self.changed.bytes
+
+    def eta(self, throughput: float) -> float:
+        """Seconds a sync would take: fetching metadata took as long as it did
+        for this plan, release files move at throughput bytes per second"""
+        return self.metadata_seconds + self.transfer_bytes / throughput
+
+    def _saved(self, plugin_name: str, release_files: List[Dict]) -> None:
+        if release_files:
+            self.filter_savings.setdefault(plugin_name, FileCount()).add(release_files)
+
+    def apply_filters(self, package: Package) -> bool:
+        """Filter package like a sync does, one plugin at a time to tell how
+        much each of them saves. Returns False if the whole package is
+        filtered out."""
+        filters = self.mirror.filters
+        for plugin in filters.filter_metadata_plugins():
+            if not plugin.filter(package.metadata):
+                self._saved(plugin.name, package.release_files)
+                return False
+        for plugin in filters.filter_release_file_plugins():
+            before = package.release_files
+            package.filter_all_releases_files([plugin])
+            self._saved(plugin.name, _removed(before, package.release_files))
+        for plugin in filters.filter_release_plugins():
+            before = package.release_files
+            package.filter_all_releases([plugin])
+            self._saved(plugin.name, _removed(before, package.release_files))
+        return True
+
+    def _previous_files(self, package: Package) -> List[Dict]:
+        """Release files of the metadata saved by the last sync"""
+        json_file = self.mirror.json_file(package.name)
+        storage_backend = self.mirror.storage_backend
+        if not self.mirror.json_save or not storage_backend.exists(json_file):
+            return []
+        try:
+            metadata = json.loads(storage_backend.read_file(json_file, text=False))
+        except ValueError:
+            return []
+        return [
+            release_file
+            for release in metadata.get("releases", {}).values()
+            for release_file in release
+        ]
+
+    def compare_files(
+        self, package: Package
+    ) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
+        """Sort release files into new, changed and unchanged ones, and the
+        mirrored files the package no longer references. This touches the
+        disk so it's run in the I/O thread pool."""
+        new: List[Dict] = []
+        changed: List[Dict] = []
+        unchanged: List[Dict] = []
+        for release_file in package.release_files:
+            path = self.mirror._file_url_to_local_path(release_file["url"])
+            if not self.mirror.storage_backend.exists(path):
+                new.append(release_file)
+            elif self.mirror._existing_file_valid(
+                path, release_file["digests"]["sha256"], release_file.get("size")
+            ):
+                unchanged.append(release_file)
+            else:
+                changed.append(release_file)
+
+        urls: Set[str] = {release_file["url"] for release_file in package.release_files}
+        unreferenced = [
+            release_file
+            for release_file in self._previous_files(package)
+            if release_file["url"] not in urls
+            and self.mirror.storage_backend.exists(
+                self.mirror._file_url_to_local_path(release_file["url"])
+            )
+        ]
+        return new, changed, unchanged, unreferenced
+
+    async def plan_package(self, package: Package) -> bool:
+        self.packages += 1
+        if not self.apply_filters(package):
+            self.packages_filtered += 1
+            return False
+        loop = asyncio.get_event_loop()
+        new, changed, unchanged, unreferenced = await loop.run_in_executor(
+            self.mirror.io_executor, self.compare_files, package
+        )
+        self.new.add(new)
+        self.changed.add(changed)
+        self.unchanged.add(unchanged)
+        self.unreferenced.add(unreferenced)
+        return True
+
+    async def fetch_metadata(self, package: Package) -> bool:
+        if await self.mirror.fetch_metadata(package):
+            return True
+        self.packages_missing += 1
+        return False
+
+    def on_error(self, exception: BaseException, package: Package) -> None:
+        self.errors += 1
+        logger.error(f"Unable to plan {package.name}: {exception}")
+
+    async def run(self) -> None:
+        mirror = self.mirror
+        packages = [
+            Package(name, serial=int(serial))
+            for name, serial in sorted(mirror.packages_to_sync.items())
+        ]
+        pipeline = Pipeline(
+            [
+                Stage("metadata", self.fetch_metadata, mirror.workers),
+                Stage("plan", self.plan_package, mirror.workers, mirror.workers * 2),
+            ],
+            self.on_error,
+        )
+        start = time.monotonic()
+        await pipeline.run(packages)
+        self.metadata_seconds = time.monotonic() - start
+
+    def report(self, throughput: float) -> List[str]:
+        lines = [
+            f"Packages to sync: {len(self.mirror.packages_to_sync)} "
+            + f"(serial {self.mirror.synced_serial} -> {self.mirror.target_serial})",
+            f"Packages with metadata: {self.packages}",
+            f"Packages no longer on PyPI: {self.packages_missing}",
+            f"Packages filtered out by metadata filters: {self.packages_filtered}",
+            f"Packages that could not be planned: {self.errors}",
+            f"New files: {self.new}",
+            f"Changed files: {self.changed}",
+            f"Unchanged files: {self.unchanged}",
+            f"Files no longer referenced: {self.unreferenced}",
+            f"Total to download: {format_bytes(self.transfer_bytes)}",
+        ]
+        for plugin_name, count in sorted(self.mirror.filtered_projects.items()):
+            lines.append(f"Filter {plugin_name} skips {count} packages")
+        for plugin_name, saved in sorted(self.filter_savings.items()):
+            lines.append(f"Filter {plugin_name} saves {saved}")
+        eta = self.eta(throughput)
+        lines.append(
+            f"Estimated sync time: {eta / 3600:.1f} hours at "
+            + f"{format_bytes(throughput)}/s ({self.metadata_seconds:.0f}s of "
+            + "metadata)"
+        )
+        return lines
+
+
+def _removed(before: List[Dict], after: List[Dict]) -> List[Dict]:
+    kept = {id(release_file) for release_file in after}
+    return [release_file for release_file in before if id(release_file) not in kept]
+
+
+async def plan(config: ConfigParser, args: Namespace) -> int:
+    config_values = validate_config_values(config)
+    async with master_from_config(config) as master:
+        mirror = BandersnatchMirror(
+            Path(config.get("mirror", "directory")),
+            master,
+            storage_backend=config_values.storage_backend_name,
+            workers=args.workers or config.getint("mirror", "workers"),
+            hash_index=config.getboolean("mirror", "hash-index"),
+            json_save=config_values.json_save,
+            digest_name=config_values.digest_name,
+            release_files_save=config_values.release_files_save,
+            existing_file_check=config_values.existing_file_check,
+            http_cache=config.get("mirror", "http-cache", fallback=""),
+            skip_unchanged=config.getboolean(
+                "mirror", "skip-unchanged", fallback=False
+            ),
+            shard=ShardOptions.from_config(config),
+            read_only=True,
+        )
+        if args.force_check:
+            # Plan a full sync like mirror --force-check would
+            mirror.synced_serial = 0
+            mirror.resume_todo = False
+        await mirror.determine_packages_to_sync()
+        mirror_plan = Plan(mirror)
+        if mirror.release_files_save:
+            await mirror_plan.run()
+        else:
+            logger.info("Release files are not mirrored - nothing to download")
+
+    for line in mirror_plan.report(args.throughput * MEGABYTE):
+        print(line)
+    return 0
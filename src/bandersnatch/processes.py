@@ -0,0 +1,94 @@
+"""
+Sync packages in several processes on one host
+
+A single process runs the whole sync on one event loop, and parsing JSON,
+running filters, rendering simple pages and hashing all take turns holding
+the GIL. With ``bandersnatch mirror --processes N`` the parent process works
+out what to sync as usual and splits the packages into N partitions by the
+same stable hash as shards use. Every partition is synced by a child process
+with its own event loop, master and connections. The ``[rate_limits]`` and
+the workers are shared out between the children so that all of them
+together stay within what is configured. The children append the
+packages they finish to the todo journal. The parent merges what they
+changed and writes the package index, the root simple page and the serial
+once all of them are done.
+"""
+import asyncio
+import logging
+import multiprocessing
+from typing import Callable, Dict, List, NamedTuple, Set, Union
+
+from .shards import shard_of
+
+logger = logging.getLogger(__name__)
+
+
+class Partition(NamedTuple):
+    # Number of the partition, for logging
+    number: int
+    # Package name -> serial to sync
+    packages: Dict[str, Union[int, str]]
+    target_serial: int
+    # Log at DEBUG level like the parent
+    debug: bool = False
+    # Partitions synced at the same time, which share the rate limits
+    processes: int = 1
+
+
+class PartitionResult(NamedTuple):
+    altered_packages: Dict[str, Set[str]]
+    # Paths, as str, to add to the diff file
+    diff_file_list: List[str]
+    # Package name -> serial it was mirrored at for the package index
+    package_serials: Dict[str, int]
+    # Packages that didn't finish, to keep on the todo list
+    unfinished: Dict[str, Union[int, str]]
+    errors: bool
+    # The child stopped early because of stop-on-error
+    stopped: bool = False
+
+
+def partition_packages(
+    packages: Dict[str, Union[int, str]], count: int
+) -> List[Dict[str, Union[int, str]]]:
+    partitions: List[Dict[str, Union[int, str]]] = [{} for _ in range(count)]
+    for name, serial in packages.items():
+        partitions[shard_of(name, count)][name] = serial
+    return partitions
+
+
+async def run_partitions(
+    sync_partition: Callable[[str, Partition], PartitionResult],
+    config_file: str,
+    partitions: List[Partition],
+) -> List[PartitionResult]:
+    """Run sync_partition(config_file, partition) for every partition in a
+    process of its own and return the results in the same order.
+    sync_partition has to be importable by the child processes. A partition
+    whose process fails leaves all of its packages unfinished."""
+    # Spawn instead of fork: the parent has an event loop, open connections
+    # and I/O threads that must not be copied into the children
+    context = multiprocessing.get_context("spawn")
+    logger.info(f"Syncing {len(partitions)} partitions in processes")
+    loop = asyncio.get_event_loop()
+    with context.Pool(processes=len(partitions)) as pool:
+        pending = [
+            pool.apply_async(sync_partition, (config_file, partition))
+            for partition in partitions
+        ]
+        results: List[PartitionResult] = []
+        for partition, result in zip(partitions, pending):
+            try:
+                results.append(await loop.run_in_executor(None, result.get))
+            except Exception:
+                logger.exception(f"Partition {partition.number} failed")
+                results.append(
+                    PartitionResult(
+                        altered_packages={},
+                        diff_file_list=[],
+                        package_serials={},
+                        unfinished=dict(partition.packages),
+                        errors=True,
+                    )
+                )
+        return results
@@ -0,0 +1,234 @@
+"""
+Request rate and bandwidth limits for traffic to PyPI
+
+Limits are set per host (e.g. pypi.org for metadata and files.pythonhosted.org
+for release files) in the ``[rate_limits]`` config section and can change with
+the time of day::
+
+    [rate_limits]
+    files.pythonhosted.org =
+        08:00-18:00 bandwidth=20M
+        bandwidth=200M
+    pypi.org =
+        requests=20
+
+Every line is a rule: an optional local time window followed by
+``requests=<per second>`` and/or ``bandwidth=<bytes per second>`` (K, M and G
+suffixes are powers of 1000). The first rule whose window contains the current
+time applies; a rule without a window always matches. The ``default`` host
+applies to hosts without rules of their own. No matching rule means no limit.
+
+Each host has a token bucket for requests and one for bytes. Taking more
+tokens than are available puts the bucket in debt, and the taker sleeps until
+the debt is paid off at the configured rate. Upstream asking us to back off
+(``429`` or ``Retry-After``) pauses all requests to that host.
+"""
+import asyncio
+import configparser
+import datetime
+import logging
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITS_SECTION = "rate_limits"
+DEFAULT_HOST = "default"
+# Don't let a bogus Retry-After stall a sync for hours
+MAX_RETRY_AFTER = 600.0
+
+_SUFFIXES = {"": 1, "K": 1000, "M": 1000 ** 2, "G": 1000 ** 3}
+_WINDOW_RE = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+
+
+def parse_rate(value: str) -> float:
+    """Parse a per second rate like 500, 1.5M or 20K"""
+    match = re.match(r"^(\d+(?:\.\d+)?)([KMG]?)$", value.strip().upper())
+    if not match:
+        raise ValueError(f"Invalid rate {value!r}")
+    return float(match.group(1)) * _SUFFIXES[match.group(2)]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (seconds or an HTTP
+    date), None if it can't be parsed"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), MAX_RETRY_AFTER)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = datetime.datetime.now(retry_at.tzinfo)
+    return min(max(0.0, (retry_at - now).total_seconds()), MAX_RETRY_AFTER)
+
+
+class RateRule(NamedTuple):
+    # Local time window the rule applies in, None for all day
+    window: Optional[Tuple[datetime.time, datetime.time]]
+    requests: float  # Requests per second, 0 for unlimited
+    bandwidth: float  # Bytes per second, 0 for unlimited
+
+    @classmethod
+    def parse(cls, line: str) -> "RateRule":
+        window = None
+        requests = 0.0
+        bandwidth = 0.0
+        for field in line.split():
+            window_match = _WINDOW_RE.match(field)
+            if window_match:
+                start_h, start_m, end_h, end_m = map(int, window_match.groups())
+                window = (datetime.time(start_h, start_m), datetime.time(end_h, end_m))
+                continue
+            key, _, value = field.partition("=")
+            if key == "requests":
+                requests = parse_rate(value)
+            elif key == "bandwidth":
+                bandwidth = parse_rate(value)
+            else:
+                raise ValueError(f"Invalid rate limit {field!r} in {line!r}")
+        return cls(window, requests, bandwidth)
+
+    def shared(self, processes: int) -> "RateRule":
+        """The share of the rule for one of processes syncing at once"""
+        return self._replace(
+            requests=self.requests / processes, bandwidth=self.bandwidth / processes
+        )
+
+    def applies_at(self, now: datetime.time) -> bool:
+        if self.window is None:
+            return True
+        start, end = self.window
+        if start <= end:
+            return start <= now < end
+        # The window spans midnight
+        return now >= start or now < end
+
+
+class TokenBucket:
+    def __init__(self, rate: float = 0.0, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        """At most one second worth of tokens is saved up unless set"""
+        return self.burst if self.burst is not None else self.rate
+
+    def set_rate(self, rate: float) -> None:
+        if rate != self.rate:
+            self._refill()
+            self.rate = rate
+            self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take amount tokens and return how many seconds to wait until the
+        bucket is out of debt again"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    async def take(self, amount: float = 1) -> None:
+        delay = self.reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class HostRateLimit:
+    def __init__(self, host: str, rules: List[RateRule]) -> None:
+        self.host = host
+        self.rules = rules
+        self.requests = TokenBucket()
+        self.bandwidth = TokenBucket()
+        self.paused_until = 0.0
+        self.pauses = 0
+        self.bytes = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.host}: {self.bytes} bytes received, paused {self.pauses} times "
+            + "by upstream"
+        )
+
+    def _apply_schedule(self) -> None:
+        now = datetime.datetime.now().time()
+        rule = next((rule for rule in self.rules if rule.applies_at(now)), None)
+        self.requests.set_rate(rule.requests if rule else 0.0)
+        self.bandwidth.set_rate(rule.bandwidth if rule else 0.0)
+
+    async def before_request(self) -> None:
+        """Wait until a request to this host may be sent"""
+        while True:
+            paused = self.paused_until - time.monotonic()
+            if paused <= 0:
+                break
+            await asyncio.sleep(paused)
+        self._apply_schedule()
+        await self.requests.take()
+
+    async def on_bytes(self, amount: int) -> None:
+        """Account for amount bytes received, waiting if we are over our
+        bandwidth. Not reading the socket meanwhile slows the sender down."""
+        self.bytes += amount
+        await self.bandwidth.take(amount)
+
+    def pause(self, seconds: float, reason: str) -> None:
+        """Hold back all requests to this host for seconds"""
+        self.pauses += 1
+        until = time.monotonic() + seconds
+        if until > self.paused_until:
+            logger.info(f"Pausing requests to {self.host} for {seconds:.1f}s: {reason}")
+            self.paused_until = until
+
+
+class RateLimits:
+    def __init__(self, rules: Optional[Dict[str, List[RateRule]]] = None) -> None:
+        self.rules = rules or {}
+        self._hosts: Dict[str, HostRateLimit] = {}
+
+    def __str__(self) -> str:
+        hosts = ", ".join(str(host) for host in self._hosts.values())
+        return f"rate limits: {hosts or 'no requests'}"
+
+    @classmethod
+    def from_config(
+        cls, config: configparser.ConfigParser, processes: int = 1
+    ) -> "RateLimits":
+        """The limits for one of processes syncing at once"""
+        rules: Dict[str, List[RateRule]] = {}
+        if config.has_section(RATE_LIMITS_SECTION):
+            # The options of [DEFAULT] show up in every section but aren't hosts
+            defaults = config.defaults()
+            for host, value in config.items(RATE_LIMITS_SECTION):
+                if host in defaults:
+                    continue
+                rules[host.lower()] = [
+                    RateRule.parse(line).shared(processes)
+                    for line in value.splitlines()
+                    if line.strip()
+                ]
+        return cls(rules)
+
+    def for_url(self, url: str) -> HostRateLimit:
+        host = (urlparse(url).hostname or "").lower()
+        if host not in self._hosts:
+            self._hosts[host] = HostRateLimit(
+                host, self.rules.get(host, self.rules.get(DEFAULT_HOST, []))
+            )
+        return self._hosts[host]
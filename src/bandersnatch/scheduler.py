@@ -0,0 +1,117 @@
+"""
+Policies deciding the order packages are synced in
+
+Packages are handed to the sync pipeline through a priority queue. A policy
+maps each package to a priority (lowest goes first). Priorities are computed
+once for all packages before a sync starts, so policies may read local files.
+"""
+import json
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Type
+
+from packaging.utils import canonicalize_name
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .mirror import BandersnatchMirror
+    from .package import Package
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulingPolicy:
+    """Sync packages alphabetically: predictable and easy to follow in logs"""
+
+    name = "alphabetical"
+
+    def __init__(self, mirror: "BandersnatchMirror") -> None:
+        self.mirror = mirror
+
+    def priority(self, package: "Package") -> Any:
+        return package.name
+
+    def priorities(self, packages: Iterable["Package"]) -> Dict[str, Any]:
+        return {package.name: self.priority(package) for package in packages}
+
+
+class LargestFirst(SchedulingPolicy):
+    """Sync the packages with the most bytes of release files first, going by
+    the JSON metadata saved last time, so a big package doesn't end up holding
+    up the end of a run. Packages we have no metadata for go last."""
+
+    name = "largest-first"
+
+    def estimated_bytes(self, package: "Package") -> int:
+        json_file = self.mirror.json_file(package.name)
+        storage_backend = self.mirror.storage_backend
+        if not storage_backend.exists(json_file):
+            return 0
+        try:
+            metadata = json.loads(storage_backend.read_file(json_file, text=False))
+        except ValueError as e:
+            logger.debug(f"Unable to estimate size of {package.name}: {e}")
+            return 0
+        return sum(
+            release_file.get("size") or 0
+            for release in metadata.get("releases", {}).values()
+            for release_file in release
+        )
+
+    def priority(self, package: "Package") -> Any:
+        return (-self.estimated_bytes(package), package.name)
+
+
+class PopularFirst(SchedulingPolicy):
+    """Sync the most downloaded packages first, going by the download-stats
+    file: one package per line followed by its download count, separated by
+    whitespace or a comma. Lines without a count (e.g. a CSV header) are
+    skipped and packages missing from the file go last."""
+
+    name = "popular-first"
+
+    def __init__(self, mirror: "BandersnatchMirror") -> None:
+        super().__init__(mirror)
+        self._downloads: Optional[Dict[str, int]] = None
+
+    @property
+    def downloads(self) -> Dict[str, int]:
+        if self._downloads is None:
+            self._downloads = (
+                self.load_download_stats(Path(self.mirror.download_stats))
+                if self.mirror.download_stats
+                else {}
+            )
+        return self._downloads
+
+    @staticmethod
+    def load_download_stats(path: Path) -> Dict[str, int]:
+        downloads: Dict[str, int] = {}
+        if not path.exists():
+            logger.warning(f"Download stats file {path} does not exist")
+            return downloads
+        with path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                fields = line.replace(",", " ").split()
+                if len(fields) < 2 or not fields[1].isdigit():
+                    continue
+                downloads[canonicalize_name(fields[0])] = int(fields[1])
+        logger.info(f"Loaded download stats of {len(downloads)} packages from {path}")
+        return downloads
+
+    def priority(self, package: "Package") -> Any:
+        return (-self.downloads.get(package.name, 0), package.name)
+
+
+SCHEDULING_POLICIES: Dict[str, Type[SchedulingPolicy]] = {
+    policy.name: policy for policy in (SchedulingPolicy, LargestFirst, PopularFirst)
+}
+
+
+def get_scheduling_policy(name: str, mirror: "BandersnatchMirror") -> SchedulingPolicy:
+    if name not in SCHEDULING_POLICIES:
+        raise ValueError(
+            f"Supplied package-order {name} is not supported! Please update "
+            + f"package-order to one of {tuple(SCHEDULING_POLICIES)} "
+            + "in the [mirror] section."
+        )
+    return SCHEDULING_POLICIES[name](mirror)
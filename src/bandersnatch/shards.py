@@ -0,0 +1,176 @@
+"""
+Sharded sync of one mirror by several nodes
+
+A full sync of PyPI by a single bandersnatch process takes days. With
+``shard-count`` set, each of that many nodes (or processes) syncs only the
+packages whose name hashes to its ``shard-index``, all writing to the same
+mirror directory on shared storage::
+
+    [mirror]
+    shard-count = 4
+    shard-index = 0
+
+Packages are assigned by a stable hash of their normalized name, so a package
+always belongs to the same shard as long as ``shard-count`` doesn't change.
+Each shard keeps its own lock, todo list, journal, package index and serial
+below ``shards/<index>/`` in the mirror directory. A shard finishing a sync
+takes the coordinator lock and checks every shard's serial: once all of them
+reached a serial, it becomes the mirror's ``status`` and the root simple page
+is regenerated from the package indexes of all shards. Until then, the root
+page and ``status`` stay on what every shard had finished before.
+"""
+import configparser
+import hashlib
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+
+from packaging.utils import canonicalize_name
+
+from .package_index import PACKAGE_INDEX_FILE, PackageIndex
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .storage import Storage
+
+logger = logging.getLogger(__name__)
+
+SHARDS_DIRECTORY = "shards"
+COORDINATOR_LOCK = ".lock-coordinator"
+
+
+def shard_of(name: str, count: int) -> int:
+    """The shard package name belongs to out of count shards. This has to give
+    the same answer on every node, so no hash()."""
+    digest = hashlib.sha256(canonicalize_name(name).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+class ShardOptions(NamedTuple):
+    # Number of shards the mirror is synced in, 1 disables sharding
+    shard_count: int = 1
+    # Shard this node syncs, from 0 to shard_count - 1
+    shard_index: int = 0
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> "ShardOptions":
+        defaults = cls()
+        options = cls(
+            shard_count=config.getint(
+                "mirror", "shard-count", fallback=defaults.shard_count
+            ),
+            shard_index=config.getint(
+                "mirror", "shard-index", fallback=defaults.shard_index
+            ),
+        )
+        if options.shard_count < 1:
+            raise ValueError(
+                f"Supplied shard-count {options.shard_count} is not supported! "
+                + "Please update shard-count to 1 or more in the [mirror] section."
+            )
+        last = options.shard_count - 1
+        if not 0 <= options.shard_index <= last:
+            raise ValueError(
+                f"Supplied shard-index {options.shard_index} is not supported! "
+                + f"Please update shard-index to a value from 0 to {last} in the "
+                + "[mirror] section."
+            )
+        return options
+
+    @property
+    def enabled(self) -> bool:
+        return self.shard_count > 1
+
+    def owns(self, name: str) -> bool:
+        if not self.enabled:
+            return True
+        return shard_of(name, self.shard_count) == self.shard_index
+
+    def directory(self, homedir: Path, index: Optional[int] = None) -> Path:
+        """Where the state of shard index (default: ours) is kept"""
+        if not self.enabled:
+            return homedir
+        if index is None:
+            index = self.shard_index
+        return homedir / SHARDS_DIRECTORY / str(index)
+
+
+class ShardCoordinator:
+    """Advances the mirror's serial once every shard has reached it"""
+
+    def __init__(
+        self, storage_backend: "Storage", homedir: Path, options: ShardOptions
+    ) -> None:
+        self.storage_backend = storage_backend
+        self.homedir = homedir
+        self.options = options
+
+    @property
+    def statusfile(self) -> Path:
+        return self.homedir / "status"
+
+    @property
+    def lockfile_path(self) -> Path:
+        return self.homedir / COORDINATOR_LOCK
+
+    def shard_serials(self) -> Dict[int, Optional[int]]:
+        """Serial every shard has synced to, None for shards that haven't
+        finished a sync yet"""
+        serials: Dict[int, Optional[int]] = {}
+        for index in range(self.options.shard_count):
+            status = self.options.directory(self.homedir, index) / "status"
+            if not self.storage_backend.exists(status):
+                serials[index] = None
+                continue
+            contents = self.storage_backend.read_file(status, text=True)
+            assert isinstance(contents, str)
+            serials[index] = int(contents.strip())
+        return serials
+
+    def synced_serial(self) -> int:
+        if not self.storage_backend.exists(self.statusfile):
+            return 0
+        contents = self.storage_backend.read_file(self.statusfile, text=True)
+        assert isinstance(contents, str)
+        return int(contents.strip())
+
+    def merged_package_index(self) -> PackageIndex:
+        """The package index of the whole mirror, made of every shard's"""
+        package_index = PackageIndex(
+            self.storage_backend, self.homedir / PACKAGE_INDEX_FILE
+        )
+        shard_indexes: List[PackageIndex] = [
+            PackageIndex(
+                self.storage_backend,
+                self.options.directory(self.homedir, index) / PACKAGE_INDEX_FILE,
+            )
+            for index in range(self.options.shard_count)
+        ]
+        package_index.rebuild(
+            name for shard_index in shard_indexes for name in shard_index
+        )
+        for shard_index in shard_indexes:
+            for name, serial in shard_index.serials.items():
+                package_index.add([name], serial)
+        return package_index
+
+    def advance(self) -> Optional[int]:
+        """Return the serial every shard has reached if it is newer than the
+        mirror's, None if there's nothing to advance (yet)"""
+        serials = self.shard_serials()
+        waiting = [index for index, serial in serials.items() if serial is None]
+        if waiting:
+            logger.info(f"Waiting for shards {waiting} to finish their first sync")
+            return None
+        reached = min(serial for serial in serials.values() if serial is not None)
+        current = self.synced_serial()
+        if reached <= current:
+            logger.info(
+                f"Mirror stays at serial {current}, shards are at "
+                + ", ".join(f"{index}: {serial}" for index, serial in serials.items())
+            )
+            return None
+        return reached
+
+    def save(self, serial: int) -> None:
+        with self.storage_backend.rewrite(self.statusfile) as f:
+            f.write(str(serial))
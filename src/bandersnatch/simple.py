@@ -0,0 +1,284 @@
+"""
+Render simple pages, optionally in a process pool
+
+Rendering a package's simple page is nothing but string formatting, done on
+the event loop for every package synced. That adds up on a full sync or after
+changing the digest. With ``render-processes`` set, the publish stage hands
+the pages to a PageRenderer, which collects them into batches and renders
+every batch in a process pool::
+
+    [mirror]
+    render-processes = 4
+    render-batch-size = 100
+
+Only what ends up on the page is sent to the pool: the filename, local URL,
+digest and requires_python of every release file instead of the package's
+metadata. A batch is rendered once it is full or no more pages arrived for
+a moment. The rendered pages are written in the I/O thread pool.
+
+With ``simple-json`` enabled, a PEP 691 JSON page (API version 1.1 of PEP
+700, with file sizes and versions) is written next to every HTML page and
+the root index as ``index.v1_json``. The web server hands it to clients
+asking for ``application/vnd.pypi.simple.v1+json``. Files upstream doesn't
+report a size for get the size of the mirrored file. A page that still misses
+a size, e.g. without release files mirrored, is declared as API version 1.0.
+"""
+import asyncio
+import configparser
+import html
+import json
+import logging
+import multiprocessing
+from multiprocessing.pool import Pool
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from packaging.utils import canonicalize_name
+
+logger = logging.getLogger(__name__)
+
+# Seconds a batch that isn't full waits for more pages before it is rendered
+BATCH_WAIT = 0.1
+
+SIMPLE_JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+SIMPLE_JSON_FILE = "index.v1_json"
+# PEP 700 added sizes and versions to PEP 691's 1.0
+SIMPLE_API_VERSION = "1.1"
+# 1.1 requires the size of every file, pages missing some are 1.0
+SIMPLE_API_VERSION_NO_SIZES = "1.0"
+
+
+class SimpleFile(NamedTuple):
+    filename: str
+    # Where the page links the file to
+    url: str
+    digest: str
+    requires_python: Optional[str] = None
+    size: Optional[int] = None
+
+
+class SimplePage(NamedTuple):
+    raw_name: str
+    # Sorted by filename
+    files: List[SimpleFile]
+    digest_name: str
+    serial: int
+    # Releases left after filtering, for the JSON page
+    versions: Tuple[str, ...] = ()
+
+
+class RenderedPage(NamedTuple):
+    html: str
+    # None unless simple-json is enabled
+    json: Optional[str] = None
+
+
+def data_requires_python(requires_python: Optional[str]) -> str:
+    if requires_python is None:
+        return ""
+    return f' data-requires-python="{html.escape(requires_python)}"'
+
+
+def render_simple_page(page: SimplePage) -> str:
+    # Generate the header of our simple page.
+    simple_page_content = (
+        "<!DOCTYPE html>\n"
+        "<html>\n"
+        "  <head>\n"
+        "    <title>Links for {0}</title>\n"
+        "  </head>\n"
+        "  <body>\n"
+        "    <h1>Links for {0}</h1>\n"
+    ).format(page.raw_name)
+
+    simple_page_content += "\n".join(
+        [
+            '    <a href="{}#{}={}"{}>{}</a><br/>'.format(
+                file.url,
+                page.digest_name,
+                file.digest,
+                data_requires_python(file.requires_python),
+                file.filename,
+            )
+            for file in page.files
+        ]
+    )
+
+    simple_page_content += f"\n  </body>\n</html>\n<!--SERIAL {page.serial}-->"
+
+    return simple_page_content
+
+
+def render_simple_json(page: SimplePage) -> str:
+    files: List[Dict[str, Any]] = []
+    for file in page.files:
+        entry: Dict[str, Any] = {
+            "filename": file.filename,
+            "url": file.url,
+            "hashes": {page.digest_name: file.digest},
+        }
+        if file.requires_python is not None:
+            entry["requires-python"] = file.requires_python
+        if file.size is not None:
+            entry["size"] = file.size
+        files.append(entry)
+    api_version = SIMPLE_API_VERSION
+    if any(file.size is None for file in page.files):
+        api_version = SIMPLE_API_VERSION_NO_SIZES
+    return json.dumps(
+        {
+            "meta": {"api-version": api_version, "_last-serial": page.serial},
+            "name": canonicalize_name(page.raw_name),
+            "versions": list(page.versions),
+            "files": files,
+        },
+        separators=(",", ":"),
+    )
+
+
+def render_simple_index_json(names: Iterable[str]) -> str:
+    """The root index for the normalized package names"""
+    return json.dumps(
+        {
+            "meta": {"api-version": SIMPLE_API_VERSION},
+            "projects": [{"name": name} for name in names],
+        },
+        separators=(",", ":"),
+    )
+
+
+def render_page(page: SimplePage, simple_json: bool = False) -> RenderedPage:
+    return RenderedPage(
+        render_simple_page(page), render_simple_json(page) if simple_json else None
+    )
+
+
+def render_pages(pages: List[SimplePage], simple_json: bool) -> List[RenderedPage]:
+    return [render_page(page, simple_json) for page in pages]
+
+
+class RenderOptions(NamedTuple):
+    # Processes rendering simple pages, 0 renders them on the event loop
+    processes: int = 0
+    # Pages sent to a process at once
+    batch_size: int = 100
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> "RenderOptions":
+        defaults = cls()
+        options = cls(
+            processes=config.getint(
+                "mirror", "render-processes", fallback=defaults.processes
+            ),
+            batch_size=config.getint(
+                "mirror", "render-batch-size", fallback=defaults.batch_size
+            ),
+        )
+        if options.processes < 0:
+            raise ValueError(
+                f"Supplied render-processes {options.processes} is not supported! "
+                + "Please update render-processes to 0 or more in the [mirror] "
+                + "section."
+            )
+        if options.batch_size < 1:
+            raise ValueError(
+                f"Supplied render-batch-size {options.batch_size} is not "
+                + "supported! Please update render-batch-size to 1 or more in the "
+                + "[mirror] section."
+            )
+        return options
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+
+class PageRenderer:
+    """Render simple pages in batches in a process pool"""
+
+    def __init__(self, options: RenderOptions, simple_json: bool = False) -> None:
+        self.options = options
+        self.simple_json = simple_json
+        self.pool: Optional[Pool] = None
+        self.pages = 0
+        self.batches = 0
+        self._pending: List[Tuple[SimplePage, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __str__(self) -> str:
+        return (
+            f"page renderer: {self.pages} pages in {self.batches} batches "
+            + f"({self.options.processes} processes)"
+        )
+
+    def start(self) -> None:
+        # Spawn instead of fork: the parent has I/O threads, sqlite
+        # connections and sessions whose locks must not be copied into the
+        # workers
+        context = multiprocessing.get_context("spawn")
+        self.pool = context.Pool(processes=self.options.processes)
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, result in self._pending:
+            result.cancel()
+        self._pending = []
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        logger.info(f"Finished with {self}")
+
+    async def render(self, page: SimplePage) -> RenderedPage:
+        loop = asyncio.get_event_loop()
+        result = loop.create_future()
+        self._pending.append((page, result))
+        if len(self._pending) >= self.options.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(BATCH_WAIT, self._flush)
+        rendered: RenderedPage = await result
+        return rendered
+
+    def _flush(self) -> None:
+        assert self.pool is not None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.pages += len(batch)
+        self.batches += 1
+        loop = asyncio.get_event_loop()
+
+        # The pool calls these from its result handler thread
+        def deliver(rendered: List[RenderedPage]) -> None:
+            loop.call_soon_threadsafe(self._deliver, batch, rendered)
+
+        def deliver_error(error: BaseException) -> None:
+            loop.call_soon_threadsafe(self._deliver_error, batch, error)
+
+        self.pool.apply_async(
+            render_pages,
+            ([page for page, _ in batch], self.simple_json),
+            callback=deliver,
+            error_callback=deliver_error,
+        )
+
+    @staticmethod
+    def _deliver(
+        batch: List[Tuple[SimplePage, asyncio.Future]], rendered: List[RenderedPage]
+    ) -> None:
+        for (_, result), page in zip(batch, rendered):
+            if not result.done():
+                result.set_result(page)
+
+    @staticmethod
+    def _deliver_error(
+        batch: List[Tuple[SimplePage, asyncio.Future]], error: BaseException
+    ) -> None:
+        for _, result in batch:
+            if not result.done():
+                result.set_exception(error)
@@ -0,0 +1,106 @@
+"""
+Local sqlite databases backing the hash and HTTP validator caches
+
+A cache is used from the event loop as well as executor threads, and every
+process of ``mirror --processes`` opens the same file. Writes are kept in
+memory and committed in batches of ``COMMIT_BATCH``, so a process only holds
+the database's write lock for a moment, and a process finding it locked waits
+up to ``BUSY_TIMEOUT`` seconds for it. Lookups see the writes that weren't
+committed yet.
+"""
+import logging
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for another process to release the database
+BUSY_TIMEOUT = 30.0
+# Writes committed at once
+COMMIT_BATCH = 100
+
+Row = Tuple[Any, ...]
+
+
+class SqliteCache:
+    """A table of rows whose first key_length columns are the primary key"""
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        table: str,
+        columns: Sequence[str],
+        key_length: int,
+        schema: str,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self.columns = tuple(columns)
+        self.key_length = key_length
+        self._where = " AND ".join(f"{column} = ?" for column in columns[:key_length])
+        # Used from the event loop as well as executor threads
+        self._lock = Lock()
+        self._db = sqlite3.connect(
+            str(self.path), timeout=BUSY_TIMEOUT, check_same_thread=False
+        )
+        # It's only a cache - losing the last writes on a crash is fine
+        self._db.execute("PRAGMA synchronous = OFF")
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} ({schema})")
+        self._db.commit()
+        # Rows to write by key, None for rows to delete
+        self._pending: Dict[Row, Optional[Row]] = {}
+
+    def select(self, key: Row) -> Optional[Row]:
+        """The row stored under key, None if there is none"""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            row: Optional[Row] = self._db.execute(
+                f"SELECT {', '.join(self.columns)} FROM {self.table} "
+                + f"WHERE {self._where}",
+                key,
+            ).fetchone()
+            return row
+
+    def replace(self, row: Row) -> None:
+        self._write(row[: self.key_length], row)
+
+    def delete(self, key: Row) -> None:
+        self._write(key, None)
+
+    def _write(self, key: Row, row: Optional[Row]) -> None:
+        with self._lock:
+            self._pending[key] = row
+            if len(self._pending) >= COMMIT_BATCH:
+                self._commit()
+
+    def commit(self) -> None:
+        """Write the rows that weren't committed yet"""
+        with self._lock:
+            self._commit()
+
+    def _commit(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        placeholders = ", ".join("?" for _ in self.columns)
+        try:
+            with self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES ({placeholders})",
+                    [row for row in pending.values() if row is not None],
+                )
+                self._db.executemany(
+                    f"DELETE FROM {self.table} WHERE {self._where}",
+                    [key for key, row in pending.items() if row is None],
+                )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Dropping {len(pending)} writes to {self.path}: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._commit()
+            self._db.close()
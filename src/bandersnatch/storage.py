@@ -26,6 +26,7 @@ import pkg_resources
 from packaging.utils import canonicalize_name
 
 from .configuration import BandersnatchConfig
+from .hash_cache import HashCache
 
 PATH_TYPES = Union[pathlib.Path, str]
 
@@ -55,6 +56,7 @@ class Storage:
         **kwargs: Any,
     ) -> None:
         self.flock_path: PATH_TYPES = ".lock"
+        self.hash_cache: Optional[HashCache] = None
         if config is not None:
             if isinstance(config, BandersnatchConfig):
                 config = config.config
@@ -79,6 +81,12 @@ class Storage:
         self.json_base_path = self.web_base_path / "json"
         self.pypi_base_path = self.web_base_path / "pypi"
         self.simple_base_path = self.web_base_path / "simple"
+        try:
+            hash_cache_path = self.configuration.get("mirror", "hash-cache")
+        except (configparser.NoOptionError, configparser.NoSectionError):
+            hash_cache_path = ""
+        if hash_cache_path:
+            self.hash_cache = HashCache(hash_cache_path)
 
     def __str__(self) -> str:
         return (
@@ -194,6 +202,11 @@ class Storage:
         accessed using "rb" mode (i.e. binary write)."""
         raise NotImplementedError
 
+    def append_file(self, path: PATH_TYPES, contents: Union[str, bytes]) -> None:
+        """Append data to the provided path, creating the file if it doesn't exist.
+        Strings are written as utf-8 text, bytes are written as is."""
+        raise NotImplementedError
+
     @contextlib.contextmanager
     def open_file(
         self, path: PATH_TYPES, text: bool = True
@@ -278,6 +291,37 @@ class Storage:
         """Get the sha256sum of a given **path**"""
         raise NotImplementedError
 
+    def get_file_size(self, path: PATH_TYPES) -> int:
+        """Get the size in bytes of a given **path**"""
+        raise NotImplementedError
+
+    def get_file_identity(self, path: PATH_TYPES) -> Optional[str]:
+        """Return a cheap to look up value that changes whenever the file at
+        **path** is rewritten, or None if the backend can't provide one"""
+        return None
+
+    def get_cached_hash(self, path: PATH_TYPES, function: str = "sha256") -> str:
+        """Get the hash of **path**, from the hash cache if the file hasn't
+        changed since it was last hashed"""
+        identity = self.get_file_identity(path) if self.hash_cache else None
+        if self.hash_cache is None or identity is None:
+            return self.get_hash(path, function)
+        digest = self.hash_cache.get(str(path), identity, function)
+        if digest is None:
+            digest = self.get_hash(path, function)
+            self.hash_cache.set(str(path), identity, digest, function)
+        return digest
+
+    def cache_hash(
+        self, path: PATH_TYPES, digest: str, function: str = "sha256"
+    ) -> None:
+        """Store the already known hash of a file we just wrote"""
+        if self.hash_cache is None:
+            return
+        identity = self.get_file_identity(path)
+        if identity is not None:
+            self.hash_cache.set(str(path), identity, digest, function)
+
 
 class StoragePlugin(Storage):
     """
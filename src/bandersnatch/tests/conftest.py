@@ -1,5 +1,6 @@
 # flake8: noqa
 
+import json
 import unittest.mock as mock
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, Dict
@@ -105,6 +106,9 @@ def master(package_json: Dict[str, Any]) -> "Master":
         async def json(self, *args: Any) -> Dict[str, Any]:
             return package_json
 
+        async def read(self) -> bytes:
+            return json.dumps(package_json).encode("utf-8")
+
     master = Master("https://pypi.example.com")
     master.rpc = mock.Mock()  # type: ignore
     master.session = asynctest.MagicMock()
@@ -17,6 +17,7 @@ from unittest import TestCase, mock
 from mock_config import mock_config
 
 import bandersnatch.storage
+from bandersnatch.hash_cache import HashCache
 from bandersnatch.master import Master
 from bandersnatch.mirror import BandersnatchMirror
 from bandersnatch.package import Package
@@ -767,6 +768,16 @@ web{0}simple{0}index.html""".format(
                 self.assertEqual(rv, write_val)
         os.unlink(tmp_path)
 
+    def test_append_file(self) -> None:
+        tmp_path = os.path.join(self.mirror_base_path, "test_append_file.txt")
+        self.plugin.append_file(tmp_path, "foo\n")
+        self.plugin.append_file(tmp_path, b"bar\n")
+        self.plugin.append_file(tmp_path, "baz")
+        self.assertEqual(
+            self.plugin.PATH_BACKEND(tmp_path).read_text(), "foo\nbar\nbaz"
+        )
+        os.unlink(tmp_path)
+
     def test_read_file(self) -> None:
         self.plugin.write_file(os.path.join(self.mirror_base_path, "status"), "20")
         rvs = (
@@ -912,6 +923,39 @@ web{0}simple{0}index.html""".format(
             with self.subTest(fn=fn, hash_val=hash_val):
                 self.assertEqual(self.plugin.get_hash(path, function=fn), hash_val)
 
+    def test_get_file_size(self) -> None:
+        path = self.plugin.PATH_BACKEND(
+            os.path.join(self.mirror_base_path, "test_get_file_size.txt")
+        )
+        path.write_text("foobar")
+        self.assertEqual(self.plugin.get_file_size(path), 6)
+        path.unlink()
+
+    def test_get_cached_hash(self) -> None:
+        assert self.tempdir
+        self.plugin.hash_cache = HashCache(
+            os.path.join(self.tempdir.name, "hash-cache.sqlite")
+        )
+        path = self.plugin.PATH_BACKEND(
+            os.path.join(self.mirror_base_path, "test_get_cached_hash.txt")
+        )
+        try:
+            path.write_text("foo")
+            foo_digest = hashlib.sha256(b"foo").hexdigest()
+            self.assertEqual(self.plugin.get_cached_hash(path), foo_digest)
+            with mock.patch.object(self.plugin, "get_hash") as get_hash:
+                self.assertEqual(self.plugin.get_cached_hash(path), foo_digest)
+                get_hash.assert_not_called()
+
+            # A rewritten file is hashed again
+            path.write_text("foobar")
+            self.assertEqual(
+                self.plugin.get_cached_hash(path), hashlib.sha256(b"foobar").hexdigest()
+            )
+        finally:
+            self.plugin.hash_cache.close()
+            self.plugin.hash_cache = None
+
 
 class TestFilesystemStoragePlugin(BaseStoragePluginTestCase):
     backend = "filesystem"
@@ -949,6 +993,20 @@ class TestSwiftStoragePlugin(BaseStoragePluginTestCase):
         )
         tmp_file.unlink()
 
+    def test_append_file_uploads_in_batches(self) -> None:
+        tmp_path = os.path.join(self.mirror_base_path, "test_append_batches.txt")
+        self.plugin.append_batch_size = 2  # type: ignore
+        with mock.patch.object(
+            self.plugin, "write_file", wraps=self.plugin.write_file
+        ) as write_file:
+            for line in ("foo\n", "bar\n", "baz\n"):
+                self.plugin.append_file(tmp_path, line)
+            self.assertEqual(write_file.call_count, 1)
+            # What is still buffered is uploaded before reading
+            self.assertEqual(self.plugin.read_file(tmp_path), "foo\nbar\nbaz\n")
+            self.assertEqual(write_file.call_count, 2)
+        self.plugin.delete_file(tmp_path)
+
     def test_rmdir(self) -> None:
         tmp_filename = next(tempfile._get_candidate_names())  # type: ignore
         tmp_file = self.plugin.PATH_BACKEND(
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from bandersnatch.concurrency import AdaptiveLimiter, LoopLagMonitor
+from bandersnatch.master import Master, StalePage
+
+
+def test_limiter_rejects_initial_outside_bounds() -> None:
+    with pytest.raises(ValueError):
+        AdaptiveLimiter(5, minimum=1, maximum=3)
+
+
+def test_limiter_grows_after_window_of_successes() -> None:
+    limiter = AdaptiveLimiter(2, minimum=1, maximum=3)
+    limiter.on_success(0.1)
+    assert limiter.limit == 2
+    limiter.on_success(0.1)
+    assert limiter.limit == 3
+    for _ in range(10):
+        limiter.on_success(0.1)
+    assert limiter.limit == 3
+
+
+def test_limiter_backs_off_to_minimum() -> None:
+    limiter = AdaptiveLimiter(8, minimum=2, maximum=8)
+    limiter.on_backoff("HTTP 429")
+    assert int(limiter.limit) == 4
+    limiter.on_backoff("HTTP 429")
+    limiter.on_backoff("HTTP 429")
+    assert int(limiter.limit) == 2
+    assert limiter.backoffs == 3
+
+
+def test_limiter_backs_off_on_latency() -> None:
+    limiter = AdaptiveLimiter(4, minimum=1, maximum=4)
+    limiter.on_success(0.1)
+    for _ in range(10):
+        limiter.on_success(5.0)
+    assert int(limiter.limit) < 4
+    assert limiter.backoffs
+
+
+@pytest.mark.asyncio
+async def test_limiter_caps_in_flight() -> None:
+    limiter = AdaptiveLimiter(1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.wait([waiter], timeout=0.01)
+    assert not waiter.done()
+    limiter.release()
+    await waiter
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_passes_on_slot_of_cancelled_waiter() -> None:
+    limiter = AdaptiveLimiter(1)
+    await limiter.acquire()
+    first = asyncio.ensure_future(limiter.acquire())
+    second = asyncio.ensure_future(limiter.acquire())
+    await asyncio.wait([first, second], timeout=0.01)
+    # Wakes up first, which is cancelled before it gets to run
+    limiter.release()
+    first.cancel()
+    await asyncio.wait([second], timeout=1)
+    assert first.cancelled()
+    assert second.done()
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_master_get_stale_page_backs_off(master: Master) -> None:
+    master.metadata_limiter = AdaptiveLimiter(4, maximum=4)
+    get_ag = master.get("/asdf", 10)
+    with pytest.raises(StalePage):
+        await get_ag.asend(None)
+    assert master.metadata_limiter.backoffs == 1
+    assert master.metadata_limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_master_get_uses_file_limiter(master: Master) -> None:
+    master.metadata_limiter = AdaptiveLimiter(1)
+    master.file_limiter = AdaptiveLimiter(1)
+    get_ag = master.get("https://files.example.com/packages/foo.whl", None)
+    await get_ag.asend(None)
+    assert master.file_limiter.in_flight == 1
+    assert master.metadata_limiter.in_flight == 0
+    await get_ag.aclose()
+    assert master.file_limiter.in_flight == 0
+    assert master.file_limiter.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_records_lag() -> None:
+    monitor = LoopLagMonitor(interval=10)
+    monitor.start()
+    # Pretend the tick ran half a second late
+    monitor._expected -= 10.5
+    monitor._tick()
+    monitor.stop()
+    assert monitor.samples == 1
+    assert 0.5 <= monitor.max_lag < 1
+    assert monitor._handle is None
+    assert "blocked for 0.5s" in str(monitor)
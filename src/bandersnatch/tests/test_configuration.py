@@ -137,7 +137,7 @@ class TestBandersnatchConf(TestCase):
 
     def test_validate_config_values(self) -> None:
         default_values = SetConfigValues(
-            False, "", "", False, "sha256", "filesystem", False, True
+            False, "", "", False, "sha256", "filesystem", False, True, "full"
         )
         no_options_configparser = configparser.ConfigParser()
         no_options_configparser["mirror"] = {}
@@ -155,6 +155,7 @@ class TestBandersnatchConf(TestCase):
             "filesystem",
             False,
             False,
+            "full",
         )
         release_files_false_configparser = configparser.ConfigParser()
         release_files_false_configparser["mirror"] = {"release-files": "false"}
@@ -162,6 +163,16 @@ class TestBandersnatchConf(TestCase):
             default_values, validate_config_values(release_files_false_configparser)
         )
 
+    def test_validate_config_values_existing_file_check(self) -> None:
+        configparser_ = configparser.ConfigParser()
+        configparser_["mirror"] = {"existing-file-check": "size"}
+        self.assertEqual(
+            "size", validate_config_values(configparser_).existing_file_check
+        )
+        configparser_["mirror"] = {"existing-file-check": "trust-me"}
+        with self.assertRaises(ValueError):
+            validate_config_values(configparser_)
+
     def test_deprecation_warning_raised(self) -> None:
         # Remove in 5.0 once we deprecate whitelist/blacklist
 
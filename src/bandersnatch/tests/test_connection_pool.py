@@ -0,0 +1,58 @@
+import configparser
+from types import SimpleNamespace
+from typing import Any
+
+import aiohttp
+import pytest
+
+from bandersnatch.connection_pool import PoolOptions, PoolStats
+
+
+def test_pool_options_from_config() -> None:
+    config = configparser.ConfigParser()
+    config.read_string(
+        "[mirror]\nconnection-limit = 20\nkeepalive-timeout = 60\ndns-cache-ttl = 0\n"
+    )
+    options = PoolOptions.from_config(config)
+    assert options == PoolOptions(limit=20, keepalive_timeout=60.0, dns_cache_ttl=0)
+    kwargs = options.connector_kwargs()
+    assert kwargs["limit"] == 20
+    assert kwargs["limit_per_host"] == 0
+    assert not kwargs["use_dns_cache"]
+
+
+def test_pool_options_defaults_without_config() -> None:
+    config = configparser.ConfigParser()
+    config.read_string("[mirror]\n")
+    assert PoolOptions.from_config(config) == PoolOptions()
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_trace_callbacks() -> None:
+    stats = PoolStats("files")
+    trace_config = stats.trace_config()
+    assert isinstance(trace_config, aiohttp.TraceConfig)
+    ctx = SimpleNamespace()
+    # The callbacks don't use the session
+    session: Any = None
+    await stats._on_request_start(session, ctx, None)
+    await stats._on_connection_create_end(session, ctx, None)
+    for _ in range(3):
+        await stats._on_request_start(session, ctx, None)
+        await stats._on_connection_reuseconn(session, ctx, None)
+    await stats._on_queued_start(session, ctx, None)
+    await stats._on_queued_end(session, ctx, None)
+    assert stats.requests == 4
+    assert stats.reuse_ratio == 0.75
+    assert stats.waits == 1
+    assert stats.open_connections == 0
+    assert "files pool: 4 requests, 1 connections opened, 75% reused" in str(stats)
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_open_connections() -> None:
+    stats = PoolStats("index")
+    stats.connector = SimpleNamespace(
+        _acquired={object(), object()}, _conns={("pypi.org", 443): [object()]}
+    )
+    assert stats.open_connections == 3
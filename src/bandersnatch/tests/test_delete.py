@@ -4,6 +4,7 @@ from configparser import ConfigParser
 from json import loads
 from pathlib import Path
 from tempfile import TemporaryDirectory
+from typing import List
 from unittest.mock import patch
 from urllib.parse import urlparse
 
@@ -11,7 +12,10 @@ import pytest
 
 from bandersnatch.delete import delete_packages, delete_path
 from bandersnatch.master import Master
+from bandersnatch.package_index import PACKAGE_INDEX_FILE, PackageIndex
+from bandersnatch.shards import ShardCoordinator, ShardOptions, shard_of
 from bandersnatch.utils import find
+from bandersnatch_storage_plugins.filesystem import FilesystemStorage
 
 EXPECTED_WEB_BEFORE_DELETION = """\
 json
@@ -71,6 +75,39 @@ def _fake_config() -> ConfigParser:
     return cp
 
 
+def _fake_mirror(td_path: Path, packages: List[str]) -> Path:
+    web_path = td_path / "web"
+    json_path = web_path / "json"
+    json_path.mkdir(parents=True)
+    pypi_path = web_path / "pypi"
+    pypi_path.mkdir(parents=True)
+    simple_path = web_path / "simple"
+
+    # Setup web tree with some json, package index.html + fake blobs
+    for package_name in packages:
+        package_simple_path = simple_path / package_name
+        package_simple_path.mkdir(parents=True)
+        package_index_path = package_simple_path / "index.html"
+        package_index_path.touch()
+
+        package_json_str = MOCK_JSON_TEMPLATE.replace("PKGNAME", package_name)
+        package_json_path = json_path / package_name
+        with package_json_path.open("w") as pjfp:
+            pjfp.write(package_json_str)
+        legacy_json_path = pypi_path / package_name / "json"
+        legacy_json_path.parent.mkdir()
+        legacy_json_path.symlink_to(package_json_path)
+
+        package_json = loads(package_json_str)
+        for _version, blobs in package_json["releases"].items():
+            for blob in blobs:
+                url_parts = urlparse(blob["url"])
+                blob_path = web_path / url_parts.path[1:]
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                blob_path.touch()
+    return web_path
+
+
 def test_delete_path() -> None:
     with TemporaryDirectory() as td:
         td_path = Path(td)
@@ -101,41 +138,17 @@ async def test_delete_packages() -> None:
     with TemporaryDirectory() as td:
         td_path = Path(td)
         config["mirror"]["directory"] = td
-        web_path = td_path / "web"
-        json_path = web_path / "json"
-        json_path.mkdir(parents=True)
-        pypi_path = web_path / "pypi"
-        pypi_path.mkdir(parents=True)
-        simple_path = web_path / "simple"
-
-        # Setup web tree with some json, package index.html + fake blobs
-        for package_name in args.pypi_packages:
-            package_simple_path = simple_path / package_name
-            package_simple_path.mkdir(parents=True)
-            package_index_path = package_simple_path / "index.html"
-            package_index_path.touch()
-
-            package_json_str = MOCK_JSON_TEMPLATE.replace("PKGNAME", package_name)
-            package_json_path = json_path / package_name
-            with package_json_path.open("w") as pjfp:
-                pjfp.write(package_json_str)
-            legacy_json_path = pypi_path / package_name / "json"
-            legacy_json_path.parent.mkdir()
-            legacy_json_path.symlink_to(package_json_path)
-
-            package_json = loads(package_json_str)
-            for _version, blobs in package_json["releases"].items():
-                for blob in blobs:
-                    url_parts = urlparse(blob["url"])
-                    blob_path = web_path / url_parts.path[1:]
-                    blob_path.parent.mkdir(parents=True, exist_ok=True)
-                    blob_path.touch()
+        web_path = _fake_mirror(td_path, args.pypi_packages)
+
+        package_index_path = td_path / "package-index"
+        package_index_path.write_text("cooper\nfoo\nunittest\n")
 
         # See we have a correct mirror setup
         assert find(web_path) == EXPECTED_WEB_BEFORE_DELETION
 
         args.dry_run = True
         assert await delete_packages(config, args, master) == 0
+        assert package_index_path.read_text() == "cooper\nfoo\nunittest\n"
 
         args.dry_run = False
         with patch("bandersnatch.delete.logger.info") as mock_log:
@@ -144,6 +157,42 @@ async def test_delete_packages() -> None:
 
         # See we've deleted it all
         assert find(web_path) == EXPECTED_WEB_AFTER_DELETION
+        assert package_index_path.read_text() == "foo\n"
+
+
+@pytest.mark.asyncio
+async def test_delete_packages_from_shards() -> None:
+    args = _fake_args()
+    args.dry_run = False
+    config = _fake_config()
+    config["mirror"]["shard-count"] = "2"
+    master = Master("https://unittest.org")
+
+    with TemporaryDirectory() as td:
+        td_path = Path(td)
+        config["mirror"]["directory"] = td
+        _fake_mirror(td_path, args.pypi_packages)
+        options = ShardOptions.from_config(config)
+        storage_backend = FilesystemStorage(config=config)
+        for index in range(options.shard_count):
+            shard_index = PackageIndex(
+                storage_backend,
+                options.directory(td_path, index) / PACKAGE_INDEX_FILE,
+            )
+            shard_index.add(
+                name
+                for name in ("cooper", "foo", "unittest")
+                if shard_of(name, options.shard_count) == index
+            )
+            shard_index.path.parent.mkdir(parents=True)
+            shard_index.save()
+
+        with patch("bandersnatch.delete.logger.info"):
+            assert await delete_packages(config, args, master) == 0
+
+        # The next coordination doesn't bring the packages back
+        coordinator = ShardCoordinator(storage_backend, td_path, options)
+        assert list(coordinator.merged_package_index()) == ["foo"]
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from bandersnatch.hash_cache import HashCache
+
+
+def test_hash_cache_roundtrip(tmpdir: Path) -> None:
+    cache_path = Path(tmpdir) / "cache" / "hash-cache.sqlite"
+    cache = HashCache(cache_path)
+    assert cache.get("web/packages/foo.whl", "3:1:2") is None
+    cache.set("web/packages/foo.whl", "3:1:2", "abc")
+    cache.set("web/packages/foo.whl", "3:1:2", "def", function="md5")
+    assert cache.get("web/packages/foo.whl", "3:1:2") == "abc"
+    cache.close()
+
+    # Persists across runs
+    cache = HashCache(cache_path)
+    assert cache.get("web/packages/foo.whl", "3:1:2") == "abc"
+    assert cache.get("web/packages/foo.whl", "3:1:2", function="md5") == "def"
+    assert cache.hits == 2
+    cache.close()
+
+
+def test_hash_cache_identity_mismatch_invalidates(tmpdir: Path) -> None:
+    cache = HashCache(Path(tmpdir) / "hash-cache.sqlite")
+    cache.set("foo.whl", "3:1:2", "abc")
+    assert cache.get("foo.whl", "4:1:2") is None
+    # The stale entry is gone, even for the old identity
+    assert cache.get("foo.whl", "3:1:2") is None
+    assert cache.misses == 2
+    cache.close()
@@ -0,0 +1,139 @@
+import asyncio
+import configparser
+from typing import Any, Iterator, List, Optional
+
+import pytest
+
+from bandersnatch.hedging import MIN_SAMPLES, HedgedRequest, HedgeOptions, HedgePolicy
+
+
+class FakeRequest:
+    """Answers after delay seconds, or never if delay is None. Doesn't use
+    asyncio.sleep, which the test suite patches out."""
+
+    def __init__(
+        self, delay: Optional[float], response: str, exited: List[str]
+    ) -> None:
+        self.delay = delay
+        self.response = response
+        self.exited = exited
+
+    async def __aenter__(self) -> str:
+        answered = asyncio.Event()
+        if self.delay is not None:
+            asyncio.get_event_loop().call_later(self.delay, answered.set)
+        await answered.wait()
+        return self.response
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.exited.append(self.response)
+
+
+def _policy(delay: float, budget: float = 100.0) -> HedgePolicy:
+    policy = HedgePolicy("index", HedgeOptions(percentile=95, budget=budget))
+    policy.delay = delay
+    return policy
+
+
+def test_hedge_options_from_config() -> None:
+    config = configparser.ConfigParser()
+    config.read_string("[mirror]\nhedge-percentile = 90\n")
+    options = HedgeOptions.from_config(config)
+    assert options == HedgeOptions(90.0, 5.0)
+    assert options.enabled
+    assert not HedgeOptions().enabled
+    config.read_string("[mirror]\nhedge-percentile = 100\n")
+    with pytest.raises(ValueError):
+        HedgeOptions.from_config(config)
+
+
+def test_policy_delay_from_percentile() -> None:
+    policy = HedgePolicy("index", HedgeOptions(percentile=50))
+    for _ in range(MIN_SAMPLES - 1):
+        policy.record(1.0)
+    assert policy.delay is None
+    policy.record(3.0)
+    assert policy.delay == 1.0
+
+
+def test_policy_budget() -> None:
+    policy = _policy(1.0, budget=10.0)
+    policy.requests = 10
+    assert policy.may_hedge()
+    policy.hedges = 1
+    assert not policy.may_hedge()
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_takes_faster_response() -> None:
+    policy = _policy(0.01)
+    exited: List[str] = []
+    # Any as FakeRequest only stands in for aiohttp's request
+    requests: Iterator[Any] = iter(
+        [FakeRequest(None, "slow", exited), FakeRequest(0.0, "hedge", exited)]
+    )
+    hedged = HedgedRequest(lambda: next(requests), policy)
+    async with hedged as response:
+        assert response == "hedge"
+    assert exited == ["hedge"]
+    assert policy.hedges == 1
+    assert policy.hedges_won == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_within_budget() -> None:
+    policy = _policy(0.01, budget=0.0)
+    exited: List[str] = []
+
+    def send() -> Any:
+        return FakeRequest(0.05, "slow", exited)
+
+    hedged = HedgedRequest(send, policy)
+    async with hedged as response:
+        assert response == "slow"
+    assert exited == ["slow"]
+    assert policy.hedges == 0
+
+
+@pytest.mark.asyncio
+async def test_hedge_is_admitted_and_released() -> None:
+    policy = _policy(0.01)
+    exited: List[str] = []
+    requests: Iterator[Any] = iter(
+        [FakeRequest(None, "slow", exited), FakeRequest(0.0, "hedge", exited)]
+    )
+    events: List[str] = []
+
+    async def admit() -> None:
+        events.append("admit")
+
+    hedged = HedgedRequest(
+        lambda: next(requests), policy, admit, lambda: events.append("release")
+    )
+    async with hedged as response:
+        assert response == "hedge"
+        assert events == ["admit"]
+    assert events == ["admit", "release"]
+
+
+@pytest.mark.asyncio
+async def test_hedge_waits_for_admission() -> None:
+    policy = _policy(0.01)
+    exited: List[str] = []
+    requests: Iterator[Any] = iter(
+        [FakeRequest(0.05, "slow", exited), FakeRequest(0.0, "hedge", exited)]
+    )
+    # The host is at its limit until the original request is done
+    never = asyncio.Event()
+
+    async def admit() -> None:
+        await never.wait()
+
+    released: List[bool] = []
+    hedged = HedgedRequest(
+        lambda: next(requests), policy, admit, lambda: released.append(True)
+    )
+    async with hedged as response:
+        assert response == "slow"
+    assert policy.hedges == 1
+    assert released == []
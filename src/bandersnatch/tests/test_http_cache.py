@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from bandersnatch.http_cache import ValidatorCache, Validators
+
+
+def test_validator_cache_roundtrip(tmpdir: Path) -> None:
+    cache_path = Path(tmpdir) / "cache" / "http-cache.sqlite"
+    cache = ValidatorCache(cache_path)
+    assert cache.get("foo") is None
+    validators = Validators('"abc"', "Wed, 21 Oct 2020 07:28:00 GMT", 10)
+    cache.set("foo", validators)
+    cache.close()
+
+    # Persists across runs
+    cache = ValidatorCache(cache_path)
+    assert cache.get("foo") == validators
+    cache.delete("foo")
+    assert cache.get("foo") is None
+    cache.close()
+
+
+def test_validator_cache_drops_empty_validators(tmpdir: Path) -> None:
+    cache = ValidatorCache(Path(tmpdir) / "http-cache.sqlite")
+    cache.set("foo", Validators('"abc"', None, 10))
+    cache.set("foo", Validators(None, None, 11))
+    assert cache.get("foo") is None
+    cache.close()
+
+
+def test_validators_from_headers() -> None:
+    headers = {"ETag": '"abc"', "Last-Modified": "Wed, 21 Oct 2020 07:28:00 GMT"}
+    validators = Validators.from_headers(headers, 10)
+    assert validators == Validators('"abc"', "Wed, 21 Oct 2020 07:28:00 GMT", 10)
+    assert validators.request_headers() == {
+        "If-None-Match": '"abc"',
+        "If-Modified-Since": "Wed, 21 Oct 2020 07:28:00 GMT",
+    }
+    # A 304 without headers keeps what we had
+    assert Validators.from_headers({}, None, validators) == validators
+    assert Validators.from_headers({}, 12, validators).serial == 12
+    assert Validators.from_headers({}, None) == Validators(None, None, 0)
@@ -14,6 +14,8 @@ import bandersnatch.mirror
 import bandersnatch.storage
 from bandersnatch.configuration import Singleton
 from bandersnatch.main import main
+from bandersnatch.shards import ShardOptions
+from bandersnatch.simple import RenderOptions
 
 if TYPE_CHECKING:
     from bandersnatch.mirror import BandersnatchMirror
@@ -91,9 +93,52 @@ def test_main_reads_config_values(mirror_mock: mock.MagicMock, tmpdir: Path) ->
         "diff_append_epoch": False,
         "diff_full_path": diff_file,
         "cleanup": False,
+        "download_workers": 3,
+        "existing_file_check": "full",
+        "json_passthrough": False,
+        "http_cache": "",
+        "skip_unchanged": False,
+        "package_order": "alphabetical",
+        "download_stats": "",
+        "stale_attempts": 3,
+        "stale_backoff": 1.0,
+        "retry_attempts": 0,
+        "retry_backoff": 10.0,
+        "shard": ShardOptions(),
+        "render": RenderOptions(),
+        "simple_json": False,
+        "processes": 1,
     } == kwargs
 
 
+def test_main_force_check_moves_shard_status(
+    mirror_mock: mock.MagicMock, tmpdir: Path
+) -> None:
+    setup()
+    homedir = Path(tmpdir) / "mirror"
+    shard_status = homedir / "shards" / "1" / "status"
+    shard_status.parent.mkdir(parents=True)
+    shard_status.write_text("42")
+    (homedir / "status").write_text("41")
+    config = configparser.ConfigParser()
+    config.read(Path(bandersnatch.__file__).parent / "unittest.conf")
+    config["mirror"]["directory"] = homedir.as_posix()
+    config["mirror"]["shard-count"] = "2"
+    config["mirror"]["shard-index"] = "1"
+    config_path = Path(tmpdir) / "bandersnatch.conf"
+    with config_path.open("w") as fp:
+        config.write(fp)
+    sys.argv = ["bandersnatch", "-c", str(config_path), "mirror", "--force-check"]
+    tmp = Path(tmpdir) / "tmp"
+    tmp.mkdir()
+    with mock.patch("bandersnatch.main.gettempdir", return_value=str(tmp)):
+        main(asyncio.new_event_loop())
+    assert not shard_status.exists()
+    assert (tmp / "status").read_text() == "42"
+    # The serial all shards have reached stays
+    assert (homedir / "status").read_text() == "41"
+
+
 def test_main_reads_custom_config_values(
     mirror_mock: "BandersnatchMirror", logging_mock: mock.MagicMock, customconfig: Path
 ) -> None:
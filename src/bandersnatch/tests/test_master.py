@@ -1,11 +1,20 @@
+import asyncio
+import json
+import unittest.mock as mock
 from pathlib import Path
 from tempfile import gettempdir
+from typing import Dict
 
 import asynctest
 import pytest
+from aiohttp import ClientResponseError
 
 import bandersnatch
+from bandersnatch.concurrency import AdaptiveLimiter
+from bandersnatch.http_cache import Validators
 from bandersnatch.master import Master, StalePage, XmlRpcError
+from bandersnatch.rate_limit import RateLimits
+from bandersnatch.upstreams import Upstreams
 
 
 def test_disallow_http() -> None:
@@ -70,6 +79,72 @@ async def test_master_doesnt_raise_if_serial_equal(master: Master) -> None:
     await get_ag.asend(None)
 
 
+@pytest.mark.asyncio
+async def test_get_package_metadata_raw(master: Master) -> None:
+    metadata = await master.get_package_metadata("foo")
+    raw = await master.get_package_metadata("foo", raw=True)
+    assert isinstance(raw, bytes)
+    assert json.loads(raw) == metadata
+
+
+@pytest.mark.asyncio
+async def test_get_package_metadata_if_changed(master: Master) -> None:
+    response = master.session.get.return_value
+    response.headers = {"X-PYPI-LAST-SERIAL": "12", "ETag": '"abc"'}
+    raw, validators = await master.get_package_metadata_if_changed("foo", 10)
+    _, kwargs = master.session.get.call_args
+    assert kwargs["headers"] == {}
+    assert raw is not None
+    assert json.loads(raw) == await master.get_package_metadata("foo")
+    assert validators == Validators('"abc"', None, 12)
+
+    response.status = 304
+    raw, validators = await master.get_package_metadata_if_changed(
+        "foo", 10, validators
+    )
+    assert raw is None
+    assert validators == Validators('"abc"', None, 12)
+    _, kwargs = master.session.get.call_args
+    assert kwargs["headers"] == {"If-None-Match": '"abc"'}
+
+
+@pytest.mark.asyncio
+async def test_get_package_metadata_if_changed_skips_outdated_validators(
+    master: Master,
+) -> None:
+    response = master.session.get.return_value
+    response.headers = {"X-PYPI-LAST-SERIAL": "12"}
+    raw, _ = await master.get_package_metadata_if_changed(
+        "foo", 12, Validators('"abc"', None, 11)
+    )
+    assert raw is not None
+    _, kwargs = master.session.get.call_args
+    assert kwargs["headers"] == {}
+
+
+@pytest.mark.asyncio
+async def test_get_package_metadata_if_changed_checks_serial(master: Master) -> None:
+    master.session.get.return_value.status = 304
+    with pytest.raises(StalePage):
+        await master.get_package_metadata_if_changed(
+            "foo", 10, Validators('"abc"', None, 10)
+        )
+
+
+@pytest.mark.asyncio
+async def test_get_package_metadata_if_changed_without_serial(master: Master) -> None:
+    response = master.session.get.return_value
+    response.status = 304
+    response.headers = {}
+    # Not modified is about the copy the validators were sent for
+    raw, validators = await master.get_package_metadata_if_changed(
+        "foo", 10, Validators('"abc"', None, 11)
+    )
+    assert raw is None
+    assert validators == Validators('"abc"', None, 11)
+    assert not master.session.request.called
+
+
 @pytest.mark.asyncio
 async def test_master_url_fetch(master: Master) -> None:
     fetch_path = Path(gettempdir()) / "unittest_url_fetch"
@@ -89,8 +164,35 @@ async def test_session_raise_for_status(master: Master) -> None:
     with patcher as create_session:
         async with master:
             pass
-        assert len(create_session.call_args_list) == 1
-        assert create_session.call_args_list[0][1]["raise_for_status"]
+        # One session for the index and one for release files
+        assert len(create_session.call_args_list) == 2
+        for call in create_session.call_args_list:
+            assert call[1]["raise_for_status"]
+
+
+@pytest.mark.asyncio
+async def test_session_for_url(master: Master) -> None:
+    assert master._session_for("https://files.example.com/f") is master.session
+    master.files_session = mock.Mock()
+    assert master._session_for("https://pypi.example.com/pypi") is master.session
+    assert master._session_for("https://files.example.com/f") is master.files_session
+
+
+@pytest.mark.asyncio
+async def test_request_releases_response(master: Master) -> None:
+    master.metadata_limiter = AdaptiveLimiter(2)
+    async with master.request("/simple/foo/", None) as response:
+        assert response is master.session.get.return_value
+        assert master.metadata_limiter.in_flight == 1
+    assert master.metadata_limiter.in_flight == 0
+
+    async def fail() -> None:
+        async with master.request("/simple/foo/", None):
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await fail()
+    assert master.metadata_limiter.in_flight == 0
 
 
 def test_check_for_socks_proxy(master: Master) -> None:
@@ -105,3 +207,98 @@ def test_check_for_socks_proxy(master: Master) -> None:
         assert isinstance(master._check_for_socks_proxy(), ProxyConnector)
     finally:
         del environ["https_proxy"]
+
+
+def _response_error(status: int, headers: Dict[str, str]) -> ClientResponseError:
+    return ClientResponseError(
+        mock.Mock(), (), status=status, message="slow down", headers=headers
+    )
+
+
+@pytest.mark.asyncio
+async def test_master_pauses_and_retries_after_429(master: Master) -> None:
+    master.rate_limits = RateLimits()
+    response = master.session.get.return_value
+    response.url = "https://pypi.example.com/pypi/foo/json"
+    master.session.get = mock.Mock(
+        side_effect=[_response_error(429, {"Retry-After": "3"}), response]
+    )
+    metadata = await master.get_package_metadata("foo")
+    assert metadata["info"]["name"] == "Foo"
+    assert master.session.get.call_count == 2
+    rate_limit = master.rate_limits.for_url("https://pypi.example.com/")
+    assert rate_limit.pauses == 1
+
+
+@pytest.mark.asyncio
+async def test_master_raises_without_retry_after(master: Master) -> None:
+    master.rate_limits = RateLimits()
+    master.session.get = mock.Mock(side_effect=_response_error(503, {}))
+    with pytest.raises(ClientResponseError):
+        await master.get_package_metadata("foo")
+    assert master.session.get.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_master_read_chunks_accounts_bytes(master: Master) -> None:
+    master.rate_limits = RateLimits()
+    response = mock.Mock(url="https://files.example.com/packages/foo.whl")
+    response.content.read = asynctest.CoroutineMock(side_effect=[b"abc", b"de", b""])
+    chunks = [chunk async for chunk in master.read_chunks(response)]
+    assert chunks == [b"abc", b"de"]
+    assert master.rate_limits.for_url(str(response.url)).bytes == 5
+
+
+def test_disallow_http_sources() -> None:
+    with pytest.raises(ValueError):
+        Master(
+            "https://pypi.example.com",
+            upstreams=Upstreams(
+                "https://pypi.example.com", file_sources=["http://mirror.example.com"]
+            ),
+        )
+
+
+@pytest.mark.asyncio
+async def test_master_fails_over_to_next_source(master: Master) -> None:
+    master.upstreams = Upstreams(
+        "https://pypi.example.com", metadata_sources=["https://mirror.example.com"]
+    )
+    response = master.session.get.return_value
+    master.session.get = mock.Mock(side_effect=[_response_error(503, {}), response])
+    metadata = await master.get_package_metadata("foo")
+    assert metadata["info"]["name"] == "Foo"
+    urls = [call[0][0] for call in master.session.get.call_args_list]
+    assert urls == [
+        "https://pypi.example.com/pypi/foo/json",
+        "https://mirror.example.com/pypi/foo/json",
+    ]
+    assert master.upstreams.master.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_master_trusts_only_authoritative_not_found(master: Master) -> None:
+    master.upstreams = Upstreams(
+        "https://pypi.example.com", file_sources=["https://mirror.example.com"]
+    )
+    response = master.session.get.return_value
+    url = "https://files.example.com/packages/foo.whl"
+
+    # The file host not having the file is final
+    master.session.get = mock.Mock(side_effect=_response_error(404, {}))
+    with pytest.raises(ClientResponseError):
+        async with master.request(url, None):
+            pass
+    assert master.session.get.call_count == 1
+
+    # A file source not having it yet isn't, its error is the one raised
+    master.session.get = mock.Mock(
+        side_effect=[asyncio.TimeoutError(), _response_error(404, {})]
+    )
+    with pytest.raises(asyncio.TimeoutError):
+        async with master.request(url, None):
+            pass
+
+    master.session.get = mock.Mock(side_effect=[asyncio.TimeoutError(), response])
+    async with master.request(url, None) as r:
+        assert r is response
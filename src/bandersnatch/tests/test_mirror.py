@@ -1,3 +1,7 @@
+import asyncio
+import configparser
+import hashlib
+import json
 import os.path
 import unittest.mock as mock
 from os import sep
@@ -7,13 +11,20 @@ from typing import Any, Dict, Iterator, List, NoReturn
 
 import asynctest
 import pytest
+from _pytest.monkeypatch import MonkeyPatch
 from freezegun import freeze_time
 
 from bandersnatch import utils
 from bandersnatch.configuration import BandersnatchConfig, Singleton
+from bandersnatch.hash_cache import HashCache
+from bandersnatch.http_cache import Validators
 from bandersnatch.master import Master
-from bandersnatch.mirror import BandersnatchMirror
+from bandersnatch.mirror import BandersnatchMirror, master_from_config
 from bandersnatch.package import Package
+from bandersnatch.processes import Partition, PartitionResult
+from bandersnatch.shards import ShardOptions
+from bandersnatch.simple import RenderOptions
+from bandersnatch.transfer import DownloadTimeouts
 from bandersnatch.utils import WINDOWS, make_time_stamp
 
 EXPECTED_REL_HREFS = (
@@ -68,11 +79,11 @@ def touch_files(paths: List[Path]) -> None:
             pfp.close()
 
 
-def test_limit_workers() -> None:
-    try:
-        BandersnatchMirror(Path("/tmp"), mock.Mock(), workers=11)
-    except ValueError:
-        pass
+def test_workers_not_capped() -> None:
+    # In-flight requests are bounded by the master's adaptive limiters instead
+    m = BandersnatchMirror(Path("/tmp"), mock.Mock(), workers=11)
+    assert m.workers == 11
+    assert m.download_workers == 11
 
 
 def test_mirror_loads_serial(tmpdir: Path) -> None:
@@ -202,6 +213,29 @@ def test_mirror_removes_old_status_and_todo_inits_generation(tmpdir: Path) -> No
     assert open(str(tmpdir / "generation")).read().strip() == "5"
 
 
+def test_read_only_mirror_ignores_broken_todo_list(tmpdir: Path) -> None:
+    with open(str(tmpdir / "generation"), "w") as generation:
+        generation.write("5")
+    with open(str(tmpdir / "status"), "w") as status:
+        status.write("1234")
+    with open(str(tmpdir / "todo"), "w") as status:
+        status.write("foo")
+    m = BandersnatchMirror(tmpdir, mock.Mock(), read_only=True)
+    assert m.synced_serial == 1234
+    assert not m.resume_todo
+    assert open(str(tmpdir / "todo")).read() == "foo"
+    assert not os.path.exists(str(tmpdir / "web"))
+
+
+def test_read_only_mirror_ignores_old_status(tmpdir: Path) -> None:
+    with open(str(tmpdir / "status"), "w") as status:
+        status.write("1234")
+    m = BandersnatchMirror(tmpdir, mock.Mock(), read_only=True)
+    assert m.synced_serial == 0
+    assert not m.resume_todo
+    assert os.listdir(str(tmpdir)) == ["status"]
+
+
 def test_mirror_with_same_homedir_needs_lock(
     mirror: BandersnatchMirror, tmpdir: Path
 ) -> None:
@@ -255,6 +289,8 @@ async def test_mirror_empty_resume_from_todo_list(mirror: BandersnatchMirror) ->
     expected = """\
 .lock
 generation
+package-index
+staging
 status
 web
 web{0}last-modified
@@ -346,6 +382,7 @@ async def test_mirror_sync_package_error_no_early_exit(
     expected = """\
 .lock
 generation
+package-index
 todo
 web{0}packages{0}2.7{0}f{0}foo{0}foo.whl
 web{0}packages{0}any{0}f{0}foo{0}foo.zip
@@ -399,6 +436,7 @@ async def mirror_sync_package_error_early_exit(mirror: BandersnatchMirror) -> No
     assert """\
 .lock
 generation
+package-index
 todo
 web{0}packages{0}any{0}f{0}foo{0}foo.zip
 web{0}simple{0}foo{0}index.html
@@ -446,6 +484,207 @@ simple{0}index.html""".format(
     assert open("status").read() == "1"
 
 
+@pytest.mark.asyncio
+async def test_mirror_sync_simple_json(
+    tmpdir: Path,
+    master: Master,
+    package_json: Dict[str, Any],
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.chdir(tmpdir)
+    package_json["releases"]["0.1"][0]["size"] = 11
+    package_json["releases"]["0.1"][1]["requires_python"] = ">=3.6"
+    master.all_packages = asynctest.CoroutineMock(  # type: ignore
+        return_value={"foo": 1}
+    )
+    mirror = BandersnatchMirror(Path(tmpdir), master, simple_json=True)
+    await mirror.synchronize()
+
+    sha256 = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+    assert json.loads(open("web/simple/foo/index.v1_json").read()) == {
+        "meta": {"api-version": "1.1", "_last-serial": 654321},
+        "name": "foo",
+        "versions": ["0.1"],
+        "files": [
+            {
+                "filename": "foo.whl",
+                "url": "../../packages/2.7/f/foo/foo.whl",
+                "hashes": {"sha256": sha256},
+                "requires-python": ">=3.6",
+                # Upstream didn't report it, this is the mirrored file's
+                "size": 0,
+            },
+            {
+                "filename": "foo.zip",
+                "url": "../../packages/any/f/foo/foo.zip",
+                "hashes": {"sha256": sha256},
+                "size": 11,
+            },
+        ],
+    }
+    assert json.loads(open("web/simple/index.v1_json").read()) == {
+        "meta": {"api-version": "1.1"},
+        "projects": [{"name": "foo"}],
+    }
+    assert os.path.exists("web/simple/foo/index.html")
+
+
+@pytest.mark.asyncio
+async def test_mirror_index_page_from_package_index(
+    mirror: BandersnatchMirror,
+) -> None:
+    mirror.master.all_packages = asynctest.CoroutineMock(  # type: ignore
+        return_value={"foo": 1}
+    )
+    # Packages already in the index are listed without looking at web/simple
+    with open("package-index", "w") as index:
+        index.write("bar\n")
+    await mirror.synchronize()
+
+    assert open("package-index").read() == "bar\nfoo 654321\n"
+    assert (
+        '<a href="bar/">bar</a>' in open("web{0}simple{0}index.html".format(sep)).read()
+    )
+
+
+@pytest.mark.asyncio
+async def test_mirror_resume_rebuilds_package_index(
+    mirror: BandersnatchMirror,
+) -> None:
+    with open("todo", "w") as todo:
+        todo.write("20\nfoobar 1")
+    with open("package-index", "w") as index:
+        index.write("bar\n")
+    await mirror.synchronize()
+
+    assert open("package-index").read() == "foobar 654321\n"
+
+
+@pytest.mark.asyncio
+async def test_mirror_sharded_sync(
+    tmpdir: Path, master: Master, monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmpdir)
+    # foo belongs to shard 1 and bar to shard 0
+    master.all_packages = asynctest.CoroutineMock(  # type: ignore
+        return_value={"foo": 1, "bar": 1}
+    )
+    shards = [
+        BandersnatchMirror(Path(tmpdir), master, shard=ShardOptions(2, index))
+        for index in range(2)
+    ]
+
+    await shards[1].synchronize()
+    assert shards[1].altered_packages.keys() == {"foo"}
+    assert open("shards/1/status").read() == "1"
+    assert open("shards/1/package-index").read() == "foo 654321\n"
+    # The mirror only moves on once every shard reached the serial
+    assert not os.path.exists("status")
+    assert not os.path.exists("web/simple/index.html")
+
+    await shards[0].synchronize()
+    assert shards[0].altered_packages.keys() == {"bar"}
+    assert open("status").read() == "1"
+    assert open("package-index").read() == "bar 654321\nfoo 654321\n"
+    index_page = open("web/simple/index.html").read()
+    assert '<a href="bar/">bar</a>' in index_page
+    assert '<a href="foo/">foo</a>' in index_page
+
+
+@pytest.mark.asyncio
+async def test_mirror_sync_partition(tmpdir: Path, master: Master) -> None:
+    mirror = BandersnatchMirror(
+        Path(tmpdir), master, partition=Partition(0, {"foo": 1}, 1)
+    )
+    await mirror.synchronize()
+
+    result = mirror.partition_result()
+    assert result.altered_packages.keys() == {"foo"}
+    assert result.package_serials == {"foo": 654321}
+    assert result.unfinished == {}
+    assert not result.errors
+    # The parent process keeps the todo list and writes the index and serial
+    assert open(tmpdir / "todo.journal").read() == "foo\n"
+    assert not (tmpdir / "status").exists()
+    assert not (tmpdir / "package-index").exists()
+    assert not (tmpdir / "web" / "simple" / "index.html").exists()
+
+
+def test_master_from_config_shares_limits_between_processes() -> None:
+    config = configparser.ConfigParser()
+    config.read_string(
+        """\
+[mirror]
+master = https://pypi.org
+timeout = 10
+workers = 8
+max-workers = 16
+[rate_limits]
+pypi.org =
+    requests=20
+"""
+    )
+    master = master_from_config(config, processes=4)
+    assert str(master.metadata_limiter).startswith("metadata concurrency 2 (1-4)")
+    assert str(master.file_limiter).startswith("download concurrency 2 (1-2)")
+    assert master.rate_limits is not None
+    assert master.rate_limits.rules["pypi.org"][0].requests == 5
+
+
+@pytest.mark.asyncio
+async def test_mirror_sync_in_processes(mirror: BandersnatchMirror) -> None:
+    mirror.processes = 2
+    mirror.master.all_packages = asynctest.CoroutineMock(  # type: ignore
+        return_value={"foo": 1, "bar": 1}
+    )
+    results = [
+        PartitionResult(
+            {"bar": {"web/simple/bar/index.html"}}, [], {"bar": 1}, {}, False
+        ),
+        PartitionResult({}, [], {}, {"foo": 1}, True),
+    ]
+    # The page the child process syncing bar wrote
+    os.makedirs("web/simple/bar")
+    with asynctest.patch(
+        "bandersnatch.mirror.run_partitions", return_value=results
+    ) as run_partitions:
+        await mirror.synchronize()
+
+    partitions = run_partitions.call_args[0][2]
+    assert [partition.packages for partition in partitions] == [
+        {"bar": 1},
+        {"foo": 1},
+    ]
+    assert mirror.altered_packages == {"bar": {"web/simple/bar/index.html"}}
+    assert mirror.errors
+    # foo failed, so the serial doesn't move and it stays on the todo list
+    assert not os.path.exists("status")
+    assert open("todo").read() == "1\nfoo 1"
+    assert open("package-index").read() == "bar 1\n"
+
+
+@pytest.mark.asyncio
+async def test_mirror_skip_unchanged_packages(mirror: BandersnatchMirror) -> None:
+    mirror.skip_unchanged = True
+    mirror.master.all_packages = asynctest.CoroutineMock(  # type: ignore
+        return_value={"foo": 10, "bar": 20, "baz": 30, "new": 40}
+    )
+    with open("package-index", "w") as index:
+        index.write("bar 20\nbaz\nfoo 9\n")
+    # Pages from before the index kept serials
+    os.makedirs("web/simple/baz")
+    with open("web/simple/baz/index.html", "w") as page:
+        page.write("<html>\n</html>\n<!--SERIAL 30-->")
+
+    await mirror.determine_packages_to_sync()
+    assert mirror.packages_to_sync == {"foo": 10, "new": 40}
+    assert mirror.target_serial == 40
+
+    mirror.skip_unchanged = False
+    await mirror.determine_packages_to_sync()
+    assert len(mirror.packages_to_sync) == 4
+
+
 @pytest.mark.asyncio
 async def test_mirror_serial_current_no_sync_of_packages_and_index_page(
     mirror: BandersnatchMirror,
@@ -476,6 +715,63 @@ def test_mirror_json_metadata(
     )
 
 
+@pytest.mark.asyncio
+async def test_mirror_json_passthrough_writes_upstream_bytes(
+    tmpdir: Path, master: Master, package_json: Dict[str, Any]
+) -> None:
+    mirror = BandersnatchMirror(
+        Path(tmpdir), master, json_save=True, json_passthrough=True
+    )
+    raw = json.dumps(package_json, separators=(",", ":")).encode("utf-8")
+    master.get_package_metadata = asynctest.CoroutineMock(  # type: ignore
+        return_value=raw
+    )
+    mirror.packages_to_sync = {"foo": 1}
+    await mirror.sync_packages()
+
+    assert not mirror.errors
+    assert mirror.json_file("foo").read_bytes() == raw
+    assert Path(tmpdir / "web/simple/foo/index.html").exists()
+
+
+@pytest.mark.asyncio
+async def test_mirror_http_cache_reuses_unmodified_json(
+    tmpdir: Path, master: Master, package_json: Dict[str, Any]
+) -> None:
+    cache_path = Path(tmpdir) / "http-cache.sqlite"
+    mirror = BandersnatchMirror(
+        Path(tmpdir), master, json_save=True, http_cache=str(cache_path)
+    )
+    assert mirror.validator_cache is not None
+    get_if_changed = asynctest.CoroutineMock(
+        return_value=(json.dumps(package_json).encode(), Validators('"a"', None, 1))
+    )
+    master.get_package_metadata_if_changed = get_if_changed  # type: ignore
+    mirror.packages_to_sync = {"foo": 1}
+    await mirror.sync_packages()
+    assert not mirror.errors
+    # Nothing to revalidate yet
+    _, kwargs = get_if_changed.call_args
+    assert kwargs["validators"] is None
+    assert mirror.validator_cache.get("foo") == Validators('"a"', None, 1)
+
+    json_mtime = mirror.json_file("foo").stat().st_mtime_ns
+    get_if_changed = asynctest.CoroutineMock(
+        return_value=(None, Validators('"a"', None, 2))
+    )
+    master.get_package_metadata_if_changed = get_if_changed  # type: ignore
+    mirror.packages_to_sync = {"foo": 2}
+    await mirror.sync_packages()
+    assert not mirror.errors
+    _, kwargs = get_if_changed.call_args
+    assert kwargs["validators"] == Validators('"a"', None, 1)
+    # The saved metadata was used as is
+    assert mirror.json_file("foo").stat().st_mtime_ns == json_mtime
+    assert mirror.validator_cache.get("foo") == Validators('"a"', None, 2)
+    assert Path(tmpdir / "web/simple/foo/index.html").exists()
+    assert mirror.validator_cache.hits == 1
+
+
 @pytest.mark.asyncio
 async def test_metadata_404_keeps_package_on_non_deleting_mirror(
     mirror: BandersnatchMirror,
@@ -534,6 +830,49 @@ def test_validate_todo(mirror: BandersnatchMirror) -> None:
                 assert not test_mirror.todolist.exists()
 
 
+def test_validate_todo_removes_orphaned_journal(mirror: BandersnatchMirror) -> None:
+    with TemporaryDirectory() as td:
+        test_mirror = BandersnatchMirror(Path(td), mirror.master)
+        test_mirror.todo_journal.write_text("cooper\n")
+        test_mirror._validate_todo()
+        assert not test_mirror.todo_journal.exists()
+
+
+@pytest.mark.asyncio
+async def test_mirror_resume_skips_journaled_packages(
+    mirror: BandersnatchMirror,
+) -> None:
+    with open("todo", "w") as todo:
+        todo.write("20\nfoo 1\nbar 1\nbaz 1")
+    # baz was cut off while being journaled so has to be synced again
+    with open("todo.journal", "w") as journal:
+        journal.write("foo\nba")
+
+    mirror._validate_todo()
+    mirror.synced_serial = 1
+    await mirror.determine_packages_to_sync()
+
+    assert mirror.packages_to_sync == {"bar": 1, "baz": 1}
+    assert mirror.target_serial == 20
+
+
+def test_record_finished_package_journals_and_compacts(
+    mirror: BandersnatchMirror,
+) -> None:
+    mirror.need_wrapup = True
+    mirror.target_serial = 20
+    mirror.todo_compaction_interval = 2
+    mirror.packages_to_sync = {"foo": 1, "bar": 2, "baz": 3}
+
+    mirror.record_finished_package("foo")
+    assert open("todo.journal").read() == "foo\n"
+    assert not os.path.exists("todo")
+
+    mirror.record_finished_package("bar")
+    assert open("todo").read() == "20\nbaz 3"
+    assert not os.path.exists("todo.journal")
+
+
 @pytest.mark.asyncio
 async def test_package_sync_with_release_no_files_syncs_simple_page(
     mirror: BandersnatchMirror,
@@ -737,6 +1076,41 @@ async def test_package_sync_simple_page_with_files(mirror: BandersnatchMirror) -
     )
 
 
+@pytest.mark.asyncio
+async def test_package_sync_simple_page_rendered_in_processes(
+    tmpdir: Path, master: Master, monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.chdir(tmpdir)
+    mirror = BandersnatchMirror(
+        Path(tmpdir), master, render=RenderOptions(processes=1, batch_size=2)
+    )
+    mirror.packages_to_sync = {"foo": 1}
+    await mirror.sync_packages()
+    assert not mirror.errors
+    assert mirror.page_renderer is not None
+    assert mirror.page_renderer.pages == 1
+
+    assert (
+        open("web/simple/foo/index.html").read()
+        == """\
+<!DOCTYPE html>
+<html>
+  <head>
+    <title>Links for foo</title>
+  </head>
+  <body>
+    <h1>Links for foo</h1>
+    {}
+  </body>
+</html>
+<!--SERIAL 654321-->\
+""".format(
+            EXPECTED_REL_HREFS
+        )
+    )
+    assert mirror.package_index.serial("foo") == 654321
+
+
 @pytest.mark.asyncio
 async def test_package_sync_simple_page_with_existing_dir(
     mirror: BandersnatchMirror,
@@ -819,6 +1193,96 @@ async def test_package_sync_downloads_release_file(mirror: BandersnatchMirror) -
     assert open("web/packages/any/f/foo/foo.zip").read() == ""
 
 
+@pytest.mark.asyncio
+async def test_package_sync_retries_failed_package(mirror: BandersnatchMirror) -> None:
+    sync_release_files = mirror.sync_release_files
+    failures = [OSError("transient")]
+
+    async def flaky_sync_release_files(package: Package) -> None:
+        if failures:
+            raise failures.pop()
+        await sync_release_files(package)
+
+    mirror.sync_release_files = flaky_sync_release_files  # type: ignore
+    mirror.retry_attempts = 2
+    mirror.packages_to_sync = {"foo": 0}
+    with mock.patch.object(
+        mirror.master,
+        "get_package_metadata",
+        side_effect=mirror.master.get_package_metadata,
+    ) as get_metadata:
+        await mirror.sync_packages()
+        # The retry started from the download stage
+        assert get_metadata.call_count == 1
+    assert not mirror.errors
+    assert "foo" not in mirror.packages_to_sync
+    assert open("web/packages/any/f/foo/foo.zip").read() == ""
+
+
+@pytest.mark.asyncio
+async def test_package_sync_fails_after_last_retry(mirror: BandersnatchMirror) -> None:
+    async def failing_sync_release_files(package: Package) -> None:
+        raise OSError("transient")
+
+    mirror.sync_release_files = failing_sync_release_files  # type: ignore
+    mirror.retry_attempts = 2
+    mirror.packages_to_sync = {"foo": 0}
+    await mirror.sync_packages()
+    assert mirror.errors
+    assert "foo" in mirror.packages_to_sync
+
+
+@pytest.mark.asyncio
+async def test_package_sync_caches_release_file_hashes(
+    mirror: BandersnatchMirror,
+) -> None:
+    mirror.storage_backend.hash_cache = HashCache(Path("hash-cache.sqlite"))
+    try:
+        mirror.packages_to_sync = {"foo": 0}
+        await mirror.sync_packages()
+        assert not mirror.errors
+
+        # The downloaded files are known so a re-sync doesn't read them again
+        mirror.packages_to_sync = {"foo": 0}
+        with mock.patch.object(mirror.storage_backend, "get_hash") as get_hash:
+            await mirror.sync_packages()
+            get_hash.assert_not_called()
+        assert not mirror.errors
+        assert mirror.storage_backend.hash_cache.hits == 2
+    finally:
+        mirror.storage_backend.hash_cache.close()
+        mirror.storage_backend.hash_cache = None
+
+
+@pytest.mark.asyncio
+async def test_package_sync_shares_download_pool(mirror: BandersnatchMirror) -> None:
+    mirror.download_workers = 1
+    mirror.packages_to_sync = {"foo": 1, "bar": 1}
+    await mirror.sync_packages()
+    assert not mirror.errors
+    assert mirror.download_queue is None
+    assert not mirror.packages_to_sync
+
+    assert open("web/packages/any/f/foo/foo.zip").read() == ""
+    assert Path("web/simple/foo/index.html").exists()
+    assert Path("web/simple/bar/index.html").exists()
+    assert [stage.processed for stage in mirror.pipeline.stages] == [2, 2, 2, 2]
+
+
+@pytest.mark.asyncio
+async def test_sync_release_files_without_download_pool(
+    mirror: BandersnatchMirror, package: Package
+) -> None:
+    assert mirror.download_queue is None
+    await mirror.sync_release_files(package)
+
+    assert open("web/packages/any/f/foo/foo.zip").read() == ""
+    assert mirror.altered_packages["foo"] == {
+        "web{0}packages{0}2.7{0}f{0}foo{0}foo.whl".format(sep),
+        "web{0}packages{0}any{0}f{0}foo{0}foo.zip".format(sep),
+    }
+
+
 @pytest.mark.asyncio
 async def test_package_sync_skips_release_file(mirror: BandersnatchMirror) -> None:
     mirror.release_files_save = False
@@ -902,6 +1366,132 @@ async def test_package_sync_does_not_touch_existing_local_file(
     assert old_stat.st_ctime == Path(pkg_file_path_str).stat().st_ctime
 
 
+@pytest.mark.asyncio
+async def test_download_file_existing_file_check(mirror: BandersnatchMirror) -> None:
+    url = "https://pypi.example.com/packages/any/f/foo/foo.zip"
+    sha256sum = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+    path = Path("web/packages/any/f/foo/foo.zip")
+    touch_files([path])
+    path.write_bytes(b"not the release")
+
+    mirror.existing_file_check = "exists"
+    assert await mirror.download_file(url, sha256sum, size=0) is None
+    assert path.read_bytes() == b"not the release"
+
+    mirror.existing_file_check = "size"
+    with mock.patch.object(mirror.storage_backend, "get_hash") as get_hash:
+        assert await mirror.download_file(url, sha256sum, size=15) is None
+        get_hash.assert_not_called()
+    assert path.read_bytes() == b"not the release"
+
+    # The cheap check failed so the file is replaced
+    assert await mirror.download_file(url, sha256sum, size=0) is not None
+    assert path.read_bytes() == b""
+
+    # Without a size in the metadata the hash is checked
+    path.write_bytes(b"not the release")
+    assert await mirror.download_file(url, sha256sum) is not None
+    assert path.read_bytes() == b""
+
+
+class FakeRangeResponse:
+    headers = {"X-PYPI-LAST-SERIAL": "1"}
+
+    def __init__(self, status: int, body: bytes) -> None:
+        self.status = status
+        self.content = mock.Mock()
+        self.content.read = asynctest.CoroutineMock(side_effect=[body, b""])
+
+    async def __aenter__(self) -> "FakeRangeResponse":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_download_file_resumes_partial_download(
+    mirror: BandersnatchMirror,
+) -> None:
+    url = "https://pypi.example.com/packages/any/f/foo/foo.zip"
+    sha256sum = hashlib.sha256(b"hello world").hexdigest()
+    mirror.staging_dir.mkdir()
+    (mirror.staging_dir / f"{sha256sum}.foo.zip").write_bytes(b"hello ")
+    mirror.master.session.get = mock.MagicMock(
+        return_value=FakeRangeResponse(206, b"world")
+    )
+
+    path = await mirror.download_file(url, sha256sum, size=11)
+
+    assert path is not None
+    assert path.read_bytes() == b"hello world"
+    assert not (mirror.staging_dir / f"{sha256sum}.foo.zip").exists()
+    _, kwargs = mirror.master.session.get.call_args
+    assert kwargs["headers"] == {"Range": "bytes=6-"}
+
+
+@pytest.mark.asyncio
+async def test_download_file_range_ignored_starts_over(
+    mirror: BandersnatchMirror,
+) -> None:
+    url = "https://pypi.example.com/packages/any/f/foo/foo.zip"
+    sha256sum = hashlib.sha256(b"hello world").hexdigest()
+    mirror.staging_dir.mkdir()
+    (mirror.staging_dir / f"{sha256sum}.foo.zip").write_bytes(b"hello ")
+    mirror.master.session.get = mock.MagicMock(
+        return_value=FakeRangeResponse(200, b"hello world")
+    )
+
+    path = await mirror.download_file(url, sha256sum)
+
+    assert path is not None
+    assert path.read_bytes() == b"hello world"
+
+
+@pytest.mark.asyncio
+async def test_download_file_bad_partial_download_is_discarded(
+    mirror: BandersnatchMirror,
+) -> None:
+    url = "https://pypi.example.com/packages/any/f/foo/foo.zip"
+    sha256sum = hashlib.sha256(b"hello world").hexdigest()
+    mirror.staging_dir.mkdir()
+    (mirror.staging_dir / f"{sha256sum}.foo.zip").write_bytes(b"jello ")
+    mirror.master.session.get = mock.MagicMock(
+        return_value=FakeRangeResponse(206, b"world")
+    )
+
+    with pytest.raises(ValueError):
+        await mirror.download_file(url, sha256sum)
+    assert not (mirror.staging_dir / f"{sha256sum}.foo.zip").exists()
+    assert not Path("web/packages/any/f/foo/foo.zip").exists()
+
+
+@pytest.mark.asyncio
+async def test_download_file_retries_timeout(mirror: BandersnatchMirror) -> None:
+    url = "https://pypi.example.com/packages/any/f/foo/foo.zip"
+    sha256sum = hashlib.sha256(b"hello world").hexdigest()
+    mirror.master.download_timeouts = DownloadTimeouts(retries=1)
+    mirror.master.session.get = mock.MagicMock(
+        side_effect=[asyncio.TimeoutError(), FakeRangeResponse(200, b"hello world")]
+    )
+
+    with asynctest.patch("bandersnatch.mirror.asyncio.sleep") as sleep:
+        path = await mirror.download_file(url, sha256sum, size=11)
+
+    assert path is not None
+    assert path.read_bytes() == b"hello world"
+    sleep.assert_called_once_with(1.0)
+
+    # Out of retries the error is raised
+    path.unlink()
+    mirror.master.session.get = mock.MagicMock(
+        side_effect=[asyncio.TimeoutError(), asyncio.TimeoutError()]
+    )
+    with asynctest.patch("bandersnatch.mirror.asyncio.sleep"):
+        with pytest.raises(asyncio.TimeoutError):
+            await mirror.download_file(url, sha256sum, size=11)
+
+
 def test_gen_data_requires_python(mirror: BandersnatchMirror) -> None:
     fake_no_release: Dict[str, str] = {}
     fake_release = {"requires_python": ">=3.6"}
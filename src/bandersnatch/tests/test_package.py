@@ -3,8 +3,10 @@ import pytest
 from _pytest.capture import CaptureFixture
 
 from bandersnatch.errors import PackageNotFound, StaleMetadata
+from bandersnatch.http_cache import Validators
 from bandersnatch.master import Master, StalePage
 from bandersnatch.package import Package
+from bandersnatch.pipeline import Requeue
 
 
 def test_package_accessors(package: Package) -> None:
@@ -32,6 +34,26 @@ async def test_package_update_metadata_gives_up_after_3_stale_responses(
     assert "not updating. Giving up" in caplog.text
 
 
+@pytest.mark.asyncio
+async def test_package_update_metadata_requeues_stale_responses(
+    master: Master,
+) -> None:
+    master.get_package_metadata = asynctest.CoroutineMock(  # type: ignore
+        side_effect=StalePage
+    )
+    package = Package("foo", serial=11)
+
+    for delay in (2.0, 4.0):
+        with pytest.raises(Requeue) as requeue:
+            await package.update_metadata(
+                master, attempts=3, backoff=2.0, requeue_on_stale=True
+            )
+        assert requeue.value.delay == delay
+    with pytest.raises(StaleMetadata):
+        await package.update_metadata(master, attempts=3, requeue_on_stale=True)
+    assert master.get_package_metadata.await_count == 3  # type: ignore
+
+
 @pytest.mark.asyncio
 async def test_package_not_found(caplog: CaptureFixture, master: Master) -> None:
     pkg_name = "foo"
@@ -43,3 +65,43 @@ async def test_package_not_found(caplog: CaptureFixture, master: Master) -> None
     with pytest.raises(PackageNotFound):
         await package.update_metadata(master)
     assert "foo no longer exists on PyPI" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_package_update_metadata_keeps_raw(master: Master) -> None:
+    raw = b'{"info": {"name": "foo"}, "releases": {}}'
+    master.get_package_metadata = asynctest.CoroutineMock(  # type: ignore
+        return_value=raw
+    )
+    package = Package("foo", serial=11)
+
+    await package.update_metadata(master, keep_raw=True)
+    assert package.raw_metadata == raw
+    assert package.info == {"name": "foo"}
+    master.get_package_metadata.assert_awaited_with(  # type: ignore
+        "foo", serial=11, raw=True
+    )
+
+
+@pytest.mark.asyncio
+async def test_package_update_metadata_conditional(master: Master) -> None:
+    validators = Validators('"abc"', None, 11)
+    master.get_package_metadata_if_changed = asynctest.CoroutineMock(  # type: ignore
+        return_value=(None, validators)
+    )
+    package = Package("foo", serial=11)
+
+    await package.update_metadata(master, conditional=True, validators=validators)
+    assert package.not_modified
+    assert package.validators == validators
+    master.get_package_metadata_if_changed.assert_awaited_with(  # type: ignore
+        "foo", serial=11, validators=validators
+    )
+
+    master.get_package_metadata_if_changed = asynctest.CoroutineMock(  # type: ignore
+        return_value=(b'{"info": {"name": "foo"}}', Validators('"def"', None, 12))
+    )
+    await package.update_metadata(master, conditional=True, validators=validators)
+    assert not package.not_modified
+    assert package.info == {"name": "foo"}
+    assert package.raw_metadata is None
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from bandersnatch.package_index import PackageIndex
+from bandersnatch_storage_plugins.filesystem import FilesystemStorage
+
+
+def test_package_index_missing(tmpdir: Path) -> None:
+    index = PackageIndex(FilesystemStorage(), Path(tmpdir) / "package-index")
+    assert not index.exists()
+    assert index.load() is None
+    assert list(index) == []
+
+
+def test_package_index_add_remove_save(tmpdir: Path) -> None:
+    path = Path(tmpdir) / "package-index"
+    path.write_text("foo\nzope\n")
+    index = PackageIndex(FilesystemStorage(), path)
+
+    index.add(["Bar_Baz", "foo"])
+    index.remove(["zope", "not-there"])
+    assert "bar-baz" in index
+    assert "Bar.Baz" in index
+    assert "zope" not in index
+    assert len(index) == 2
+
+    index.save()
+    assert path.read_text() == "bar-baz\nfoo\n"
+    assert PackageIndex(FilesystemStorage(), path).load() == {"bar-baz", "foo"}
+
+
+def test_package_index_rebuild(tmpdir: Path) -> None:
+    path = Path(tmpdir) / "package-index"
+    path.write_text("foo\n")
+    index = PackageIndex(FilesystemStorage(), path)
+    index.rebuild(["Zope.Interface", "bar"])
+    assert list(index) == ["bar", "zope-interface"]
+
+
+def test_package_index_serials(tmpdir: Path) -> None:
+    path = Path(tmpdir) / "package-index"
+    path.write_text("bar 10\nfoo\n")
+    index = PackageIndex(FilesystemStorage(), path)
+    assert index.serial("bar") == 10
+    assert index.serial("foo") == 0
+    assert index.serial("not-there") == 0
+
+    index.add(["Foo"], 12)
+    # Adding without a serial doesn't forget the one we know
+    index.add(["bar"])
+    index.rebuild(["bar", "foo", "zope"])
+    index.save()
+    assert path.read_text() == "bar 10\nfoo 12\nzope\n"
+    assert PackageIndex(FilesystemStorage(), path).load() == {"bar", "foo", "zope"}
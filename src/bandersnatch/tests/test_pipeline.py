@@ -0,0 +1,114 @@
+from typing import Awaitable, Callable, List, Tuple
+
+import pytest
+
+from bandersnatch.package import Package
+from bandersnatch.pipeline import Pipeline, Requeue, Stage
+
+
+@pytest.mark.asyncio
+async def test_pipeline_passes_packages_through_stages() -> None:
+    seen: List[Tuple[str, str]] = []
+
+    def record(
+        stage_name: str, keep: bool = True
+    ) -> Callable[[Package], Awaitable[bool]]:
+        async def handler(package: Package) -> bool:
+            seen.append((stage_name, package.name))
+            return keep or package.name != "bar"
+
+        return handler
+
+    errors: List[Tuple[BaseException, Package]] = []
+    stages = [
+        Stage("first", record("first"), 2),
+        Stage("second", record("second", keep=False), 1, 1),
+        Stage("third", record("third"), 3, 1),
+    ]
+    pipeline = Pipeline(stages, lambda e, p: errors.append((e, p)))
+    await pipeline.run([Package("foo"), Package("bar"), Package("baz")])
+
+    assert not errors
+    assert sorted(name for stage, name in seen if stage == "first") == [
+        "bar",
+        "baz",
+        "foo",
+    ]
+    assert sorted(name for stage, name in seen if stage == "third") == ["baz", "foo"]
+    assert stages[1].processed == 3
+    assert stages[1].dropped == 1
+    assert stages[2].processed == 2
+    assert stages[0].max_depth >= 1
+    assert "second: 3 processed, 1 dropped" in str(stages[1])
+
+
+@pytest.mark.asyncio
+async def test_pipeline_reports_errors_and_continues() -> None:
+    async def explode(package: Package) -> bool:
+        if package.name == "foo":
+            raise RuntimeError("boom")
+        return True
+
+    finished: List[str] = []
+
+    async def finish(package: Package) -> bool:
+        finished.append(package.name)
+        return True
+
+    errors: List[Tuple[BaseException, Package]] = []
+    stages = [Stage("explode", explode), Stage("finish", finish)]
+    pipeline = Pipeline(stages, lambda e, p: errors.append((e, p)))
+    await pipeline.run([Package("foo"), Package("bar")])
+
+    assert finished == ["bar"]
+    assert len(errors) == 1
+    assert errors[0][1].name == "foo"
+    assert stages[0].errors == 1
+    assert [(idx, p.name) for idx, p in pipeline.failures] == [(0, "foo")]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_priority_stage_orders_packages() -> None:
+    seen: List[str] = []
+
+    async def record(package: Package) -> bool:
+        seen.append(package.name)
+        return True
+
+    sizes = {"a": 1, "b": 30, "c": 20, "d": 30}
+    stages = [Stage("first", record, 1, priority=lambda p: -sizes[p.name])]
+    pipeline = Pipeline(stages, lambda e, p: None)
+    await pipeline.run([Package(name) for name in sorted(sizes)])
+
+    # Equal priorities keep their order
+    assert seen == ["b", "d", "c", "a"]
+    assert stages[0].processed == 4
+
+
+@pytest.mark.asyncio
+async def test_pipeline_requeues_packages() -> None:
+    attempts: List[str] = []
+
+    async def flaky(package: Package) -> bool:
+        attempts.append(package.name)
+        if attempts.count(package.name) < 3 and package.name == "foo":
+            raise Requeue(1.0, "stale serial")
+        return True
+
+    finished: List[str] = []
+
+    async def finish(package: Package) -> bool:
+        finished.append(package.name)
+        return True
+
+    errors: List[Tuple[BaseException, Package]] = []
+    stages = [Stage("flaky", flaky, 2), Stage("finish", finish)]
+    pipeline = Pipeline(stages, lambda e, p: errors.append((e, p)))
+    await pipeline.run([Package("foo"), Package("bar")])
+
+    assert not errors
+    assert attempts.count("foo") == 3
+    assert sorted(finished) == ["bar", "foo"]
+    assert stages[0].requeued == 2
+    assert stages[0].delayed == 0
+    assert "2 requeued" in str(stages[0])
@@ -0,0 +1,92 @@
+import argparse
+import configparser
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import asynctest
+import pytest
+from _pytest.capture import CaptureFixture
+
+import bandersnatch
+from bandersnatch.master import Master
+from bandersnatch.mirror import BandersnatchMirror
+from bandersnatch.plan import Plan, format_bytes, plan
+
+
+def test_format_bytes() -> None:
+    assert format_bytes(999) == "999 B"
+    assert format_bytes(1500) == "1.5 KB"
+    assert format_bytes(2_000_000_000) == "2.0 GB"
+
+
+@pytest.mark.asyncio
+async def test_plan_compares_against_mirror(
+    tmpdir: Path, master: Master, package_json: Dict[str, Any]
+) -> None:
+    mirror = BandersnatchMirror(Path(tmpdir), master, json_save=True)
+    zip_file, whl_file = package_json["releases"]["0.1"]
+    zip_file["size"] = 0
+    whl_file["size"] = 100
+    old_file = dict(whl_file, url="https://pypi.example.com/packages/f/foo/old.whl")
+    mirror.json_file("foo").write_text(
+        json.dumps({"releases": {"0.1": [zip_file], "0.0": [old_file]}})
+    )
+    for url in (zip_file["url"], old_file["url"]):
+        path = mirror._file_url_to_local_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    mirror.packages_to_sync = {"foo": 1}
+
+    plan = Plan(mirror)
+    await plan.run()
+
+    assert plan.packages == 1
+    assert (plan.new.files, plan.new.bytes) == (1, 100)
+    assert plan.unchanged.files == 1
+    assert plan.changed.files == 0
+    assert (plan.unreferenced.files, plan.unreferenced.bytes) == (1, 100)
+    assert plan.transfer_bytes == 100
+    assert plan.eta(10) == pytest.approx(plan.metadata_seconds + 10)
+    report = "\n".join(plan.report(10))
+    assert "New files: 1 files (100 B)" in report
+    # Nothing was downloaded or saved
+    assert not mirror._file_url_to_local_path(whl_file["url"]).exists()
+    assert "old.whl" in mirror.json_file("foo").read_text()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("force_check", [False, True])
+async def test_plan_leaves_mirror_alone(
+    tmpdir: Path, master: Master, capfd: CaptureFixture, force_check: bool
+) -> None:
+    homedir = Path(tmpdir) / "mirror"
+    homedir.mkdir()
+    state = {
+        "generation": b"5",
+        "status": b"1",
+        "todo": b"3\nfoo 3",
+        "todo.journal": b"bar\n",
+    }
+    for name, contents in state.items():
+        (homedir / name).write_bytes(contents)
+    config = configparser.ConfigParser()
+    config.read(Path(bandersnatch.__file__).parent / "unittest.conf")
+    config["mirror"]["directory"] = homedir.as_posix()
+    config["mirror"]["release-files"] = "false"
+    args = argparse.Namespace(force_check=force_check, throughput=10, workers=0)
+    master.all_packages = asynctest.CoroutineMock(  # type: ignore
+        return_value={"foo": 3, "bar": 2}
+    )
+
+    with asynctest.patch("bandersnatch.plan.master_from_config") as from_config:
+        from_config.return_value.__aenter__.return_value = master
+        assert await plan(config, args) == 0
+
+    out, _ = capfd.readouterr()
+    # A full sync ignores the todo list
+    expected = "2 (serial 0 -> 3)" if force_check else "1 (serial 1 -> 3)"
+    assert f"Packages to sync: {expected}" in out
+    for name, contents in state.items():
+        assert (homedir / name).read_bytes() == contents
+    assert sorted(path.name for path in homedir.iterdir()) == sorted(state)
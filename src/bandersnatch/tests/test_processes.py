@@ -0,0 +1,46 @@
+import pytest
+
+from bandersnatch.processes import (
+    Partition,
+    PartitionResult,
+    partition_packages,
+    run_partitions,
+)
+
+
+def sync_partition(config_file: str, partition: Partition) -> PartitionResult:
+    if "crash" in partition.packages:
+        raise RuntimeError("crashed")
+    return PartitionResult(
+        altered_packages={name: {config_file} for name in partition.packages},
+        diff_file_list=[],
+        package_serials={},
+        unfinished={},
+        errors=False,
+    )
+
+
+def test_partition_packages() -> None:
+    partitions = partition_packages({"foo": 1, "bar": 2, "Baz": 3}, 2)
+    assert partitions == [{"bar": 2}, {"foo": 1, "Baz": 3}]
+    assert partition_packages({"foo": 1}, 1) == [{"foo": 1}]
+
+
+@pytest.mark.asyncio
+async def test_run_partitions_in_processes() -> None:
+    partitions = [Partition(0, {"bar": 2}, 3), Partition(1, {"foo": 1}, 3)]
+    results = await run_partitions(sync_partition, "test.conf", partitions)
+    assert [result.altered_packages for result in results] == [
+        {"bar": {"test.conf"}},
+        {"foo": {"test.conf"}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_run_partitions_keeps_results_of_others_on_failure() -> None:
+    partitions = [Partition(0, {"crash": 2}, 3), Partition(1, {"foo": 1}, 3)]
+    crashed, synced = await run_partitions(sync_partition, "test.conf", partitions)
+    assert crashed.unfinished == {"crash": 2}
+    assert crashed.errors
+    assert synced.altered_packages == {"foo": {"test.conf"}}
+    assert not synced.errors
@@ -0,0 +1,90 @@
+import configparser
+import datetime
+from email.utils import format_datetime
+
+import pytest
+
+from bandersnatch.rate_limit import (
+    RateLimits,
+    RateRule,
+    TokenBucket,
+    parse_rate,
+    parse_retry_after,
+)
+
+
+def test_parse_rate() -> None:
+    assert parse_rate("20") == 20
+    assert parse_rate("1.5k") == 1500
+    assert parse_rate("20M") == 20_000_000
+    with pytest.raises(ValueError):
+        parse_rate("fast")
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after("86400") == 600
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    retry_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=30
+    )
+    assert 25 < parse_retry_after(format_datetime(retry_at)) <= 30  # type: ignore
+
+
+def test_rate_rule() -> None:
+    rule = RateRule.parse("08:00-18:00 bandwidth=20M requests=5")
+    assert rule.requests == 5
+    assert rule.bandwidth == 20_000_000
+    assert rule.applies_at(datetime.time(12))
+    assert not rule.applies_at(datetime.time(18))
+
+    overnight = RateRule.parse("22:00-06:00 requests=1")
+    assert overnight.applies_at(datetime.time(23))
+    assert overnight.applies_at(datetime.time(5))
+    assert not overnight.applies_at(datetime.time(12))
+    assert RateRule.parse("requests=1").applies_at(datetime.time(12))
+
+    with pytest.raises(ValueError):
+        RateRule.parse("speed=1")
+
+
+def test_token_bucket_debt() -> None:
+    bucket = TokenBucket(rate=100)
+    assert bucket.reserve(100) == 0
+    assert bucket.reserve(50) == pytest.approx(0.5, abs=0.05)
+    assert TokenBucket().reserve(10 ** 9) == 0
+
+
+def test_rate_limits_from_config() -> None:
+    config = configparser.ConfigParser()
+    config.read_string(
+        """\
+[DEFAULT]
+timeout = 10
+
+[rate_limits]
+files.pythonhosted.org =
+    00:00-00:00 bandwidth=1M
+    bandwidth=200M
+default =
+    requests=20
+"""
+    )
+    limits = RateLimits.from_config(config)
+    assert sorted(limits.rules) == ["default", "files.pythonhosted.org"]
+    files = limits.for_url("https://files.pythonhosted.org/packages/foo.whl")
+    assert files is limits.for_url("https://files.pythonhosted.org/other")
+    files._apply_schedule()
+    assert files.bandwidth.rate == 200_000_000
+    assert files.requests.rate == 0
+
+    pypi = limits.for_url("https://pypi.org/pypi/foo/json")
+    pypi._apply_schedule()
+    assert pypi.requests.rate == 20
+    assert RateLimits().for_url("https://pypi.org").rules == []
+
+    # Processes syncing at once share the limits
+    pypi = RateLimits.from_config(config, processes=4).for_url("https://pypi.org")
+    pypi._apply_schedule()
+    assert pypi.requests.rate == 5
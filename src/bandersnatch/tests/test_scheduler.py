@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from bandersnatch.mirror import BandersnatchMirror
+from bandersnatch.package import Package
+from bandersnatch.scheduler import (
+    LargestFirst,
+    PopularFirst,
+    SchedulingPolicy,
+    get_scheduling_policy,
+)
+
+
+def test_get_scheduling_policy(mirror: BandersnatchMirror) -> None:
+    assert type(get_scheduling_policy("alphabetical", mirror)) is SchedulingPolicy
+    assert type(get_scheduling_policy("largest-first", mirror)) is LargestFirst
+    with pytest.raises(ValueError):
+        get_scheduling_policy("random", mirror)
+
+
+def test_largest_first(mirror: BandersnatchMirror) -> None:
+    for name, size in (("small", 10), ("big", 1000)):
+        json_file = mirror.json_file(name)
+        json_file.parent.mkdir(parents=True, exist_ok=True)
+        release_file = {"filename": f"{name}.whl", "size": size}
+        json_file.write_text(json.dumps({"releases": {"0.1": [release_file] * 2}}))
+
+    policy = LargestFirst(mirror)
+    assert policy.estimated_bytes(Package("big")) == 2000
+    packages = [Package(name) for name in ("new", "small", "big")]
+    priorities = policy.priorities(packages)
+    assert sorted(priorities, key=priorities.__getitem__) == ["big", "small", "new"]
+
+
+def test_popular_first(mirror: BandersnatchMirror, tmpdir: Path) -> None:
+    stats = Path(tmpdir) / "downloads.csv"
+    stats.write_text("project,num_downloads\nFoo_Bar,10\nbaz,500\n")
+    mirror.download_stats = str(stats)
+
+    policy = PopularFirst(mirror)
+    assert policy.downloads == {"foo-bar": 10, "baz": 500}
+    packages = [Package(name) for name in ("aaa", "foo-bar", "baz")]
+    priorities = policy.priorities(packages)
+    assert sorted(priorities, key=priorities.__getitem__) == ["baz", "foo-bar", "aaa"]
+
+
+def test_popular_first_without_stats(mirror: BandersnatchMirror) -> None:
+    policy = PopularFirst(mirror)
+    assert policy.priority(Package("foo")) == (0, "foo")
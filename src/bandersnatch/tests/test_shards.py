@@ -0,0 +1,62 @@
+import configparser
+from pathlib import Path
+
+import pytest
+
+from bandersnatch.shards import ShardCoordinator, ShardOptions, shard_of
+from bandersnatch_storage_plugins.filesystem import FilesystemStorage
+
+
+def test_shard_of_is_stable() -> None:
+    assert shard_of("foo", 2) == 1
+    assert shard_of("bar", 2) == 0
+    assert shard_of("Foo", 2) == shard_of("foo", 2)
+    # Every package belongs to exactly one shard
+    for name in ("foo", "bar", "baz", "zope.interface"):
+        owners = [index for index in range(4) if ShardOptions(4, index).owns(name)]
+        assert len(owners) == 1
+
+
+def test_shard_options_from_config() -> None:
+    config = configparser.ConfigParser()
+    config.read_string("[mirror]\nshard-count = 4\nshard-index = 3\n")
+    options = ShardOptions.from_config(config)
+    assert options == ShardOptions(4, 3)
+    assert options.enabled
+    assert options.directory(Path("/mirror")) == Path("/mirror/shards/3")
+    assert not ShardOptions().enabled
+    assert ShardOptions().owns("foo")
+    assert ShardOptions().directory(Path("/mirror")) == Path("/mirror")
+
+    config.read_string("[mirror]\nshard-count = 4\nshard-index = 4\n")
+    with pytest.raises(ValueError):
+        ShardOptions.from_config(config)
+
+
+def test_coordinator_waits_for_every_shard(tmpdir: Path) -> None:
+    homedir = Path(tmpdir)
+    coordinator = ShardCoordinator(FilesystemStorage(), homedir, ShardOptions(2))
+    for index in range(2):
+        (homedir / "shards" / str(index)).mkdir(parents=True)
+
+    (homedir / "shards" / "0" / "status").write_text("10")
+    assert coordinator.advance() is None
+
+    (homedir / "shards" / "1" / "status").write_text("12")
+    assert coordinator.advance() == 10
+    coordinator.save(10)
+    assert (homedir / "status").read_text() == "10"
+    # Nothing to do until the slowest shard moves on
+    assert coordinator.advance() is None
+
+
+def test_coordinator_merges_package_indexes(tmpdir: Path) -> None:
+    homedir = Path(tmpdir)
+    coordinator = ShardCoordinator(FilesystemStorage(), homedir, ShardOptions(2))
+    for index, contents in enumerate(["bar 3\n", "foo 5\nbaz\n"]):
+        (homedir / "shards" / str(index)).mkdir(parents=True)
+        (homedir / "shards" / str(index) / "package-index").write_text(contents)
+
+    package_index = coordinator.merged_package_index()
+    package_index.save()
+    assert (homedir / "package-index").read_text() == "bar 3\nbaz\nfoo 5\n"
@@ -0,0 +1,133 @@
+import asyncio
+import configparser
+import json
+from typing import Any
+
+import pytest
+
+from bandersnatch.simple import (
+    PageRenderer,
+    RenderedPage,
+    RenderOptions,
+    SimpleFile,
+    SimplePage,
+    render_page,
+    render_simple_index_json,
+    render_simple_json,
+    render_simple_page,
+)
+
+PAGE = SimplePage(
+    "Foo",
+    [
+        SimpleFile("foo-1.0.tar.gz", "../../packages/foo-1.0.tar.gz", "abc"),
+        SimpleFile(
+            "foo-2.0.whl",
+            "../../packages/foo-2.0.whl",
+            "def",
+            requires_python=">=3.6",
+            size=1024,
+        ),
+    ],
+    "sha256",
+    42,
+    versions=("1.0", "2.0"),
+)
+
+
+def test_render_simple_page() -> None:
+    assert render_simple_page(PAGE) == (
+        "<!DOCTYPE html>\n"
+        "<html>\n"
+        "  <head>\n"
+        "    <title>Links for Foo</title>\n"
+        "  </head>\n"
+        "  <body>\n"
+        "    <h1>Links for Foo</h1>\n"
+        '    <a href="../../packages/foo-1.0.tar.gz#sha256=abc">foo-1.0.tar.gz</a>'
+        "<br/>\n"
+        '    <a href="../../packages/foo-2.0.whl#sha256=def" '
+        'data-requires-python="&gt;=3.6">foo-2.0.whl</a><br/>\n'
+        "  </body>\n"
+        "</html>\n"
+        "<!--SERIAL 42-->"
+    )
+
+
+def test_render_simple_json() -> None:
+    # Version 1.1 requires the size of every file
+    assert json.loads(render_simple_json(PAGE)) == {
+        "meta": {"api-version": "1.0", "_last-serial": 42},
+        "name": "foo",
+        "versions": ["1.0", "2.0"],
+        "files": [
+            {
+                "filename": "foo-1.0.tar.gz",
+                "url": "../../packages/foo-1.0.tar.gz",
+                "hashes": {"sha256": "abc"},
+            },
+            {
+                "filename": "foo-2.0.whl",
+                "url": "../../packages/foo-2.0.whl",
+                "hashes": {"sha256": "def"},
+                "requires-python": ">=3.6",
+                "size": 1024,
+            },
+        ],
+    }
+    sized = PAGE._replace(files=[file._replace(size=1) for file in PAGE.files])
+    assert json.loads(render_simple_json(sized))["meta"]["api-version"] == "1.1"
+    assert render_page(PAGE) == RenderedPage(render_simple_page(PAGE))
+    assert render_page(PAGE, simple_json=True).json == render_simple_json(PAGE)
+
+
+def test_render_simple_index_json() -> None:
+    assert json.loads(render_simple_index_json(["bar", "foo"])) == {
+        "meta": {"api-version": "1.1"},
+        "projects": [{"name": "bar"}, {"name": "foo"}],
+    }
+
+
+def test_render_options_from_config() -> None:
+    config = configparser.ConfigParser()
+    config.read_string("[mirror]\n")
+    options = RenderOptions.from_config(config)
+    assert options == RenderOptions(0, 100)
+    assert not options.enabled
+
+    config.read_string("[mirror]\nrender-processes = 2\nrender-batch-size = 10\n")
+    options = RenderOptions.from_config(config)
+    assert options == RenderOptions(2, 10)
+    assert options.enabled
+
+    config.read_string("[mirror]\nrender-batch-size = 0\n")
+    with pytest.raises(ValueError):
+        RenderOptions.from_config(config)
+
+
+@pytest.mark.asyncio
+async def test_page_renderer_renders_in_batches() -> None:
+    renderer = PageRenderer(RenderOptions(processes=1, batch_size=2))
+    renderer.start()
+    try:
+        pages = [PAGE._replace(serial=serial) for serial in range(3)]
+        # The third page waits for more in vain and is rendered on its own
+        rendered = await asyncio.gather(*[renderer.render(page) for page in pages])
+    finally:
+        renderer.close()
+    assert rendered == [RenderedPage(render_simple_page(page)) for page in pages]
+    assert renderer.pages == 3
+    assert renderer.batches == 2
+
+
+@pytest.mark.asyncio
+async def test_page_renderer_raises_render_errors() -> None:
+    renderer = PageRenderer(RenderOptions(processes=1, batch_size=1))
+    renderer.start()
+    # Not a list of files, rendering it fails in the worker
+    files: Any = None
+    try:
+        with pytest.raises(TypeError):
+            await renderer.render(PAGE._replace(files=files))
+    finally:
+        renderer.close()
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from bandersnatch.sqlite_cache import COMMIT_BATCH, SqliteCache
+
+
+def _cache(path: Path) -> SqliteCache:
+    return SqliteCache(
+        path, "things", ("name", "value"), 1, "name TEXT PRIMARY KEY, value TEXT"
+    )
+
+
+def test_sqlite_cache_commits_in_batches(tmpdir: Path) -> None:
+    path = Path(tmpdir) / "cache.sqlite"
+    cache = _cache(path)
+    other = _cache(path)
+    cache.replace(("foo", "1"))
+    cache.delete(("bar",))
+    # Lookups see the writes that weren't committed yet
+    assert cache.select(("foo",)) == ("foo", "1")
+    assert other.select(("foo",)) is None
+
+    for index in range(COMMIT_BATCH - 3):
+        cache.replace((str(index), "1"))
+    assert other.select(("foo",)) is None
+    cache.replace(("baz", "1"))
+    assert other.select(("foo",)) == ("foo", "1")
+
+    cache.delete(("foo",))
+    cache.commit()
+    assert other.select(("foo",)) is None
+    cache.close()
+    other.close()
+
+
+def test_sqlite_caches_share_a_file(tmpdir: Path) -> None:
+    path = Path(tmpdir) / "cache.sqlite"
+    caches = [_cache(path) for _ in range(2)]
+    for index in range(COMMIT_BATCH * 3):
+        caches[index % 2].replace((str(index), str(index)))
+    for cache in caches:
+        cache.close()
+
+    cache = _cache(path)
+    assert cache.select((str(COMMIT_BATCH * 3 - 1),)) is not None
+    cache.close()
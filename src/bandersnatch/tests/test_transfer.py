@@ -0,0 +1,45 @@
+import configparser
+import unittest.mock as mock
+
+import pytest
+
+from bandersnatch.transfer import DownloadStalled, DownloadTimeouts, StallMonitor
+
+
+def test_download_timeouts_from_config() -> None:
+    config = configparser.ConfigParser()
+    config.read_string("[mirror]\ntimeout = 10\ndownload-min-speed = 100K\n")
+    timeouts = DownloadTimeouts.from_config(config)
+    assert timeouts.enabled
+    assert timeouts.min_speed == 100_000
+    # Failed downloads aren't retried unless configured
+    assert timeouts.retries == 0
+    assert timeouts.deadline(1_000_000) == 20.0
+    assert timeouts.deadline(None) is None
+    assert DownloadTimeouts().deadline(1_000_000) is None
+    config.read_string("[mirror]\ndownload-retries = 2\n")
+    assert DownloadTimeouts.from_config(config).retries == 2
+
+
+def test_retry_delay_backs_off() -> None:
+    timeouts = DownloadTimeouts()
+    assert [timeouts.retry_delay(attempt) for attempt in range(3)] == [1, 2, 4]
+    assert timeouts.retry_delay(10) == 60
+
+
+def test_stall_monitor() -> None:
+    with mock.patch("bandersnatch.transfer.time.monotonic") as monotonic:
+        monotonic.return_value = 0.0
+        monitor = StallMonitor("https://files.example.com/foo.whl", 100, 10)
+        # Too early to tell
+        monotonic.return_value = 5.0
+        monitor.on_bytes(10)
+        monotonic.return_value = 10.0
+        monitor.on_bytes(1000)
+        # The chunk from 5s ago is still in the window, 1010 bytes in 10s
+        monotonic.return_value = 14.0
+        monitor.on_bytes(10)
+        # Only the 10 bytes from 14s ago are left in the window
+        monotonic.return_value = 21.0
+        with pytest.raises(DownloadStalled):
+            monitor.on_bytes(0)
@@ -0,0 +1,109 @@
+import configparser
+
+import pytest
+
+from bandersnatch.upstreams import (
+    CIRCUIT_FAILURES,
+    MIN_COOLDOWN,
+    Upstream,
+    UpstreamPool,
+    Upstreams,
+)
+
+
+def test_upstream_circuit_breaker() -> None:
+    upstream = Upstream("https://pypi.example.com/")
+    assert upstream.url == "https://pypi.example.com"
+    for _ in range(CIRCUIT_FAILURES - 1):
+        upstream.on_failure("timeout")
+    assert upstream.available
+    upstream.on_failure("timeout")
+    assert not upstream.available
+    assert upstream.cooldown == MIN_COOLDOWN
+    upstream.open_until = 0.0
+    upstream.on_failure("timeout")
+    assert upstream.cooldown == 2 * MIN_COOLDOWN
+    upstream.open_until = 0.0
+    upstream.on_success(0.5)
+    assert upstream.available
+    assert upstream.consecutive_failures == 0
+    assert upstream.cooldown == 0.0
+    assert upstream.latency == 0.5
+
+
+def test_pool_ordered_skips_open_circuits() -> None:
+    pool = UpstreamPool(["https://a.example.com", "https://b.example.com"])
+    a, b = pool.ordered()
+    assert a.url == "https://a.example.com"
+    for _ in range(CIRCUIT_FAILURES):
+        a.on_failure("HTTP 503")
+    assert pool.ordered() == [b, a]
+
+
+def test_pool_fastest() -> None:
+    pool = UpstreamPool(
+        ["https://a.example.com", "https://b.example.com"], selection="fastest"
+    )
+    a, b = pool.ordered()
+    a.on_success(2.0)
+    assert pool.ordered() == [b, a]
+    b.on_success(3.0)
+    assert pool.ordered() == [a, b]
+
+
+def test_pool_invalid_selection() -> None:
+    with pytest.raises(ValueError):
+        UpstreamPool([], selection="random")
+
+
+def test_metadata_routes() -> None:
+    upstreams = Upstreams(
+        "https://pypi.example.com", metadata_sources=["https://mirror.example.com"]
+    )
+    routes = upstreams.routes("/pypi/foo/json")
+    assert [route.url for route in routes] == [
+        "https://pypi.example.com/pypi/foo/json",
+        "https://mirror.example.com/pypi/foo/json",
+    ]
+    assert [route.authoritative for route in routes] == [True, False]
+    assert all(route.metadata for route in routes)
+    assert upstreams.routes("https://pypi.example.com/pypi/foo/json") == routes
+
+
+def test_file_routes() -> None:
+    upstreams = Upstreams(
+        "https://pypi.example.com", file_sources=["https://mirror.example.com/"]
+    )
+    routes = upstreams.routes("https://files.example.com/packages/ab/foo.whl")
+    assert [route.url for route in routes] == [
+        "https://files.example.com/packages/ab/foo.whl",
+        "https://mirror.example.com/packages/ab/foo.whl",
+    ]
+    assert [route.authoritative for route in routes] == [True, False]
+    assert not any(route.metadata for route in routes)
+    # Other file hosts aren't fallbacks for each other
+    routes = upstreams.routes("https://other.example.com/foo.whl")
+    assert [route.url for route in routes] == [
+        "https://other.example.com/foo.whl",
+        "https://mirror.example.com/foo.whl",
+    ]
+
+
+def test_upstreams_from_config() -> None:
+    config = configparser.ConfigParser()
+    config.read_string(
+        "[mirror]\n"
+        "master = https://pypi.example.com\n"
+        "metadata-sources =\n"
+        "    https://a.example.com\n"
+        "    https://b.example.com\n"
+        "source-selection = fastest\n"
+    )
+    upstreams = Upstreams.from_config(config)
+    assert upstreams.urls == [
+        "https://pypi.example.com",
+        "https://a.example.com",
+        "https://b.example.com",
+    ]
+    assert upstreams.files.selection == "fastest"
+    assert str(upstreams) == "upstreams: no requests"
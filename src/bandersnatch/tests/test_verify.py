@@ -8,10 +8,12 @@ from shutil import rmtree
 from tempfile import gettempdir
 from typing import Any, List
 
+import asynctest
 import pytest
 from _pytest.monkeypatch import MonkeyPatch
 
 import bandersnatch
+from bandersnatch.http_cache import ValidatorCache, Validators
 from bandersnatch.master import Master
 from bandersnatch.utils import convert_url_to_path, find
 
@@ -34,21 +36,25 @@ def some_dirs(*args: Any, **kwargs: Any) -> List[str]:
 class FakeArgs:
     delete = True
     dry_run = True
+    json_update = False
     workers = 2
 
 
 class FakeConfig:
-    def get(self, section: str, item: str) -> str:
+    def get(self, section: str, item: str, fallback: str = "") -> str:
         if section == "mirror":
             if item == "directory":
                 return "/data/pypi"
             if item == "master":
                 return "https://pypi.org/simple/"
-        return ""
+        return fallback
 
     def getfloat(self, section: str, item: str, fallback: float = 0.5) -> float:
         return 0.5
 
+    def getint(self, section: str, item: str, fallback: int = 0) -> int:
+        return fallback
+
 
 # TODO: Support testing sharded simple dirs
 class FakeMirror:
@@ -198,14 +204,52 @@ async def test_get_latest_json(monkeypatch: MonkeyPatch) -> None:
     await get_latest_json(master, json_path, config, executor)  # type: ignore
 
 
+@pytest.mark.asyncio
+async def test_get_latest_json_not_modified(tmpdir: Path) -> None:
+    json_path = Path(tmpdir) / "web" / "json" / "foo"
+    json_path.parent.mkdir(parents=True)
+    json_path.write_bytes(b"{}")
+    validator_cache = ValidatorCache(Path(tmpdir) / "http-cache.sqlite")
+    validators = Validators('"abc"', None, 10)
+    validator_cache.set("foo", validators)
+    master = Master("https://unittest.org")
+    get_if_changed = asynctest.CoroutineMock(
+        return_value=(None, Validators('"abc"', None, 12))
+    )
+    master.get_package_metadata_if_changed = get_if_changed  # type: ignore
+    await get_latest_json(
+        master, json_path, FakeConfig(), validator_cache=validator_cache  # type: ignore
+    )
+    get_if_changed.assert_called_once_with("foo", serial=None, validators=validators)
+    assert json_path.read_bytes() == b"{}"
+    assert validator_cache.get("foo") == Validators('"abc"', None, 12)
+    assert validator_cache.hits == 1
+
+    # A changed document gets written out
+    master.get_package_metadata_if_changed = asynctest.CoroutineMock(  # type: ignore
+        return_value=(b'{"info": {}}', Validators('"def"', None, 13))
+    )
+    await get_latest_json(
+        master, json_path, FakeConfig(), validator_cache=validator_cache  # type: ignore
+    )
+    assert json_path.read_bytes() == b'{"info": {}}'
+    assert validator_cache.get("foo") == Validators('"def"', None, 13)
+    validator_cache.close()
+
+
 @pytest.mark.asyncio
 async def test_metadata_verify(monkeypatch: MonkeyPatch) -> None:
     fa = FakeArgs()
-    fc = FakeConfig()
+    # The master is set up from a complete config
+    config = configparser.ConfigParser()
+    config.read_string(
+        "[mirror]\ndirectory = /data/pypi\nmaster = https://pypi.org/simple/\n"
+        + "timeout = 0.5\nworkers = 1\n"
+    )
     monkeypatch.setattr(bandersnatch.verify, "verify_producer", do_nothing)
     monkeypatch.setattr(bandersnatch.verify, "delete_unowned_files", do_nothing)
     monkeypatch.setattr(bandersnatch.verify.os, "listdir", some_dirs)
-    await metadata_verify(fc, fa)  # type: ignore
+    await metadata_verify(config, fa)  # type: ignore
 
 
 if __name__ == "__main__":
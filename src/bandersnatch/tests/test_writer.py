@@ -0,0 +1,31 @@
+import hashlib
+import io
+from typing import Any
+
+import pytest
+
+from bandersnatch.writer import ChunkWriter
+
+
+@pytest.mark.asyncio
+async def test_chunk_writer_writes_and_hashes_in_order() -> None:
+    f = io.BytesIO()
+    checksum = hashlib.sha256()
+    async with ChunkWriter(f, checksum, maxsize=2) as writer:
+        for chunk in (b"foo", b"bar", b"baz", b"qux"):
+            await writer.write(chunk)
+    assert f.getvalue() == b"foobarbazqux"
+    assert checksum.hexdigest() == hashlib.sha256(b"foobarbazqux").hexdigest()
+    assert writer.bytes_written == 12
+
+
+@pytest.mark.asyncio
+async def test_chunk_writer_raises_write_errors() -> None:
+    class FullDisk(io.BytesIO):
+        def write(self, *args: Any) -> int:
+            raise OSError("No space left on device")
+
+    with pytest.raises(OSError):
+        async with ChunkWriter(FullDisk(), hashlib.sha256(), maxsize=1) as writer:
+            for _ in range(10):
+                await writer.write(b"foo")
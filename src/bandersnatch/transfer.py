@@ -0,0 +1,93 @@
+"""
+Size-aware deadlines and stall detection for release file downloads
+
+A single ``global-timeout`` doesn't fit a 1 KB file and a 2 GB wheel alike.
+With ``download-min-speed`` set, every release file gets a deadline of
+``timeout`` seconds plus its size (from the metadata) divided by the minimum
+speed, and a download delivering less than the minimum speed over the last
+``download-stall-window`` seconds is aborted. Both are retried in the same
+run, with exponential backoff, up to ``download-retries`` times. Resumable
+downloads continue where the aborted attempt left off.
+"""
+import asyncio
+import configparser
+import time
+from collections import deque
+from typing import Deque, NamedTuple, Optional, Tuple
+
+from .rate_limit import parse_rate
+
+# Longest pause between two attempts to download a file
+MAX_RETRY_DELAY = 60.0
+
+
+class DownloadStalled(asyncio.TimeoutError):
+    """A download delivered less than the minimum speed for too long"""
+
+
+class DownloadTimeouts(NamedTuple):
+    # Bytes per second a download has to keep up, 0 disables deadlines
+    min_speed: float = 0.0
+    # Seconds the speed is measured over
+    stall_window: float = 30.0
+    # Attempts after the first one to download a file in the same run
+    retries: int = 0
+    # Seconds allowed on top of what the size takes at the minimum speed
+    slack: float = 10.0
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> "DownloadTimeouts":
+        defaults = cls()
+        return cls(
+            min_speed=parse_rate(
+                config.get("mirror", "download-min-speed", fallback="0")
+            ),
+            stall_window=config.getfloat(
+                "mirror", "download-stall-window", fallback=defaults.stall_window
+            ),
+            retries=config.getint(
+                "mirror", "download-retries", fallback=defaults.retries
+            ),
+            slack=config.getfloat("mirror", "timeout", fallback=defaults.slack),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.min_speed > 0
+
+    def deadline(self, size: Optional[int]) -> Optional[float]:
+        """Seconds a download of size bytes may take, None for no deadline"""
+        if not self.enabled or size is None:
+            return None
+        return self.slack + size / self.min_speed
+
+    def retry_delay(self, attempt: int) -> float:
+        return float(min(2 ** attempt, MAX_RETRY_DELAY))
+
+
+class StallMonitor:
+    """Raise DownloadStalled if the bytes received over a sliding window add
+    up to less than min_speed"""
+
+    def __init__(self, url: str, min_speed: float, window: float) -> None:
+        self.url = url
+        self.min_speed = min_speed
+        self.window = window
+        self.started = time.monotonic()
+        self._chunks: Deque[Tuple[float, int]] = deque()
+        self._window_bytes = 0
+
+    def on_bytes(self, amount: int) -> None:
+        now = time.monotonic()
+        self._chunks.append((now, amount))
+        self._window_bytes += amount
+        while self._chunks and self._chunks[0][0] < now - self.window:
+            self._window_bytes -= self._chunks.popleft()[1]
+        if now - self.started < self.window:
+            return
+        speed = self._window_bytes / self.window
+        if speed < self.min_speed:
+            raise DownloadStalled(
+                f"{self.url} stalled at {speed:.0f} bytes/s over the last "
+                + f"{self.window:.0f}s"
+            )
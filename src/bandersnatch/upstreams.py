@@ -0,0 +1,215 @@
+"""
+Health tracking and per-request failover between upstream sources
+
+The ``master`` can be backed by further metadata sources, and the hosts named
+in release file URLs by further file sources, e.g. another bandersnatch
+mirror::
+
+    [mirror]
+    master = https://pypi.org
+    metadata-sources =
+        https://pypi-mirror.example.com
+    file-sources =
+        https://pypi-mirror.example.com
+    source-selection = ordered
+
+Every request picks its source on its own: the first healthy one in the
+configured order (the master, or the host from the file URL, comes first) or,
+with ``source-selection = fastest``, the healthy one with the lowest recent
+latency. A request failing with a connection error, a timeout or a server
+error is tried again on the next source. After ``CIRCUIT_FAILURES`` failures
+in a row the circuit of a source opens and it is skipped for a cool-down that
+doubles each time it fails again, up to ``MAX_COOLDOWN``. Once the cool-down
+is over, requests are let through to probe it and the first success closes
+the circuit. When every circuit is open the sources are still tried, soonest
+to recover first.
+
+Metadata sources have to serve ``/pypi/<package>/json`` with the
+``X-PyPI-Last-Serial`` header, otherwise their pages are stale and the next
+source is asked. File sources serve release files below their URL at the same
+path as the host in the file URL (``/packages/...``). Only the master and the
+host from the file URL are trusted to say a page or file doesn't exist; other
+sources may lag behind. Downloads are checked against the digest from the
+metadata no matter which source they came from.
+"""
+import configparser
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+SOURCE_SELECTIONS = ("ordered", "fastest")
+# Consecutive failures that open the circuit of a source
+CIRCUIT_FAILURES = 3
+# Seconds a source with an open circuit is skipped, doubling up to the maximum
+MIN_COOLDOWN = 30.0
+MAX_COOLDOWN = 600.0
+# Weight of the latest request in the moving average of latencies
+LATENCY_WEIGHT = 0.2
+
+
+class Upstream:
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown = 0.0
+        self.open_until = 0.0
+
+    def __str__(self) -> str:
+        latency = f"{self.latency * 1000:.0f}ms" if self.latency is not None else "-"
+        return (
+            f"{self.url}: {self.requests} requests, {self.failures} failures, "
+            + f"{latency} average latency"
+        )
+
+    @property
+    def available(self) -> bool:
+        """Whether the circuit is closed or the cool-down is over"""
+        return time.monotonic() >= self.open_until
+
+    def on_success(self, latency: float) -> None:
+        self.requests += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_WEIGHT * (latency - self.latency)
+        if self.consecutive_failures >= CIRCUIT_FAILURES:
+            logger.info(f"{self.url} is answering again, closing its circuit")
+        self.consecutive_failures = 0
+        self.cooldown = 0.0
+
+    def on_failure(self, reason: str) -> None:
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures < CIRCUIT_FAILURES:
+            return
+        self.cooldown = min(max(self.cooldown * 2, MIN_COOLDOWN), MAX_COOLDOWN)
+        self.open_until = time.monotonic() + self.cooldown
+        logger.warning(
+            f"Skipping {self.url} for {self.cooldown:.0f}s after "
+            + f"{self.consecutive_failures} failures in a row: {reason}"
+        )
+
+
+class UpstreamPool:
+    def __init__(self, urls: Iterable[str], selection: str = "ordered") -> None:
+        if selection not in SOURCE_SELECTIONS:
+            raise ValueError(
+                f"Supplied source-selection {selection} is not supported! "
+                + f"Please update source-selection to one of {SOURCE_SELECTIONS} "
+                + "in the [mirror] section."
+            )
+        self.selection = selection
+        self.upstreams: Dict[str, Upstream] = {}
+        for url in urls:
+            self.get(url)
+
+    def get(self, url: str) -> Upstream:
+        url = url.rstrip("/")
+        if url not in self.upstreams:
+            self.upstreams[url] = Upstream(url)
+        return self.upstreams[url]
+
+    def ordered(self, first: Optional[Upstream] = None) -> List[Upstream]:
+        """Upstreams in the order they should be tried, starting with first
+        (if given) and the others in configured order"""
+        upstreams = [
+            upstream for upstream in self.upstreams.values() if upstream is not first
+        ]
+        if first is not None:
+            upstreams.insert(0, first)
+        available = [upstream for upstream in upstreams if upstream.available]
+        if self.selection == "fastest":
+            # Sources without a measurement yet go first so they get one
+            available.sort(
+                key=lambda upstream: upstream.latency
+                if upstream.latency is not None
+                else 0.0
+            )
+        unavailable = sorted(
+            (upstream for upstream in upstreams if not upstream.available),
+            key=lambda upstream: upstream.open_until,
+        )
+        return available + unavailable
+
+
+class Route(NamedTuple):
+    upstream: Upstream
+    url: str
+    # Whether the upstream is the authority on what exists, i.e. the master
+    # or the host from the file URL
+    authoritative: bool
+    metadata: bool
+
+
+class Upstreams:
+    def __init__(
+        self,
+        master_url: str,
+        metadata_sources: Iterable[str] = (),
+        file_sources: Iterable[str] = (),
+        selection: str = "ordered",
+    ) -> None:
+        self.metadata = UpstreamPool([master_url, *metadata_sources], selection)
+        self.master = self.metadata.get(master_url)
+        self.files = UpstreamPool(file_sources, selection)
+        # Release file hosts from the metadata, e.g. files.pythonhosted.org
+        self.file_hosts: Dict[str, Upstream] = {}
+
+    def __str__(self) -> str:
+        upstreams = [*self.metadata.upstreams.values(), *self.files.upstreams.values()]
+        upstreams.extend(
+            upstream
+            for url, upstream in self.file_hosts.items()
+            if url not in self.files.upstreams
+        )
+        used = ", ".join(str(upstream) for upstream in upstreams if upstream.requests)
+        return f"upstreams: {used or 'no requests'}"
+
+    @classmethod
+    def from_config(cls, config: configparser.ConfigParser) -> "Upstreams":
+        def sources(option: str) -> List[str]:
+            return config.get("mirror", option, fallback="").split()
+
+        return cls(
+            config.get("mirror", "master"),
+            sources("metadata-sources"),
+            sources("file-sources"),
+            config.get("mirror", "source-selection", fallback="ordered"),
+        )
+
+    @property
+    def urls(self) -> List[str]:
+        return [*self.metadata.upstreams, *self.files.upstreams]
+
+    def is_metadata(self, url: str) -> bool:
+        return any(url.startswith(upstream) for upstream in self.metadata.upstreams)
+
+    def routes(self, path: str) -> List[Route]:
+        """The URLs path can be fetched from, in the order to try them. path is
+        either relative to the metadata sources or a release file URL."""
+        if not path.startswith(("https://", "http://")):
+            return [
+                Route(upstream, upstream.url + path, upstream is self.master, True)
+                for upstream in self.metadata.ordered()
+            ]
+        for upstream in self.metadata.upstreams.values():
+            if path.startswith(upstream.url):
+                return self.routes(path[len(upstream.url) :])  # noqa:E203
+
+        parsed = urlparse(path)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        if origin not in self.file_hosts:
+            self.file_hosts[origin] = self.files.upstreams.get(origin, Upstream(origin))
+        host = self.file_hosts[origin]
+        relative = path[len(origin) :]  # noqa:E203
+        return [
+            Route(upstream, upstream.url + relative, upstream is host, False)
+            for upstream in self.files.ordered(first=host)
+        ]
@@ -8,15 +8,19 @@ import shutil
 from argparse import Namespace
 from asyncio.queues import Queue
 from configparser import ConfigParser
+from functools import partial
 from pathlib import Path
 from sys import stderr
 from typing import List, Optional, Set
 from urllib.parse import urlparse
 
+from .errors import PackageNotFound
 from .filter import LoadedFilters
+from .http_cache import ValidatorCache
 from .master import Master
+from .mirror import master_from_config
 from .storage import storage_backend_plugins
-from .utils import convert_url_to_path, hash, recursive_find_files, unlink_parent_dir
+from .utils import convert_url_to_path, recursive_find_files, unlink_parent_dir
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +31,14 @@ async def get_latest_json(
     config: ConfigParser,
     executor: Optional[concurrent.futures.ThreadPoolExecutor] = None,
     delete_removed_packages: bool = False,
+    validator_cache: Optional[ValidatorCache] = None,
 ) -> None:
+    if validator_cache is not None:
+        await get_latest_json_if_changed(
+            master, json_path, validator_cache, executor, delete_removed_packages
+        )
+        return
+
     url_parts = urlparse(config.get("mirror", "master"))
     url = f"{url_parts.scheme}://{url_parts.netloc}/pypi/{json_path.name}/json"
     logger.debug(f"Updating {json_path.name} json from {url}")
@@ -44,6 +55,43 @@ async def get_latest_json(
             json_path.unlink()
 
 
+async def get_latest_json_if_changed(
+    master: Master,
+    json_path: Path,
+    validator_cache: ValidatorCache,
+    executor: Optional[concurrent.futures.ThreadPoolExecutor] = None,
+    delete_removed_packages: bool = False,
+) -> None:
+    """Revalidate json_path with upstream and only download it if it changed"""
+    loop = asyncio.get_event_loop()
+    package_name = json_path.name
+    validators = None
+    if await loop.run_in_executor(executor, json_path.exists):
+        validators = validator_cache.get(package_name)
+    logger.debug(f"Updating {package_name} json from {master.url}")
+    try:
+        raw_metadata, new_validators = await master.get_package_metadata_if_changed(
+            package_name, serial=None, validators=validators
+        )
+    except PackageNotFound:
+        logger.error(f"{package_name} does not exist upstream")
+        validator_cache.delete(package_name)
+        if delete_removed_packages and json_path.exists():
+            logger.debug(f"Unlinking {json_path} - assuming it does not exist upstream")
+            json_path.unlink()
+        return
+
+    validator_cache.record(raw_metadata is not None)
+    if raw_metadata is not None:
+        new_json_path = json_path.parent / f"{json_path.name}.new"
+        await loop.run_in_executor(
+            executor, partial(json_path.parent.mkdir, parents=True, exist_ok=True)
+        )
+        await loop.run_in_executor(executor, new_json_path.write_bytes, raw_metadata)
+        shutil.move(str(new_json_path), json_path)
+    validator_cache.set(package_name, new_validators)
+
+
 async def delete_unowned_files(
     mirror_base: Path,
     executor: concurrent.futures.ThreadPoolExecutor,
@@ -91,15 +139,24 @@ async def verify(
     args: argparse.Namespace,
     executor: Optional[concurrent.futures.ThreadPoolExecutor] = None,
     releases_key: str = "releases",
+    validator_cache: Optional[ValidatorCache] = None,
 ) -> None:
     json_base = mirror_base_path / "web" / "json"
     json_full_path = json_base / json_file
     loop = asyncio.get_event_loop()
+    storage_backend = next(iter(storage_backend_plugins(config=config)))
     logger.info(f"Parsing {json_file}")
 
     if args.json_update:
         if not args.dry_run:
-            await get_latest_json(master, json_full_path, config, executor, args.delete)
+            await get_latest_json(
+                master,
+                json_full_path,
+                config,
+                executor,
+                args.delete,
+                validator_cache=validator_cache,
+            )
         else:
             logger.info(f"[DRY RUN] Would of grabbed latest json for {json_file}")
 
@@ -129,7 +186,9 @@ async def verify(
                 else:
                     await master.url_fetch(jpkg["url"], pkg_file, executor)
 
-            calc_sha256 = await loop.run_in_executor(executor, hash, str(pkg_file))
+            calc_sha256 = await loop.run_in_executor(
+                executor, storage_backend.get_cached_hash, str(pkg_file)
+            )
             if calc_sha256 != jpkg["digests"]["sha256"]:
                 if not args.dry_run:
                     await loop.run_in_executor(None, pkg_file.unlink)
@@ -152,6 +211,7 @@ async def verify_producer(
     json_files: List[str],
     args: argparse.Namespace,
     executor: Optional[concurrent.futures.ThreadPoolExecutor] = None,
+    validator_cache: Optional[ValidatorCache] = None,
 ) -> None:
     queue: asyncio.Queue = asyncio.Queue()
     for jf in json_files:
@@ -168,6 +228,7 @@ async def verify_producer(
                 all_package_files,
                 args,
                 executor,
+                validator_cache=validator_cache,
             )
 
     await asyncio.gather(
@@ -202,11 +263,12 @@ async def metadata_verify(config: ConfigParser, args: Namespace) -> int:
 
     logger.debug(f"Found {len(json_files)} objects in {json_base}")
     logger.debug(f"Using a {workers} thread ThreadPoolExecutor")
-    async with Master(
-        config.get("mirror", "master"),
-        config.getfloat("mirror", "timeout"),
-        config.getfloat("mirror", "global-timeout", fallback=None),
-    ) as master:
+    # Only refetch JSON metadata that changed upstream since we saved it
+    validator_cache = None
+    http_cache = config.get("mirror", "http-cache", fallback="")
+    if args.json_update and http_cache:
+        validator_cache = ValidatorCache(http_cache)
+    async with master_from_config(config) as master:
         await verify_producer(
             master,
             config,
@@ -215,7 +277,11 @@ async def metadata_verify(config: ConfigParser, args: Namespace) -> int:
             json_files,
             args,
             executor,
+            validator_cache=validator_cache,
         )
+    if validator_cache is not None:
+        logger.info(f"Finished with {validator_cache}")
+        validator_cache.close()
 
     if not args.delete:
         return 0
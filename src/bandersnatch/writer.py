@@ -0,0 +1,83 @@
+"""
+Write downloads to disk without blocking the event loop
+"""
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import IO, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkWriter:
+    """
+    Hash and write the chunks of a download in a thread pool.
+
+    Chunks are handed over through a bounded queue: the event loop only
+    queues them and a slow disk applies backpressure to the download instead
+    of stalling every other connection. Chunks that piled up while the
+    previous write ran are written with a single executor call.
+    """
+
+    def __init__(
+        self,
+        f: IO[bytes],
+        checksum: Any,
+        executor: Optional[Executor] = None,
+        maxsize: int = 16,
+    ) -> None:
+        self.f = f
+        self.checksum = checksum
+        self.executor = executor
+        self.maxsize = maxsize
+        self.bytes_written = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Future] = None
+
+    async def __aenter__(self) -> "ChunkWriter":
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._consumer = asyncio.ensure_future(self._consume())
+        return self
+
+    async def __aexit__(self, exc_type: Any, *exc: Any) -> None:
+        assert self._queue is not None and self._consumer is not None
+        if exc_type is not None:
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+            return
+        await self._put(None)
+        # Raises anything the writes raised
+        await self._consumer
+
+    async def write(self, chunk: bytes) -> None:
+        await self._put(chunk)
+
+    async def _put(self, chunk: Optional[bytes]) -> None:
+        assert self._queue is not None and self._consumer is not None
+        put = asyncio.ensure_future(self._queue.put(chunk))
+        # Don't wait on a full queue forever if the writer died
+        await asyncio.wait([put, self._consumer], return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            # Raises the consumer's exception
+            self._consumer.result()
+
+    def _write(self, chunks: List[bytes]) -> None:
+        for chunk in chunks:
+            self.checksum.update(chunk)
+            self.f.write(chunk)
+            self.bytes_written += len(chunk)
+
+    async def _consume(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_event_loop()
+        done = False
+        while not done:
+            chunks = [await self._queue.get()]
+            while not self._queue.empty():
+                chunks.append(self._queue.get_nowait())
+            if chunks[-1] is None:
+                done = True
+                chunks.pop()
+            if chunks:
+                await loop.run_in_executor(self.executor, self._write, chunks)
@@ -148,6 +148,16 @@ class FilesystemStorage(StoragePlugin):
         else:
             path.write_bytes(contents)
 
+    def append_file(self, path: PATH_TYPES, contents: Union[str, bytes]) -> None:
+        """Append data to the provided path, creating the file if it doesn't exist.
+        Strings are written as utf-8 text, bytes are written as is."""
+        if isinstance(contents, str):
+            with open(path, mode="a", encoding="utf-8") as fh:
+                fh.write(contents)
+        else:
+            with open(path, mode="ab") as bfh:
+                bfh.write(contents)
+
     @contextlib.contextmanager
     def open_file(  # noqa
         self, path: PATH_TYPES, text: bool = True, encoding: str = "utf-8"
@@ -254,11 +264,20 @@ class FilesystemStorage(StoragePlugin):
         logger.debug(
             f"Opening {path.as_posix()} in binary mode for hash calculation..."
         )
-        logger.debug(f"Contents: {path.read_bytes()!s}")
         with open(path.absolute().as_posix(), "rb") as f:
             for chunk in iter(lambda: f.read(128 * 1024), b""):
-                logger.debug(f"Read chunk: {chunk!s}")
                 h.update(chunk)
         digest = h.hexdigest()
         logger.debug(f"Calculated digest: {digest!s}")
-        return str(h.hexdigest())
+        return str(digest)
+
+    def get_file_size(self, path: PATH_TYPES) -> int:
+        return os.stat(path).st_size
+
+    def get_file_identity(self, path: PATH_TYPES) -> Optional[str]:
+        """Size, modification time and inode change whenever a file is replaced"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
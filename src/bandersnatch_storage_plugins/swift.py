@@ -11,6 +11,7 @@ import pathlib
 import re
 import sys
 import tempfile
+import threading
 from typing import (
     IO,
     Any,
@@ -444,9 +445,16 @@ class SwiftPath(pathlib.Path):
                 yield from path.iterdir(conn=conn, recurse=recurse)
 
 
+def _append_key(path: PATH_TYPES) -> str:
+    """The object name of path, whether it is given as str or SwiftPath"""
+    return str(SwiftPath(str(path)))
+
+
 class SwiftStorage(StoragePlugin):
     name = "swift"
     PATH_BACKEND = SwiftPath
+    # Appends buffered before they are uploaded together, see append_file
+    append_batch_size = 100
 
     @property
     def directory(self) -> str:
@@ -510,6 +518,9 @@ class SwiftStorage(StoragePlugin):
             swift_credentials["auth_url"] = auth_url
         self.os_options = os_options
         self.auth = keystoneauth1.identity.v3.Password(**swift_credentials)
+        self._pending_appends: Dict[str, List[bytes]] = {}
+        self._appends_lock = threading.RLock()
+        atexit.register(self.flush_appends)
         self._test_connection()
         SwiftPath.register_backend(self)
         _SwiftAccessor.register_backend(self)
@@ -715,6 +726,8 @@ class SwiftStorage(StoragePlugin):
         """Copy a file from **source** to **dest**"""
         if dest_container is None:
             dest_container = self.default_container
+        self.flush_appends(source)
+        self._discard_appends(dest)
         dest = f"{dest_container}/{dest}"
         with self.connection() as conn:
             conn.copy_object(self.default_container, str(source), dest)
@@ -740,10 +753,47 @@ class SwiftStorage(StoragePlugin):
                 contents = contents.encode(encoding=encoding, errors=errors)
             elif isinstance(contents, bytes):
                 contents = contents.decode(encoding=encoding, errors=errors)
+        self._discard_appends(path)
         with self.connection() as conn:
             conn.put_object(self.default_container, str(path), contents)
         return
 
+    def append_file(self, path: PATH_TYPES, contents: Union[str, bytes]) -> None:
+        """Append data to the provided path, creating the file if it doesn't exist.
+
+        Object storage has no append, so every upload rewrites the whole object.
+        Appends are buffered and uploaded append_batch_size at a time, before
+        the object is read and when the process exits. Appends buffered when
+        the process is killed are lost."""
+        if isinstance(contents, str):
+            contents = contents.encode("utf-8")
+        with self._appends_lock:
+            pending = self._pending_appends.setdefault(_append_key(path), [])
+            pending.append(contents)
+            if len(pending) >= self.append_batch_size:
+                self.flush_appends(path)
+
+    def flush_appends(self, path: Optional[PATH_TYPES] = None) -> None:
+        """Upload the buffered appends to path, or to every path if None"""
+        with self._appends_lock:
+            if path is None:
+                keys = list(self._pending_appends)
+            else:
+                keys = [_append_key(path)]
+            for key in keys:
+                pending = self._pending_appends.pop(key, None)
+                if not pending:
+                    continue
+                existing = b""
+                if self.is_file(key):
+                    existing = self.get_object(self.default_container, key)
+                self.write_file(key, existing + b"".join(pending))
+
+    def _discard_appends(self, path: PATH_TYPES) -> None:
+        """Drop the buffered appends to path, which is being replaced"""
+        with self._appends_lock:
+            self._pending_appends.pop(_append_key(path), None)
+
     @contextlib.contextmanager
     def open_file(
         self, path: PATH_TYPES, text: bool = True
@@ -772,6 +822,7 @@ class SwiftStorage(StoragePlugin):
         kwargs: Dict[str, Any] = {}
         if errors:
             kwargs["errors"] = errors
+        self.flush_appends(path)
         content = self.get_object(self.default_container, str(path))
         if text and isinstance(content, bytes):
             content = content.decode(encoding=encoding, **kwargs)
@@ -782,6 +833,8 @@ class SwiftStorage(StoragePlugin):
         if not isinstance(path, pathlib.Path):
             path = pathlib.Path(path)
         log_prefix = "[DRY RUN] " if dry_run else ""
+        if not dry_run:
+            self._discard_appends(path)
         with self.connection() as conn:
             logger.info(f"{log_prefix}Deleting item from object storage: {path}")
             if not dry_run:
@@ -874,6 +927,7 @@ class SwiftStorage(StoragePlugin):
         target_path = str(path)
         if target_path == ".":
             return False
+        self.flush_appends(path)
         with self.connection() as conn:
             try:
                 conn.head_object(self.default_container, target_path)
@@ -907,6 +961,28 @@ class SwiftStorage(StoragePlugin):
         h = getattr(hashlib, function)(self.read_file(path, text=False))
         return str(h.hexdigest())
 
+    def get_file_size(self, path: PATH_TYPES) -> int:
+        self.flush_appends(path)
+        with self.connection() as conn:
+            try:
+                headers = conn.head_object(self.default_container, str(path))
+            except swiftclient.exceptions.ClientException:
+                raise FileNotFoundError(str(path))
+        return int(headers["content-length"])
+
+    def get_file_identity(self, path: PATH_TYPES) -> Optional[str]:
+        """The ETag and size of an object change whenever it is rewritten"""
+        self.flush_appends(path)
+        with self.connection() as conn:
+            try:
+                headers = conn.head_object(self.default_container, str(path))
+            except swiftclient.exceptions.ClientException:
+                return None
+        etag = headers.get("etag")
+        if not etag:
+            return None
+        return f"{headers.get('content-length', '')}:{etag}"
+
     def symlink(
         self,
         src: PATH_TYPES,